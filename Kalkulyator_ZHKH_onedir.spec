@@ -0,0 +1,49 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Сборка «папкой» для быстрого запуска: exe и библиотеки лежат рядом, при каждом запуске
+# ничего не распаковывается во временную папку (в отличие от Kalkulyator_ZHKH.spec — одного файла).
+# Без UPX: сжатые библиотеки пришлось бы распаковывать при каждом запуске.
+#
+#     pyinstaller --noconfirm Kalkulyator_ZHKH_onedir.spec  ->  dist/Kalkulyator_ZHKH_dir/
+
+
+a = Analysis(
+    ['main.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[],
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='Kalkulyator_ZHKH',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='Kalkulyator_ZHKH_dir',
+)
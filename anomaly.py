@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Поиск подозрительных периодов по расходу: утечки и ошибки ввода показаний.
+
+    python anomaly.py [history.jsonl] [--threshold 5] [--alpha 0.1] [--warmup 3]
+
+Расход периода по каждому счётчику — разница показаний *_curr с предыдущим периодом.
+Для счётчика держится устойчивое скользящее среднее (EWMA) расхода и EWMA абсолютного отклонения
+от него — обновление O(1) на период, память O(1) на счётчик. Выброс входит в оценки
+только в пределах порога (винзоризация), поэтому одна ошибка не сдвигает «норму».
+
+Флаги:
+    spike     — расход выше нормы больше чем на threshold отклонений (утечка, ошибка в показании);
+    dip       — настолько же ниже нормы (пропущенное или повторно введённое показание);
+    negative  — показание меньше прошлого (опечатка или замена счётчика); в оценки не входит.
+
+Файл истории читается потоком (history_store.iter_history_file) — миллионы записей не загружаются в память;
+записи должны идти в порядке периодов (как их сохраняет программа).
+"""
+import sys
+
+METERS = ("xvs", "gvs", "el_day", "el_night")
+METER_NAMES = {"xvs": "ХВС", "gvs": "ГВС", "el_day": "свет день", "el_night": "свет ночь"}
+CURR_FIELDS = tuple(m + "_curr" for m in METERS)
+
+
+class MeterStats:
+    """Скользящие оценки расхода одного счётчика."""
+
+    __slots__ = ("level", "spread", "count", "prev")
+
+    def __init__(self):
+        self.level = 0.0  # «нормальный» расход
+        self.spread = 0.0  # типичное отклонение от него
+        self.count = 0  # сколько расходов учтено
+        self.prev = None  # показание прошлого периода
+
+    def update(self, reading, alpha, threshold, warmup):
+        """Новое показание -> (расход, флаг или None, отклонение в долях spread). Первое показание -> None."""
+        prev, self.prev = self.prev, reading
+        if prev is None:
+            return None
+        x = reading - prev
+        if x < 0:
+            return x, "negative", 0.0
+        n = self.count
+        if n < warmup:
+            # Пока периодов мало — простые средние, без флагов
+            self.count = n + 1
+            self.level += (x - self.level) / (n + 1)
+            self.spread += (abs(x - self.level) - self.spread) / (n + 1)
+            return x, None, 0.0
+        # Нижняя граница разброса: ровный расход не должен давать флаг на каждую копейку
+        spread = max(self.spread, 0.1 * abs(self.level), 0.5)
+        r = x - self.level
+        score = r / spread
+        limit = threshold * spread
+        clipped = max(-limit, min(limit, r))
+        self.level += alpha * clipped
+        self.spread += alpha * (abs(clipped) - self.spread)
+        self.count = n + 1
+        if score > threshold:
+            return x, "spike", score
+        if score < -threshold:
+            return x, "dip", score
+        return x, None, score
+
+
+class AnomalyDetector:
+    """Оценки по всем счётчикам; update() на каждый новый период по порядку."""
+
+    def __init__(self, alpha=0.1, threshold=5.0, warmup=3):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.meters = {m: MeterStats() for m in METERS}
+        self.periods = 0
+
+    def update_values(self, readings):
+        """Показания *_curr по METERS (None — нет показания) -> [(счётчик, расход, флаг, отклонение)]."""
+        self.periods += 1
+        flags = []
+        for meter, value in zip(METERS, readings):
+            stats = self.meters[meter]
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                stats.prev = None
+                continue
+            res = stats.update(value, self.alpha, self.threshold, self.warmup)
+            if res is not None and res[1] is not None:
+                flags.append((meter,) + res)
+        return flags
+
+    def update(self, record):
+        return self.update_values([record.get(f) for f in CURR_FIELDS])
+
+
+def describe(flags):
+    """Короткая подпись для хронологии: «⚠ ГВС ↑5.2σ, свет день < 0»."""
+    parts = []
+    for meter, consumption, kind, score in flags:
+        name = METER_NAMES[meter]
+        if kind == "negative":
+            parts.append(f"{name} < 0")
+        else:
+            parts.append(f"{name} {'↑' if kind == 'spike' else '↓'}{abs(score):.1f}σ")
+    return "⚠ " + ", ".join(parts) if parts else ""
+
+
+def scan(records, detector=None):
+    """Поток записей -> (номер, запись, флаги) только для подозрительных периодов. Один проход, O(1) памяти."""
+    detector = detector or AnomalyDetector()
+    for i, r in enumerate(records):
+        flags = detector.update(r)
+        if flags:
+            yield i, r, flags
+
+
+def scan_columns(columns, detector=None):
+    """То же по колонкам показаний (список колонок по CURR_FIELDS): -> (номер, флаги)."""
+    detector = detector or AnomalyDetector()
+    update = detector.update_values
+    for i, readings in enumerate(zip(*columns)):
+        flags = update(readings)
+        if flags:
+            yield i, flags
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    from core import HISTORY_PATH
+    from history_store import iter_history_file
+
+    p = argparse.ArgumentParser(description="Подозрительные периоды по расходу (утечки, ошибки показаний).")
+    p.add_argument("path", nargs="?", default=HISTORY_PATH, help="history.jsonl, history.json или JSON Lines с записями")
+    p.add_argument("--threshold", type=float, default=5.0, help="порог в типичных отклонениях")
+    p.add_argument("--alpha", type=float, default=0.1, help="вес нового периода в скользящих оценках")
+    p.add_argument("--warmup", type=int, default=3, help="сколько периодов только набирать статистику")
+    args = p.parse_args(argv)
+
+    detector = AnomalyDetector(args.alpha, args.threshold, args.warmup)
+    found = 0
+    t0 = time.perf_counter()
+    try:
+        for _, r, flags in scan(iter_history_file(args.path), detector):
+            found += 1
+            print(f"{r.get('period') or '—'}\t{r.get('date_saved') or ''}\t{describe(flags)}")
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    seconds = time.perf_counter() - t0
+    print(f"Периодов: {detector.periods}, подозрительных: {found}, время: {seconds:.2f} с", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+"""
+Замеры производительности.
+    python bench.py [suite] — набор замеров (расчёт, история 10^2..10^5 записей, config.json,
+                              хронология без окна) со сравнением с базой bench_baseline.json;
+                              код выхода 1, если случай медленнее базы больше порога (--threshold)
+    python bench.py batch — calculate() против calculate_batch() на 10^3..10^6 строк
+    python bench.py money — float-расчёт против расчёта в копейках, decimal.Decimal и ступеней tariff_rules
+    python bench.py cli   — холодный старт cli.py (код выхода 1, если превышен бюджет)
+    python bench.py memory — память на запись истории: список словарей против колонок и mmap-файла
+    python bench.py statements — квитанций в секунду (HTML + текст) на 10^4 квартир
+    python bench.py live  — задержка расчёта при вводе на одно нажатие (код выхода 1, если больше кадра)
+"""
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from calc import calculate, calculate_batch
+from core import DEFAULT_TARIFFS, MONTHS_RU, READING_KEYS, load_config
+from history_columns import HistoryColumns
+from history_store import HistoryStore
+from money import calculate_batch_exact, calculate_exact
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Допустимая добавка cli.py к времени запуска «голого» интерпретатора, мс
+CLI_STARTUP_BUDGET_MS = 25
+CALIBRATION = "calibration"
+
+
+def synthetic_columns(n, seed=0):
+    """Случайные, но правдоподобные показания для n квартир (колонки array("d"))."""
+    rnd = random.Random(seed)
+    cols = {k: array("d") for k in READING_KEYS}
+    for _ in range(n):
+        for prev_key, curr_key, start, step in (
+            ("xvs_prev", "xvs_curr", 500, 15),
+            ("gvs_prev", "gvs_curr", 400, 10),
+            ("el_day_prev", "el_day_curr", 20000, 400),
+            ("el_night_prev", "el_night_curr", 9000, 200),
+        ):
+            prev = round(rnd.uniform(0, start), 2)
+            cols[prev_key].append(prev)
+            cols[curr_key].append(round(prev + rnd.uniform(0, step), 2))
+    return cols
+
+
+def bench_batch(sizes=(10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)):
+    """Строк в секунду: calculate() в цикле против calculate_batch()."""
+    rows = []
+    for n in sizes:
+        cols = synthetic_columns(n)
+        t0 = time.perf_counter()
+        for i in range(n):
+            calculate(**{k: cols[k][i] for k in READING_KEYS})
+        t_scalar = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        calculate_batch(**cols)
+        t_batch = time.perf_counter() - t0
+        rows.append((n, n / t_scalar, n / t_batch))
+    return rows
+
+
+def _decimal_batch(cols, tariffs=DEFAULT_TARIFFS):
+    """Тот же расчёт в копейках на decimal.Decimal — эталон для сравнения скорости."""
+    t = {k: Decimal(repr(v)) for k, v in tariffs.items()}
+    kop = Decimal(1)
+
+    def q(x):
+        return int((x * 100).quantize(kop, rounding=ROUND_HALF_UP))
+
+    totals = array("q")
+    for xp, xc, gp, g_curr, dp, dc, night_p, night_c in zip(*(cols[k] for k in READING_KEYS)):
+        c_xvs = Decimal(repr(xc)) - Decimal(repr(xp))
+        c_gvs = Decimal(repr(g_curr)) - Decimal(repr(gp))
+        water = (q((c_xvs + c_gvs) * t["tariff_sewage"]) + q(c_xvs * t["tariff_xvs"])
+                 + q(c_gvs * t["norm_gcal_per_m3"] * t["tariff_heating_per_gcal"]) + q(c_gvs * t["tariff_gvs"]))
+        el = (q((Decimal(repr(dc)) - Decimal(repr(dp))) * t["tariff_el_day"])
+              + q((Decimal(repr(night_c)) - Decimal(repr(night_p))) * t["tariff_el_night"]))
+        totals.append(water + el)
+    return totals
+
+
+# Соцнорма на воду и свет (две зоны с общей нормой) — для замера tariff_rules
+SAMPLE_RULES = {
+    "residents": 2,
+    "lines": {
+        "sum_xvs": {"tiers": [{"upto": 6.0, "per_resident": True}, {"k": 1.5}]},
+        "sum_sewage": {"tiers": [{"upto": 10.5, "per_resident": True}, {"k": 1.5}]},
+        "sum_el_day": {"tiers": [{"upto": 80, "per_resident": True}, {"k": 1.3}], "norm_of": ["el_day", "el_night"]},
+        "sum_el_night": {"tiers": [{"upto": 80, "per_resident": True}, {"k": 1.3}], "norm_of": ["el_day", "el_night"]},
+    },
+}
+
+
+def bench_money(n=10 ** 5):
+    """
+    Строк в секунду: float-пакет, копеечный пакет (money), Decimal на одних данных
+    и план tariff_rules со ступенями (SAMPLE_RULES) — пакетом и по одной строке.
+    """
+    from tariff_rules import TariffRules
+
+    cols = synthetic_columns(n)
+    plan = TariffRules(SAMPLE_RULES["lines"], SAMPLE_RULES["residents"]).plan(DEFAULT_TARIFFS)
+    rows = [dict(zip(READING_KEYS, r)) for r in zip(*(cols[k] for k in READING_KEYS))]
+    out = []
+    for name, fn in (
+        ("float (calculate_batch)", lambda: calculate_batch(**cols)),
+        ("копейки (calculate_batch_exact)", lambda: calculate_batch_exact(**cols)),
+        ("decimal.Decimal", lambda: _decimal_batch(cols)),
+        ("копейки по строке (calculate_exact)", lambda: [calculate_exact(**r) for r in rows]),
+        ("ступени пакетом (TariffPlan.batch)", lambda: plan.batch(**cols)),
+        ("ступени по строке (TariffPlan.calculate)", lambda: [plan.calculate(**r) for r in rows]),
+    ):
+        t0 = time.perf_counter()
+        fn()
+        out.append((name, n / (time.perf_counter() - t0)))
+    return out
+
+
+def _median_run_ms(args, runs):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=HERE, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def bench_cli_startup(runs=40):
+    """
+    Холодный старт `python -m cli` с 8 показаниями против `python -c pass`, медианы в мс,
+    и добавка cli — медиана разностей соседних запусков. Запуски чередуются парами, поэтому
+    фоновая нагрузка и прогрев диска сказываются на обоих одинаково и не сдвигают добавку.
+    Заодно проверяет, что tkinter не импортируется.
+    """
+    probe = "import sys, cli; cli.main(['1', '2', '3', '4', '5', '6', '7', '8']); sys.exit('tkinter' in sys.modules)"
+    if subprocess.run([sys.executable, "-c", probe], cwd=HERE, stdout=subprocess.DEVNULL).returncode:
+        raise RuntimeError("cli.py импортирует tkinter")
+    _median_run_ms(["-m", "cli", "1", "2", "3", "4", "5", "6", "7", "8"], 3)  # прогрев: .pyc и кэш диска
+    bare, cli = [], []
+    for _ in range(runs):
+        bare.append(_median_run_ms(["-c", "pass"], 1))
+        cli.append(_median_run_ms(["-m", "cli", "1", "2", "3", "4", "5", "6", "7", "8"], 1))
+    overhead = statistics.median(c - b for b, c in zip(bare, cli))
+    return statistics.median(bare), statistics.median(cli), overhead
+
+
+def synthetic_history(n, seed=0):
+    """n записей истории в формате history.jsonl, по возрастанию date_saved."""
+    rnd = random.Random(seed)
+    records = []
+    readings = [500.0, 400.0, 20000.0, 9000.0]
+    for i in range(n):
+        year, month = 2000 + i // 12, i % 12
+        readings = [round(r + rnd.uniform(0, step), 2) for r, step in zip(readings, (15, 10, 400, 200))]
+        water, el = round(rnd.uniform(300, 2000), 2), round(rnd.uniform(200, 1500), 2)
+        records.append({
+            "period": f"{MONTHS_RU[month]} {year}",
+            "date_saved": f"{year:04d}-{month + 1:02d}-{rnd.randint(1, 28):02d}",
+            "sum_water": water,
+            "sum_electricity": el,
+            "total": round(water + el, 2),
+            "xvs_curr": readings[0],
+            "gvs_curr": readings[1],
+            "el_day_curr": readings[2],
+            "el_night_curr": readings[3],
+        })
+    return records
+
+
+def _timeit(fn, setup=None, min_time=0.2, max_runs=30):
+    """
+    Лучшее время fn(setup()) в секундах (как советует timeit: остальное — шум машины),
+    не меньше 3 прогонов и min_time суммарно.
+    Сборщик мусора на время замера выключен, как в timeit, — иначе разброс на больших историях велик.
+    """
+    runs = []
+    while len(runs) < 3 or (sum(runs) < min_time and len(runs) < max_runs):
+        arg = setup() if setup else None
+        gc.collect()
+        gc.disable()
+        try:
+            t0 = time.perf_counter()
+            fn(arg)
+            runs.append(time.perf_counter() - t0)
+        finally:
+            gc.enable()
+    return min(runs)
+
+
+def run_suite(history_sizes, batch_sizes, workdir):
+    """Все случаи набора: {имя: лучшее время в секундах}. Дисплей не нужен — tkinter не импортируется."""
+    results = {}
+
+    def case(name, fn, setup=None):
+        results[name] = _timeit(fn, setup)
+        print(f"  {name:<32} {results[name] * 1000:>12.3f} мс", flush=True)
+
+    # Эталонная нагрузка: по ней сравнение с базой поправляется на общую скорость машины
+    case(CALIBRATION, lambda _: _calibration_load())
+    one = {k: v[0] for k, v in synthetic_columns(1).items()}
+    calls = 10_000
+    case(f"calculate_x{calls}", lambda _: [calculate(**one) for _ in range(calls)])
+    case(f"calculate_exact_x{calls}", lambda _: [calculate_exact(**one) for _ in range(calls)])
+    for n in batch_sizes:
+        cols = synthetic_columns(n)
+        case(f"calculate_batch[{n}]", lambda _, c=cols: calculate_batch(**c))
+        case(f"calculate_batch_exact[{n}]", lambda _, c=cols: calculate_batch_exact(**c))
+
+    config_path = os.path.join(workdir, "config.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(DEFAULT_TARIFFS, f)
+    case("load_config", lambda _: load_config(config_path))
+
+    for n in history_sizes:
+        records = synthetic_history(n)
+        path = os.path.join(workdir, f"history_{n}.jsonl")
+        HistoryStore(path).replace_all(records)
+        case(f"history_load[{n}]", lambda _, p=path: HistoryStore(p).load())
+        case(f"history_save_full[{n}]", lambda _, p=path, r=records: HistoryStore(p).replace_all(r))
+
+        def loaded_store(p=path):
+            store = HistoryStore(p)
+            store.aggregates()
+            return store
+
+        extra = {"period": "Январь 2100", "date_saved": "2100-01-01", "total": 1.0,
+                 "sum_water": 0.5, "sum_electricity": 0.5}
+        def store_with_extra(p=path):
+            store = loaded_store(p)
+            store.append(dict(extra))
+            return store
+
+        case(f"history_append[{n}]", lambda store: store.append(dict(extra)), loaded_store)
+        case(f"history_delete[{n}]", lambda store: store.delete(("Январь 2100", "2100-01-01")), store_with_extra)
+        # То, что делает _refresh_timeline, без окна: сортировка, суммы и строки видимой части
+        shuffled = records[:]
+        random.Random(1).shuffle(shuffled)
+        case(f"timeline_build[{n}]", lambda _, r=shuffled: _timeline_headless(HistoryColumns(r)))
+        agg = HistoryColumns(shuffled)
+        case(f"timeline_refresh_cached[{n}]", lambda _, a=agg: _timeline_headless(a))
+        cols_path = os.path.join(workdir, f"history_{n}.cols")
+        agg.save(cols_path)
+        case(f"history_columns_open[{n}]", lambda _, p=cols_path: _timeline_headless(HistoryColumns.open(p)))
+    return results
+
+
+def bench_memory(sizes, workdir):
+    """
+    Байт на запись истории (tracemalloc): список словарей с отсортированной копией (как было до колонок),
+    HistoryColumns и таблица, открытая из двоичного файла через mmap (плюс размер файла).
+    """
+    import tracemalloc
+
+    rows = []
+    for n in sizes:
+        lines = [json.dumps(r, ensure_ascii=False) for r in synthetic_history(n)]
+        gc.collect()
+        tracemalloc.start()
+        records = [json.loads(line) for line in lines]
+        by_date = sorted(records, key=lambda r: r.get("date_saved", ""))
+        dicts = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del records, by_date
+        tracemalloc.start()
+        table = HistoryColumns(json.loads(line) for line in lines)
+        columns = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        path = os.path.join(workdir, f"history_{n}.cols")
+        table.save(path)
+        del table
+        tracemalloc.start()
+        mapped = HistoryColumns.open(path)
+        in_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        mapped.close()
+        rows.append((n, dicts / n, columns / n, in_memory / n, os.path.getsize(path) / n))
+    return rows
+
+
+def bench_statements(n=10 ** 4, workdir=None, workers_list=None):
+    """Квитанций в секунду: statements.run() на n квартир с 1 процессом и по числу ядер."""
+    import statements
+
+    cols = synthetic_columns(n)
+    path = os.path.join(workdir, "readings.csv")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(",".join(("apartment",) + READING_KEYS) + "\n")
+        for i, row in enumerate(zip(*(cols[k] for k in READING_KEYS)), 1):
+            f.write(f"{i}," + ",".join(map(str, row)) + "\n")
+    rows = []
+    for workers in workers_list or sorted({1, os.cpu_count() or 1}):
+        out_dir = os.path.join(workdir, f"out_{workers}")
+        with open(path, "r", encoding="utf-8", newline="") as src:
+            written, _, seconds = statements.run(src, out_dir, DEFAULT_TARIFFS, "Октябрь 2025", workers=workers)
+        rows.append((workers, written, seconds))
+    return rows
+
+
+def typing_session(n=2000, seed=0):
+    """
+    Нажатия клавиш при вводе показаний: [(поле, текст поля после нажатия)].
+    Поле текущих показаний стирается и набирается заново по символу, как вручную.
+    """
+    rnd = random.Random(seed)
+    prev = {k: round(rnd.uniform(10, 2000), 2) for k in READING_KEYS[::2]}
+    events = [(k, str(v)) for k, v in prev.items()]
+    events += [(k.replace("_prev", "_curr"), str(v)) for k, v in prev.items()]
+    while len(events) < n:
+        key = rnd.choice(READING_KEYS[::2])
+        typed = f"{prev[key] + rnd.uniform(0, 50):.2f}"
+        events.append((key.replace("_prev", "_curr"), ""))
+        events += [(key.replace("_prev", "_curr"), typed[:i]) for i in range(1, len(typed) + 1)]
+    return events[:n]
+
+
+def bench_live(n=2000, widget=True):
+    """
+    Задержка режима «Считать при вводе» на нажатие, мс: разбор полей, проверка, LiveCalc, текст результата
+    и (если есть дисплей) обновление tk.Text с отрисовкой. Сравнение — полный calculate_exact() на нажатие.
+    Возвращает {случай: [мс по нажатиям]}.
+    """
+    from core import parse_float, result_lines, validate_readings
+    from live import LiveCalc, changed_lines, show_lines
+    from tariff_rules import TariffPlan
+
+    text = None
+    if widget:
+        try:
+            import tkinter as tk
+
+            root = tk.Tk()
+            text = tk.Text(root, height=11, width=50)
+            text.pack()
+            root.update()
+        except Exception:  # нет tkinter или дисплея — только расчёт
+            text = None
+
+    fields = dict.fromkeys(READING_KEYS, "")
+    calc = LiveCalc(TariffPlan(DEFAULT_TARIFFS))
+    shown = None
+    out = {"calculate_exact": [], "live": []}
+    if text is not None:
+        out["live + tk.Text"] = []
+    for key, value in typing_session(n):
+        fields[key] = value
+        t0 = time.perf_counter()
+        inputs = {k: parse_float(v) for k, v in fields.items()}
+        if None in inputs.values():
+            continue
+        if validate_readings(inputs):
+            continue
+        full = result_lines(calculate_exact(**inputs, **DEFAULT_TARIFFS))
+        t1 = time.perf_counter()
+        result, _ = calc.update(inputs)
+        lines = result_lines(result)
+        changed_lines(shown, lines)
+        t2 = time.perf_counter()
+        if text is not None:
+            show_lines(text, shown, lines)
+            text.update_idletasks()
+            out["live + tk.Text"].append((time.perf_counter() - t1) * 1000)
+        if lines != full:
+            raise RuntimeError(f"LiveCalc расходится с calculate_exact: {inputs}")
+        shown = lines
+        out["calculate_exact"].append((t1 - t0) * 1000)
+        out["live"].append((t2 - t1) * 1000)
+    if text is not None:
+        text.master.destroy()
+    return out
+
+
+def _calibration_load():
+    d = {}
+    for i in range(100_000):
+        d[i % 1000] = d.get(i % 1000, 0) + i * 1.5
+    return sorted(d.values())
+
+
+def _timeline_headless(agg, visible=4):
+    records = agg.rows()
+    rows = [f"  {r.get('period', '—')}  —  {r.get('total', 0):,.2f} руб" for r in records[:visible]]
+    return rows, len(agg), agg.total, agg.average, agg.last(), agg.last_total(3)
+
+
+def compare(results, baseline, threshold):
+    """
+    Список (случай, время, базовое время, отношение) для случаев, медленнее базы больше чем на threshold.
+    Отношение делится на отношение эталонной нагрузки, чтобы общая загрузка машины не давала ложных регрессий.
+    """
+    speed = 1.0
+    if results.get(CALIBRATION) and baseline.get(CALIBRATION):
+        speed = results[CALIBRATION] / baseline[CALIBRATION]
+    regressions = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if name == CALIBRATION or not base:
+            continue
+        ratio = seconds / base / speed
+        if ratio > 1 + threshold:
+            regressions.append((name, seconds, base, ratio))
+    return regressions
+
+
+def main(argv):
+    import argparse
+
+    p = argparse.ArgumentParser(description="Замеры производительности калькулятора.")
+    p.add_argument("what", nargs="?", default="suite", choices=("suite", "batch", "money", "cli", "memory", "statements", "live"))
+    p.add_argument("--sizes", default="100,1000,10000,100000",
+                   help="размеры истории через запятую (по умолчанию 10^2..10^5)")
+    p.add_argument("--full", action="store_true", help="добавить 10^6 записей истории и строк пакета")
+    p.add_argument("--out", help="сохранить результаты в JSON")
+    p.add_argument("--baseline", default=os.path.join(HERE, "bench_baseline.json"),
+                   help="файл базовых результатов для сравнения")
+    p.add_argument("--threshold", type=float, default=0.25,
+                   help="допустимое замедление относительно базы (0.25 = +25%%)")
+    p.add_argument("--update-baseline", action="store_true", help="записать результаты как новую базу")
+    args = p.parse_args(argv)
+
+    if args.what == "batch":
+        print(f"{'строк':>10} {'calculate, стр/с':>18} {'batch, стр/с':>14}")
+        for n, scalar, batch in bench_batch():
+            print(f"{n:>10} {scalar:>18,.0f} {batch:>14,.0f}".replace(",", " "))
+        return 0
+    if args.what == "money":
+        for name, rate in bench_money():
+            print(f"{name:>40}: {rate:>10,.0f} строк/с".replace(",", " "))
+        return 0
+    if args.what == "cli":
+        bare, cli, overhead = bench_cli_startup()
+        print(f"python -c pass: {bare:.1f} мс, python -m cli: {cli:.1f} мс, добавка: {overhead:.1f} мс "
+              f"(бюджет {CLI_STARTUP_BUDGET_MS} мс)")
+        return 1 if overhead > CLI_STARTUP_BUDGET_MS else 0
+
+    if args.what == "live":
+        from live import LIVE_FRAME_BUDGET_MS
+
+        over = False
+        for name, times in bench_live().items():
+            times.sort()
+            p95, worst = times[int(len(times) * 0.95)], times[-1]
+            print(f"{name:>16}: нажатий {len(times)}, p50 {statistics.median(times):.3f} мс, "
+                  f"p95 {p95:.3f} мс, max {worst:.3f} мс")
+            over = over or (name != "calculate_exact" and worst > LIVE_FRAME_BUDGET_MS)
+        print(f"Бюджет на нажатие: {LIVE_FRAME_BUDGET_MS} мс (без паузы ожидания ввода main.LIVE_DELAY_MS)")
+        return 1 if over else 0
+
+    if args.what == "statements":
+        with tempfile.TemporaryDirectory() as workdir:
+            for workers, written, seconds in bench_statements(workdir=workdir):
+                print(f"процессов {workers}: {written} квитанций (HTML + текст) за {seconds:.2f} с, "
+                      f"{written / seconds:,.0f} квитанций/с".replace(",", " "))
+        return 0
+
+    history_sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    if args.what == "memory":
+        print(f"{'записей':>10} {'словари':>10} {'колонки':>10} {'mmap':>10} {'файл':>10}   (байт на запись)")
+        with tempfile.TemporaryDirectory() as workdir:
+            for n, dicts, columns, mapped, size in bench_memory(history_sizes, workdir):
+                print(f"{n:>10} {dicts:>10.0f} {columns:>10.0f} {mapped:>10.1f} {size:>10.0f}")
+        return 0
+    batch_sizes = [10 ** 3, 10 ** 4, 10 ** 5]
+    if args.full:
+        history_sizes.append(10 ** 6)
+        batch_sizes.append(10 ** 6)
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_suite(history_sizes, batch_sizes, workdir)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"База записана: {args.baseline}")
+        return 0
+    if not os.path.isfile(args.baseline):
+        print(f"Базы нет ({args.baseline}) — сравнение пропущено. Запишите её флагом --update-baseline.")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f).get("results", {})
+    regressions = compare(results, baseline, args.threshold)
+    for name, seconds, base, ratio in regressions:
+        print(f"РЕГРЕССИЯ {name}: {seconds * 1000:.3f} мс против {base * 1000:.3f} мс (x{ratio:.2f})")
+    if not regressions:
+        print(f"Регрессий нет (порог +{args.threshold:.0%}).")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
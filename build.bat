@@ -19,8 +19,25 @@ exit /b 1
 :build
 echo Установка PyInstaller...
 %PY% -m pip install pyinstaller --quiet
+if /i "%~1"=="onefile" goto :onefile
+rem По умолчанию — папка: запуск быстрее, ничего не распаковывается во временную папку
+rem (замер на Linux до инициализации Tk: папка ~0.1 с, один файл ~0.6 с — см. README)
+echo Сборка папки...
+%PY% -m PyInstaller --noconfirm Kalkulyator_ZHKH_onedir.spec
+if %errorlevel% neq 0 (
+  echo Ошибка сборки.
+  pause
+  exit /b 1
+)
+echo.
+echo Готово: dist\Kalkulyator_ZHKH_dir\Kalkulyator_ZHKH.exe
+echo Копируйте всю папку Kalkulyator_ZHKH_dir целиком.
+pause
+exit /b 0
+
+:onefile
 echo Сборка exe...
-%PY% -m PyInstaller --onefile --noconsole --name "Kalkulyator_ZHKH" main.py
+%PY% -m PyInstaller --noconfirm Kalkulyator_ZHKH.spec
 if %errorlevel% neq 0 (
   echo Ошибка сборки.
   pause
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Массовый расчёт по всем квартирам дома из одного файла показаний.
+
+    python bulk.py readings.csv -o bills.csv [--workers 4] [--chunk 5000] [--config config.json] [--float]
+
+Вход — CSV с заголовком: столбец квартиры (apartment) и 8 столбцов показаний
+(xvs_prev, xvs_curr, gvs_prev, gvs_curr, el_day_prev, el_day_curr, el_night_prev, el_night_curr).
+Десятичная запятая допускается. Строки читаются потоком (одна запись — одна строка файла),
+пачками раздаются по процессам,
+результаты пишутся в порядке входа. В памяти одновременно не больше workers * 2 пачек.
+Суммы — в копейках, как в окне программы; --float — прежний расчёт в float (calc.calculate_batch).
+Правила тарифов из config.json (ступени, нормы — tariff_rules) применяются так же, как в окне программы;
+с ними расчёт всегда в копейках.
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from calc import SUM_FIELDS, calculate_batch
+from core import READING_KEYS, load_config, load_rules, parse_float, tariffs_from_config, validate_readings
+from money import calculate_batch_exact, kopecks_to_str
+
+ID_FIELD = "apartment"
+OUTPUT_FIELDS = (ID_FIELD,) + SUM_FIELDS + ("error",)
+
+
+def read_chunks(f, chunk_size, delimiter=","):
+    """
+    Читает заголовок и отдаёт пачки сырых строк CSV.
+    Разбор строк происходит уже в процессах-исполнителях — главный процесс только читает и пишет.
+    Возвращает (номера нужных столбцов, генератор пачек).
+    """
+    header = next(csv.reader([f.readline()], delimiter=delimiter), [])
+    header = [h.strip() for h in header]
+    missing = [k for k in (ID_FIELD,) + READING_KEYS if k not in header]
+    if missing:
+        raise ValueError("В файле нет столбцов: " + ", ".join(missing))
+    columns = [header.index(k) for k in (ID_FIELD,) + READING_KEYS]
+
+    def chunks():
+        chunk = []
+        for line in f:
+            if line.strip():
+                chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    return columns, chunks()
+
+
+def parse_chunk(lines, columns, delimiter=","):
+    """
+    Разбор и проверка пачки строк CSV.
+    Возвращает (квартиры, ошибки по строкам — None у годных, колонки показаний годных строк).
+    """
+    apartments = []
+    errors = []
+    cols = {k: [] for k in READING_KEYS}
+    for row in csv.reader(lines, delimiter=delimiter):
+        try:
+            apartment = row[columns[0]]
+            raw = [row[c] for c in columns[1:]]
+        except IndexError:
+            apartments.append(row[0] if row else "")
+            errors.append("Не хватает столбцов")
+            continue
+        inputs = {k: parse_float(v) for k, v in zip(READING_KEYS, raw)}
+        bad = [k for k, v in inputs.items() if v is None]
+        error = f"Не число: {', '.join(bad)}" if bad else validate_readings(inputs)
+        apartments.append(apartment)
+        errors.append(error)
+        if not error:
+            for k in READING_KEYS:
+                cols[k].append(inputs[k])
+    return apartments, errors, cols
+
+
+def bill_chunk(lines, columns, tariffs, delimiter=",", exact=True, rules=None):
+    """
+    Расчёт одной пачки строк; возвращает готовый текст выходного CSV и число строк.
+    exact=True (по умолчанию) — расчёт в целых копейках (money.calculate_batch_exact), exact=False — в float.
+    rules — tariff_rules.TariffRules: расчёт в копейках по плану правил для tariffs.
+    """
+    apartments, errors, cols = parse_chunk(lines, columns, delimiter)
+    rows = []
+    ok_rows = []
+    for i, (apartment, error) in enumerate(zip(apartments, errors)):
+        if error:
+            rows.append([apartment] + [""] * len(SUM_FIELDS) + [error])
+        else:
+            rows.append([apartment])
+            ok_rows.append(i)
+    if ok_rows and (exact or rules):
+        result = rules.plan(tariffs).batch(**cols) if rules else calculate_batch_exact(**cols, **tariffs)
+        sums = [result[f] for f in SUM_FIELDS]
+        for j, i in enumerate(ok_rows):
+            rows[i].extend([kopecks_to_str(col[j]) for col in sums] + [""])
+    elif ok_rows:
+        result = calculate_batch(**cols, **tariffs)
+        sums = [result[f] for f in SUM_FIELDS]
+        for j, i in enumerate(ok_rows):
+            rows[i].extend([f"{col[j]:.2f}" for col in sums] + [""])
+    buf = io.StringIO()
+    csv.writer(buf, delimiter=delimiter, lineterminator="\n").writerows(rows)
+    return buf.getvalue(), len(rows)
+
+
+def run(src, dst, tariffs, workers=None, chunk_size=5000, delimiter=",", exact=True, rules=None):
+    """Считает все строки src и пишет в dst. Возвращает (строк, секунд)."""
+    workers = workers or os.cpu_count() or 1
+    columns, chunks = read_chunks(src, chunk_size, delimiter)
+    csv.writer(dst, delimiter=delimiter, lineterminator="\n").writerow(OUTPUT_FIELDS)
+    rows = 0
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(bill_chunk, chunk, columns, tariffs, delimiter, exact, rules))
+            # Не больше двух пачек на процесс в работе: память не растёт с размером файла
+            while len(pending) >= workers * 2:
+                rows += _flush(pending.popleft(), dst)
+        while pending:
+            rows += _flush(pending.popleft(), dst)
+    return rows, time.perf_counter() - t0
+
+
+def _flush(future, dst):
+    text, n = future.result()
+    dst.write(text)
+    return n
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Массовый расчёт ЖКХ по файлу показаний.")
+    p.add_argument("input", help="CSV с показаниями («-» — stdin)")
+    p.add_argument("-o", "--output", default="-", help="куда писать результат (по умолчанию stdout)")
+    p.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — по числу ядер)")
+    p.add_argument("--chunk", type=int, default=5000, help="строк в пачке")
+    p.add_argument("--delimiter", default=",", help="разделитель столбцов (для выгрузок Excel — «;»)")
+    p.add_argument("--config", help="путь к config.json")
+    p.add_argument("--float", dest="exact", action="store_false",
+                   help="считать в float, без округления строк до копейки (итог может разойтись с окном)")
+    p.add_argument("--exact", action="store_true", help="считать в копейках (по умолчанию; оставлен для совместимости)")
+    p.set_defaults(exact=True)
+    args = p.parse_args(argv)
+
+    config = load_config(args.config)
+    try:
+        rules = load_rules(config)
+    except ValueError as e:
+        p.error(f"config.json: {e}")
+    tariffs = tariffs_from_config(config)
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8-sig", newline="")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        rows, seconds = run(src, dst, tariffs, args.workers, args.chunk, args.delimiter, args.exact, rules)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    rate = f"{rows / seconds if seconds else 0:,.0f}".replace(",", " ")
+    print(f"Строк: {rows}, время: {seconds:.2f} с, {rate} строк/с", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -3,8 +3,19 @@
 Расчёт коммунальных платежей по логике Excel (показания счётчиков Одинцово).
 Вход: предыдущие и текущие показания ХВС, ГВС, электричество день, электричество ночь.
 """
+import sys
+from array import array
 
+from instrument import traced
 
+SUM_FIELDS = (
+    "sum_sewage", "sum_xvs", "sum_heating", "sum_gvs", "sum_water",
+    "sum_el_day", "sum_el_night", "sum_electricity", "total",
+)
+CONSUMPTION_FIELDS = ("xvs", "gvs", "sewage", "el_day", "el_night")
+
+
+@traced("calculate")
 def calculate(
     xvs_prev: float,
     xvs_curr: float,
@@ -67,3 +78,134 @@ def calculate(
         "sum_electricity": round(sum_electricity, 2),
         "total": round(total, 2),
     }
+
+
+def calculate_batch(
+    xvs_prev,
+    xvs_curr,
+    gvs_prev,
+    gvs_curr,
+    el_day_prev,
+    el_day_curr,
+    el_night_prev,
+    el_night_curr,
+    tariff_sewage: float = 46.73,
+    tariff_xvs: float = 43.24,
+    tariff_gvs: float = 43.24,
+    tariff_heating_per_gcal: float = 2891.74,
+    norm_gcal_per_m3: float = 0.06,
+    tariff_el_day: float = 6.79,
+    tariff_el_night: float = 2.81,
+):
+    """
+    Пакетный расчёт для многих квартир сразу.
+    Показания — колонки одинаковой длины (list, array.array или numpy-массив).
+    Возвращает словарь колонок с теми же ключами, что и calculate();
+    округление поэлементно совпадает с calculate().
+    Если на входе numpy-массивы — считает векторно и возвращает numpy-массивы,
+    иначе — array.array("d").
+    """
+    cols = (xvs_prev, xvs_curr, gvs_prev, gvs_curr,
+            el_day_prev, el_day_curr, el_night_prev, el_night_curr)
+    n = len(xvs_prev)
+    if any(len(c) != n for c in cols):
+        raise ValueError("Колонки показаний должны быть одинаковой длины")
+    tariffs = (tariff_sewage, tariff_xvs, tariff_gvs, tariff_heating_per_gcal,
+               norm_gcal_per_m3, tariff_el_day, tariff_el_night)
+    # numpy необязателен и не импортируется заранее (быстрый старт командной строки):
+    # если вызывающий передал numpy-массивы, модуль уже загружен
+    np = sys.modules.get("numpy")
+    if np is not None and any(isinstance(c, np.ndarray) for c in cols):
+        return _calculate_batch_numpy(np, cols, tariffs)
+    return _calculate_batch_python(cols, tariffs)
+
+
+def _calculate_batch_python(cols, tariffs):
+    (t_sewage, t_xvs, t_gvs, t_heating, norm_gcal, t_el_day, t_el_night) = tariffs
+    cons = {k: array("d") for k in CONSUMPTION_FIELDS}
+    sums = {k: array("d") for k in SUM_FIELDS}
+    c_xvs, c_gvs, c_sewage = cons["xvs"].append, cons["gvs"].append, cons["sewage"].append
+    c_day, c_night = cons["el_day"].append, cons["el_night"].append
+    (o_sewage, o_xvs, o_heating, o_gvs, o_water,
+     o_day, o_night, o_el, o_total) = (sums[k].append for k in SUM_FIELDS)
+    # Выражения и порядок операций — ровно как в calculate(), чтобы результат совпадал бит в бит
+    for xp, xc, gp, gc, dp, dc, night_p, night_c in zip(*cols):
+        consumption_xvs = xc - xp
+        consumption_gvs = gc - gp
+        consumption_sewage = (xc + gc) - (xp + gp)
+        consumption_el_day = dc - dp
+        consumption_el_night = night_c - night_p
+        sum_sewage = consumption_sewage * t_sewage
+        sum_xvs = consumption_xvs * t_xvs
+        sum_heating = consumption_gvs * norm_gcal * t_heating
+        sum_gvs = consumption_gvs * t_gvs
+        sum_water = sum_sewage + sum_xvs + sum_heating + sum_gvs
+        sum_el_day = consumption_el_day * t_el_day
+        sum_el_night = consumption_el_night * t_el_night
+        sum_electricity = sum_el_day + sum_el_night
+        c_xvs(consumption_xvs)
+        c_gvs(consumption_gvs)
+        c_sewage(consumption_sewage)
+        c_day(consumption_el_day)
+        c_night(consumption_el_night)
+        o_sewage(round(sum_sewage, 2))
+        o_xvs(round(sum_xvs, 2))
+        o_heating(round(sum_heating, 2))
+        o_gvs(round(sum_gvs, 2))
+        o_water(round(sum_water, 2))
+        o_day(round(sum_el_day, 2))
+        o_night(round(sum_el_night, 2))
+        o_el(round(sum_electricity, 2))
+        o_total(round(sum_water + sum_electricity, 2))
+    result = {"consumption": cons}
+    result.update(sums)
+    return result
+
+
+def _calculate_batch_numpy(np, cols, tariffs):
+    (t_sewage, t_xvs, t_gvs, t_heating, norm_gcal, t_el_day, t_el_night) = tariffs
+    xp, xc, gp, gc, dp, dc, night_p, night_c = (np.asarray(c, dtype=np.float64) for c in cols)
+    consumption_xvs = xc - xp
+    consumption_gvs = gc - gp
+    consumption_sewage = (xc + gc) - (xp + gp)
+    consumption_el_day = dc - dp
+    consumption_el_night = night_c - night_p
+    sum_sewage = consumption_sewage * t_sewage
+    sum_xvs = consumption_xvs * t_xvs
+    sum_heating = consumption_gvs * norm_gcal * t_heating
+    sum_gvs = consumption_gvs * t_gvs
+    sum_water = sum_sewage + sum_xvs + sum_heating + sum_gvs
+    sum_el_day = consumption_el_day * t_el_day
+    sum_el_night = consumption_el_night * t_el_night
+    sum_electricity = sum_el_day + sum_el_night
+    total = sum_water + sum_electricity
+    result = {
+        "consumption": {
+            "xvs": consumption_xvs,
+            "gvs": consumption_gvs,
+            "sewage": consumption_sewage,
+            "el_day": consumption_el_day,
+            "el_night": consumption_el_night,
+        },
+    }
+    for key, col in zip(SUM_FIELDS, (
+        sum_sewage, sum_xvs, sum_heating, sum_gvs, sum_water,
+        sum_el_day, sum_el_night, sum_electricity, total,
+    )):
+        result[key] = _round2_numpy(np, col)
+    return result
+
+
+def _round2_numpy(np, col):
+    """
+    Округление до копеек как у встроенного round(x, 2).
+    np.round(x * 100) / 100 расходится с round() только около половины копейки,
+    где x * 100 уже неточно, — такие элементы доокругляем встроенным round().
+    """
+    scaled = col * 100
+    rounded = np.rint(scaled) / 100
+    frac = np.abs(scaled - np.trunc(scaled))
+    suspect = np.nonzero(np.abs(frac - 0.5) < 1e-6)[0]
+    for i in suspect.tolist():
+        rounded[i] = round(float(col[i]), 2)
+    return rounded
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Расчёт из командной строки, без окна (tkinter не импортируется).
+Тарифы и правила тарифов (ступени, нормы — tariff_rules) берутся из config.json рядом с программой.
+
+    python -m cli 55.58 57.74 49.54 51.53 1487.59 1531.81 648.86 662.75
+    python -m cli --xvs 55.58 57.74 --gvs 49.54 51.53 --el-day 1487.59 1531.81 --el-night 648.86 662.75
+    python -m cli --period "Октябрь 2025" 55.58 57.74 49.54 51.53 1487.59 1531.81 648.86 662.75
+    echo '{"xvs_prev": 55.58, "xvs_curr": 57.74, ...}' | python -m cli -
+
+Со stdin читается JSON-массив объектов (ответ — массив) или JSON Lines (ответ — по строке на строку).
+Результат — JSON с теми же полями, что возвращает calc.calculate(). Расчёт в копейках, как в окне программы
+(с правилами в config.json — по плану правил); --float — прежний расчёт в float без округления строк.
+"""
+import json
+import sys
+
+from core import READING_KEYS, load_config, load_rules, parse_float, parse_readings, tariffs_from_config
+
+
+def compute(readings, tariffs=None, config=None, period=None, exact=True, plan=None):
+    """
+    Расчёт для одного набора показаний (dict с ключами READING_KEYS, числа или строки «12,5»).
+    tariffs — явные тарифы; иначе берутся из config (или из config.json) вместе с правилами тарифов,
+    а если задан period («Октябрь 2025») — версия тарифов, действовавшая в этом периоде.
+    plan — готовый tariff_rules.TariffPlan (тарифы и правила): расчёт в копейках по нему, tariffs не нужны.
+    По умолчанию расчёт в копейках (money.calculate_exact), как в окне программы; exact=False — в float
+    (calc.calculate), суммы могут разойтись с окном на копейку.
+    Некорректные показания — ValueError с тем же текстом, что в окне программы.
+    """
+    inputs = parse_readings(readings)
+    if plan is not None:
+        return plan.calculate(**inputs)
+    if tariffs is None:
+        config = config if config is not None else load_config()
+        if period:
+            from tariff_schedule import TariffSchedule
+
+            tariffs = TariffSchedule.from_config(config).for_period(period)
+        else:
+            tariffs = tariffs_from_config(config)
+        rules = load_rules(config)
+        if rules:
+            return rules.plan(tariffs).calculate(**inputs)
+    if exact:
+        from money import calculate_exact
+
+        return calculate_exact(**inputs, **tariffs)
+    from calc import calculate
+
+    return calculate(**inputs, **tariffs)
+
+
+class _Args:
+    readings = ()
+    xvs = gvs = el_day = el_night = None
+    config = period = None
+    exact = True
+    tariff = ()
+
+    def __init__(self, readings):
+        self.readings = readings
+
+
+def _parse_args(argv):
+    # Частые формы вызова (8 чисел или «-») разбираем без argparse: его импорт заметно удлиняет старт
+    if argv == ["-"] or (len(argv) == len(READING_KEYS) and all(parse_float(a) is not None for a in argv)):
+        return _Args(list(argv))
+    import argparse
+
+    p = argparse.ArgumentParser(prog="python -m cli", description="Калькулятор ЖКХ без окна.")
+    p.add_argument("readings", nargs="*", help="8 показаний по порядку: " + " ".join(READING_KEYS) + "; «-» — читать JSON со stdin")
+    for flag, name in (("--xvs", "xvs"), ("--gvs", "gvs"), ("--el-day", "el_day"), ("--el-night", "el_night")):
+        p.add_argument(flag, dest=name, nargs=2, metavar=("ПРЕД", "ТЕК"))
+    p.add_argument("--config", help="путь к config.json (по умолчанию — рядом с программой)")
+    p.add_argument("--float", dest="exact", action="store_false",
+                   help="считать в float, без округления строк до копейки (итог может разойтись с окном)")
+    p.add_argument("--exact", action="store_true", help="считать в копейках (по умолчанию; оставлен для совместимости)")
+    p.set_defaults(exact=True)
+    p.add_argument("--period", help="период «Октябрь 2025»: тарифы, действовавшие тогда")
+    p.add_argument("--tariff", action="append", default=[], metavar="КЛЮЧ=ЗНАЧЕНИЕ", help="переопределить тариф")
+    return p.parse_args(argv)
+
+
+def _tariffs(args):
+    """Тарифы (с учётом --period и --tariff) и план расчёта по правилам config.json (None — правил нет)."""
+    config = load_config(args.config)
+    if args.period:
+        from tariff_schedule import TariffSchedule
+
+        tariffs = dict(TariffSchedule.from_config(config).for_period(args.period))
+    else:
+        tariffs = tariffs_from_config(config)
+    for item in args.tariff:
+        key, _, value = item.partition("=")
+        v = parse_float(value)
+        if key not in tariffs or v is None:
+            raise SystemExit(f"Некорректный тариф: {item}")
+        tariffs[key] = v
+    try:
+        rules = load_rules(config)
+    except ValueError as e:
+        raise SystemExit(f"config.json: {e}")
+    return tariffs, (rules.plan(tariffs) if rules else None)
+
+
+def _readings_from_args(args):
+    if args.readings:
+        if len(args.readings) != len(READING_KEYS):
+            raise SystemExit(f"Нужно {len(READING_KEYS)} показаний, передано {len(args.readings)}.")
+        return dict(zip(READING_KEYS, args.readings))
+    readings = {}
+    for name in ("xvs", "gvs", "el_day", "el_night"):
+        pair = getattr(args, name)
+        if pair is None:
+            raise SystemExit(f"Не заданы показания --{name.replace('_', '-')}.")
+        readings[name + "_prev"], readings[name + "_curr"] = pair
+    return readings
+
+
+def _dump(obj):
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _result_or_error(readings, tariffs, exact, plan=None):
+    if not isinstance(readings, dict):
+        return {"error": "Ожидался объект с показаниями."}, True
+    try:
+        return compute(readings, tariffs, exact=exact, plan=plan), False
+    except ValueError as e:
+        return {"error": str(e)}, True
+
+
+def _line_result(line, tariffs, exact, plan=None):
+    """Одна строка JSON Lines -> (результат или {"error": ...}, ошибка ли); битая строка не прерывает поток."""
+    try:
+        readings = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"error": f"Некорректный JSON: {e}"}, True
+    return _result_or_error(readings, tariffs, exact, plan)
+
+
+def main(argv=None):
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    tariffs, plan = _tariffs(args)
+    if args.readings != ["-"]:
+        try:
+            result = compute(_readings_from_args(args), tariffs, exact=args.exact, plan=plan)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        print(_dump(result))
+        return 0
+
+    failed = False
+    first = sys.stdin.read(1)
+    while first.isspace():
+        first = sys.stdin.read(1)
+    if first == "[":
+        try:
+            items = json.loads(first + sys.stdin.read())
+        except json.JSONDecodeError as e:
+            print(f"Некорректный JSON: {e}", file=sys.stderr)
+            return 2
+        results = []
+        for item in items:
+            result, err = _result_or_error(item, tariffs, args.exact, plan)
+            failed |= err
+            results.append(result)
+        print(_dump(results))
+    else:
+        # JSON Lines: отвечаем построчно, не дожидаясь конца ввода
+        line = first + sys.stdin.readline()
+        while line:
+            if line.strip():
+                result, err = _line_result(line, tariffs, args.exact, plan)
+                failed |= err
+                sys.stdout.write(_dump(result) + "\n")
+                sys.stdout.flush()
+            line = sys.stdin.readline()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Общая часть приложения без интерфейса: пути к данным, тарифы по умолчанию,
+чтение/запись config.json и истории, разбор чисел и проверка показаний.
+Не импортирует tkinter — используется и окном (main.py), и командной строкой (cli.py).
+"""
+import json
+import os
+import sys
+from itertools import compress, count
+from math import isfinite
+from operator import lt
+
+from instrument import configure as configure_trace, traced
+from persist import atomic_write_json
+
+# Путь к данным: рядом с exe или рядом со скриптом; ZHKH_DATA_DIR — другая папка (замеры, ui_bench.py)
+if os.environ.get("ZHKH_DATA_DIR"):
+    BASE_DIR = os.path.abspath(os.environ["ZHKH_DATA_DIR"])
+elif getattr(sys, "frozen", False):
+    BASE_DIR = os.path.dirname(sys.executable)
+else:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(BASE_DIR, "config.json")
+HISTORY_PATH = os.path.join(BASE_DIR, "history.jsonl")
+# Прежний формат истории — переносится в history.jsonl при первом запуске
+LEGACY_HISTORY_PATH = os.path.join(BASE_DIR, "history.json")
+TRACE_PATH = os.path.join(BASE_DIR, "trace.jsonl")
+configure_trace(TRACE_PATH)
+_history = None
+_writer = None
+_errors = []  # что не удалось прочитать — окно покажет при запуске
+
+MONTHS_RU = (
+    "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+    "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"
+)
+
+DEFAULT_TARIFFS = {
+    "tariff_sewage": 46.73,
+    "tariff_xvs": 43.24,
+    "tariff_gvs": 43.24,
+    "tariff_heating_per_gcal": 2891.74,
+    "norm_gcal_per_m3": 0.06,
+    "tariff_el_day": 6.79,
+    "tariff_el_night": 2.81,
+}
+
+
+READING_KEYS = (
+    "xvs_prev", "xvs_curr", "gvs_prev", "gvs_curr",
+    "el_day_prev", "el_day_curr", "el_night_prev", "el_night_curr",
+)
+
+
+@traced("load_config")
+def load_config(path=None):
+    path = path or CONFIG_PATH
+    if os.path.isfile(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            _report(f"Не удалось прочитать {os.path.basename(path)} ({e}), взяты тарифы по умолчанию.")
+    return dict(DEFAULT_TARIFFS)
+
+
+def save_config(tariffs):
+    try:
+        atomic_write_json(CONFIG_PATH, tariffs)
+        return True
+    except Exception:
+        return False
+
+
+def save_config_async(tariffs, on_done=None):
+    """Запись config.json в фоновом потоке; on_done(ошибка или None) — из BackgroundWriter.poll()."""
+    background_writer().submit("config", lambda: atomic_write_json(CONFIG_PATH, tariffs), on_done)
+
+
+def background_writer():
+    global _writer
+    if _writer is None:
+        from persist import BackgroundWriter
+        _writer = BackgroundWriter()
+    return _writer
+
+
+def take_errors():
+    """Накопленные ошибки чтения данных (список очищается)."""
+    if _history is not None and _history.skipped:
+        _report(f"В {os.path.basename(HISTORY_PATH)} пропущено повреждённых строк: {_history.skipped}.")
+    errors = list(_errors)
+    del _errors[:]
+    return errors
+
+
+def _report(message):
+    if message not in _errors:
+        _errors.append(message)
+
+
+def history_store():
+    """Хранилище истории; создаётся при первом обращении, чтобы не замедлять запуск cli.py."""
+    global _history
+    if _history is None:
+        from history_store import HistoryStore
+        _history = HistoryStore(HISTORY_PATH, LEGACY_HISTORY_PATH)
+    return _history
+
+
+@traced("load_history")
+def load_history():
+    try:
+        return history_store().records()
+    except Exception as e:
+        _report(f"Не удалось прочитать историю ({e}).")
+        return []
+
+
+def history_aggregates():
+    """Суммы и сортировка истории, поддерживаемые инкрементально."""
+    try:
+        return history_store().aggregates()
+    except Exception as e:
+        _report(f"Не удалось прочитать историю ({e}).")
+        from history_columns import HistoryColumns
+        return HistoryColumns()
+
+
+@traced("save_history")
+def save_history(records):
+    try:
+        history_store().replace_all(records)
+        return True
+    except Exception:
+        return False
+
+
+@traced("append_history")
+def append_history(record):
+    try:
+        history_store().append(record)
+        return True
+    except Exception:
+        return False
+
+
+@traced("extend_history")
+def extend_history(records):
+    """Несколько записей одной порцией строк журнала (импорт)."""
+    try:
+        history_store().extend(records)
+        return True
+    except Exception:
+        return False
+
+
+@traced("delete_history")
+def delete_history(key):
+    try:
+        history_store().delete(key)
+        return True
+    except Exception:
+        return False
+
+
+def defer_history_writes():
+    """Изменения истории — сразу в памяти, на диск — через flush_history_async()."""
+    history_store().defer = True
+
+
+def flush_history_async(on_done=None):
+    """Запись накопленных изменений истории в фоновом потоке; серия правок склеивается в одну запись."""
+    background_writer().submit("history", history_store().flush, on_done)
+
+
+def default_period_name():
+    from datetime import datetime
+
+    now = datetime.now()
+    return f"{MONTHS_RU[now.month - 1]} {now.year}"
+
+
+def parse_float(s, default=None):
+    s = (s or "").strip().replace(",", ".")
+    if not s:
+        return default
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def tariffs_from_config(config):
+    """Тарифы для calculate(): значения из config.json, недостающие — по умолчанию."""
+    return {k: config.get(k, v) for k, v in DEFAULT_TARIFFS.items()}
+
+
+def load_rules(config):
+    """
+    Правила тарифов из config.json (tariff_rules.TariffRules) или None, если правил нет:
+    тогда tariff_rules не импортируется и считают прежние линейные функции. Ошибка в правилах — ValueError.
+    """
+    if not config.get("rules"):
+        return None
+    from tariff_rules import TariffRules
+
+    return TariffRules.from_config(config) or None
+
+
+NOT_FINITE_MESSAGE = "Показания должны быть конечными числами (не nan и не inf)."
+
+
+def validate_readings(inputs):
+    """Проверки как в окне расчёта. Возвращает текст ошибки или None."""
+    # float() принимает «nan» и «inf»: сравнения с NaN всегда ложны, поэтому проверка — первой
+    if not all(isfinite(inputs[k]) for k in inputs):
+        return NOT_FINITE_MESSAGE
+    if any(inputs[k] < 0 for k in inputs):
+        return "Показания не могут быть отрицательными."
+    if inputs["xvs_curr"] < inputs["xvs_prev"] or inputs["gvs_curr"] < inputs["gvs_prev"]:
+        return "Текущие показания воды должны быть не меньше предыдущих."
+    if inputs["el_day_curr"] < inputs["el_day_prev"] or inputs["el_night_curr"] < inputs["el_night_prev"]:
+        return "Текущие показания электричества должны быть не меньше предыдущих."
+    return None
+
+
+# Разбивка результата по разделам — как в окне «Результат» и в квитанциях (statements.py)
+RESULT_SECTIONS = (
+    ("Вода", (
+        ("Водоотведение", "sum_sewage"),
+        ("ХВС", "sum_xvs"),
+        ("Подогрев ГВС", "sum_heating"),
+        ("ГВС", "sum_gvs"),
+        ("Итого за воду", "sum_water"),
+    )),
+    ("Электричество", (
+        ("День", "sum_el_day"),
+        ("Ночь", "sum_el_night"),
+        ("Итого за свет", "sum_electricity"),
+    )),
+)
+TOTAL_LABEL = "ИТОГО (свет+вода)"
+
+
+def consumption_line(cons):
+    return "Расход: ХВС {:.2f} м³, ГВС {:.2f} м³ | эл. день {:.2f}, ночь {:.2f} кВт·ч".format(
+        cons["xvs"], cons["gvs"], cons["el_day"], cons["el_night"]
+    )
+
+
+def result_lines(result):
+    """Текст результата расчёта построчно (суммы в рублях, ключи как у calculate())."""
+    lines = [consumption_line(result["consumption"])]
+    for title, rows in RESULT_SECTIONS:
+        lines += ["", f"——— {title} ———"]
+        lines += [f"  {label + ':':<19}{result[key]:.2f} руб" for label, key in rows]
+    lines += ["", "═══════════════════════", f"  {TOTAL_LABEL + ':':<19}{result['total']:.2f} руб"]
+    return lines
+
+
+def validate_columns(cols):
+    """
+    validate_readings() для пачки: {ключ READING_KEYS: колонка} -> [текст ошибки или None] по строкам.
+    Каждое правило проверяется одним проходом по колонкам целиком (numpy-массивы — средствами numpy);
+    у строки с несколькими нарушениями — та же ошибка, что выдал бы validate_readings().
+    """
+    n = len(cols["xvs_prev"])
+    errors = [None] * n
+    water = ("xvs", "gvs")
+    electricity = ("el_day", "el_night")
+    np = sys.modules.get("numpy")
+    if np is not None and any(isinstance(c, np.ndarray) for c in cols.values()):
+        a = {k: np.asarray(cols[k], dtype=np.float64) for k in READING_KEYS}
+
+        def decreasing(meters):
+            return np.logical_or.reduce([a[m + "_curr"] < a[m + "_prev"] for m in meters])
+
+        negative = np.logical_or.reduce([a[k] < 0 for k in READING_KEYS])
+        not_finite = np.logical_or.reduce([~np.isfinite(a[k]) for k in READING_KEYS])
+        bad = [np.flatnonzero(mask).tolist() for mask in
+               (decreasing(electricity), decreasing(water), negative, not_finite)]
+    else:
+        def decreasing(meters):
+            rows = set()
+            for m in meters:
+                rows.update(compress(count(), map(lt, cols[m + "_curr"], cols[m + "_prev"])))
+            return rows
+
+        negative = set()
+        not_finite = set()
+        for k in READING_KEYS:
+            negative.update(compress(count(), (v < 0 for v in cols[k])))
+            not_finite.update(compress(count(), (not isfinite(v) for v in cols[k])))
+        bad = [decreasing(electricity), decreasing(water), negative, not_finite]
+    # Правила в обратном порядке: следующее перезаписывает предыдущее, как ранний return в validate_readings
+    messages = (
+        "Текущие показания электричества должны быть не меньше предыдущих.",
+        "Текущие показания воды должны быть не меньше предыдущих.",
+        "Показания не могут быть отрицательными.",
+        NOT_FINITE_MESSAGE,
+    )
+    for rows, message in zip(bad, messages):
+        for i in rows:
+            errors[i] = message
+    return errors
+
+
+def parse_readings(readings):
+    """
+    Показания из словаря (числа или строки «12,5») -> {ключ READING_KEYS: float}.
+    Нечисловые, бесконечные (nan, inf), отрицательные и убывающие показания — ValueError с текстом как в окне расчёта.
+    """
+    inputs = {}
+    for key in READING_KEYS:
+        value = readings.get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            value = parse_float(value if isinstance(value, str) else None)
+        if value is None:
+            raise ValueError(f"Не задано числовое значение «{key}».")
+        inputs[key] = float(value)
+    error = validate_readings(inputs)
+    if error:
+        raise ValueError(error)
+    return inputs
@@ -0,0 +1,572 @@
+# -*- coding: utf-8 -*-
+"""
+Колоночное хранение истории в памяти.
+Вместо списка словарей — по колонке на поле: суммы в целых копейках (array "q"),
+показания *_curr — array "d" (нет показания — NaN), дата — число ГГГГММДД, год — array "H",
+период «Октябрь 2025» — номер месяца (другие названия — номер в таблице строк, одинаковые хранятся один раз).
+Около 80 байт на запись против ~1200 у словаря. Удалённые строки помечаются и вычищаются при сжатии журнала.
+Порядок по date_saved и суммы (всего, по годам) поддерживаются инкрементально: добавление и удаление —
+O(log n) (бисекция по блокам порядка, сдвиг внутри одного блока ограниченной длины, см. DateOrder)
+и правка сумм на одну запись, без пересчёта всей истории. Таблицу читают хронология,
+окно истории и аналитика. Словарь записи собирается только по запросу: record(row) или элемент rows(),
+и совпадает с сохранённым, включая тип чисел (целые суммы и показания остаются int).
+
+Таблицу можно сохранить в двоичный файл (save) и открыть его через mmap без разбора (open):
+колонки читаются прямо из файла, такая таблица — только для чтения.
+"""
+import json
+import mmap
+import re
+import struct
+from array import array
+from bisect import bisect_left, insort
+from itertools import islice
+
+from core import MONTHS_RU
+
+SUM_COLUMNS = ("sum_water", "sum_electricity", "total")
+READING_COLUMNS = ("xvs_curr", "gvs_curr", "el_day_curr", "el_night_curr")
+MAGIC = b"ZHKHCOL1"
+_ABSENT = object()  # ключа не было в записи
+_TOTAL = SUM_COLUMNS.index("total")
+_MONTH_FLAG = 0x80000000  # в колонке периода: год * 12 + месяц, а не номер в таблице строк
+_MONTHS = {name: i for i, name in enumerate(MONTHS_RU)}
+_YEAR_RE = re.compile(r"(\d{4})\s*$")
+_ROW_BITS = 32  # ключ порядка: дата ГГГГММДД << 32 | номер строки
+_ROW_MASK = (1 << _ROW_BITS) - 1
+
+
+def record_year(record):
+    """Год периода («Октябрь 2025» -> "2025"), иначе год из date_saved."""
+    m = _YEAR_RE.search(record.get("period") or "")
+    if m:
+        return m.group(1)
+    return (record.get("date_saved") or "")[:4]
+
+
+def _to_kopecks(v):
+    """
+    (копейки, точно ли) — точно, если это float и копейки без потерь превращаются обратно в то же число.
+    Целые (1500) тоже считаются в суммах, но в запись возвращаются из _extras — как int.
+    """
+    if isinstance(v, bool) or not isinstance(v, (int, float)):
+        return 0, False
+    try:
+        k = int(round(v * 100))
+    except (OverflowError, ValueError):
+        return 0, False
+    return k, isinstance(v, float) and k / 100 == v
+
+
+def _date_code(s):
+    """"2025-10-31" -> 20251031; прочие значения -> None."""
+    if isinstance(s, str) and len(s) == 10 and s[4] == "-" and s[7] == "-":
+        digits = s[:4] + s[5:7] + s[8:]
+        if digits.isdigit() and int(digits) and _date_str(int(digits)) == s:
+            return int(digits)
+    return None
+
+
+def _date_str(code):
+    return f"{code // 10000:04d}-{code // 100 % 100:02d}-{code % 100:02d}"
+
+
+def _month_code(s):
+    """"Октябрь 2025" -> 2025 * 12 + 9; прочие названия -> None."""
+    name, _, year = s.partition(" ")
+    month = _MONTHS.get(name)
+    if month is None or len(year) != 4 or not year.isdigit() or year[0] == "0":
+        return None
+    return int(year) * 12 + month
+
+
+def _month_str(code):
+    return f"{MONTHS_RU[code % 12]} {code // 12}"
+
+
+class HistoryColumns:
+    def __init__(self, records=()):
+        self.readonly = False
+        self._ids = array("q")  # id записи в журнале; растут с номером строки
+        self._period = array("I")
+        self._date = array("I")  # ГГГГММДД; 0 — даты нет или она не в этом виде (тогда — в _extras)
+        self._year = array("H")  # год для итогов по годам; 0 — неизвестен
+        self._sums = {f: array("q") for f in SUM_COLUMNS}
+        self._readings = {f: array("d") for f in READING_COLUMNS}
+        self._alive = bytearray()
+        self._strings = [None]
+        self._string_index = {None: 0}
+        self._odd_years = {}  # строка -> год, не похожий на ГГГГ (из обрезанной даты)
+        self._extras = {}  # строка -> {ключ: значение} для редких полей и значений, не влезающих в колонки
+        self._order = DateOrder()  # живые строки по дате, при равных датах — по номеру строки
+        self._sums_total = [0, 0, 0]  # по SUM_COLUMNS, копейки
+        self._by_year = {}  # год -> [count, вода, свет, итого]
+        for r in records:
+            self.append(r)
+
+    # --- Изменение ---
+
+    def append(self, record, rid=None):
+        """Добавляет запись, возвращает номер строки. rid — id из журнала (должен расти)."""
+        self._check_writable()
+        if rid is None:
+            rid = self._ids[-1] + 1 if len(self._ids) else 1
+        elif len(self._ids) and rid <= self._ids[-1]:
+            raise ValueError(f"id записи {rid} меньше предыдущего")
+        row = len(self._ids)
+        self._ids.append(rid)
+        self._alive.append(1)
+        self._write_row(row, record, True)
+        self._insert_order(row)
+        self._account(row, 1)
+        return row
+
+    def replace(self, row, record):
+        self._check_writable()
+        self._account(row, -1)
+        self._remove_order(row)
+        self._write_row(row, record, False)
+        self._insert_order(row)
+        self._account(row, 1)
+
+    def delete(self, row):
+        self._check_writable()
+        if not self._alive[row]:
+            return False
+        self._account(row, -1)
+        self._remove_order(row)
+        self._alive[row] = 0
+        self._extras.pop(row, None)
+        self._odd_years.pop(row, None)
+        return True
+
+    # --- Чтение ---
+
+    def row_of(self, rid):
+        """Номер живой строки с этим id или None (бисекция по колонке id)."""
+        ids = self._ids
+        lo, hi = 0, len(ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ids[mid] < rid:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(ids) and ids[lo] == rid and self._alive[lo]:
+            return lo
+        return None
+
+    def record_id(self, row):
+        return self._ids[row]
+
+    def record(self, row):
+        """Словарь записи, как он был сохранён."""
+        r = {"period": self._period_str(row), "date_saved": self._date_str(row)}
+        for f in SUM_COLUMNS:
+            r[f] = self._sums[f][row] / 100
+        for f in READING_COLUMNS:
+            v = self._readings[f][row]
+            r[f] = None if v != v else v
+        extras = self._extras.get(row)
+        if extras:
+            for k, v in extras.items():
+                if v is _ABSENT:
+                    r.pop(k, None)
+                else:
+                    r[k] = v
+        return r
+
+    def dead(self):
+        """Сколько удалённых строк ещё занимают место в колонках."""
+        return len(self._ids) - len(self._order)
+
+    def live_rows(self):
+        """Живые строки в порядке добавления."""
+        alive = self._alive
+        return [row for row in range(len(alive)) if alive[row]]
+
+    def values(self, field, rows):
+        """Значения поля для строк rows без сборки словарей (поле "year" — год периода)."""
+        if field == "year":
+            return [self._row_year(r) for r in rows]
+        if field == "period":
+            return [self._raw(r, field, self._period_str) for r in rows]
+        if field == "date_saved":
+            return [self._raw(r, field, self._date_str) for r in rows]
+        if field in self._sums:
+            col = self._sums[field]
+            return [col[r] / 100 for r in rows]
+        col = self._readings[field]
+        return [None if col[r] != col[r] else col[r] for r in rows]
+
+    # --- Порядок по дате и суммы ---
+
+    def rows(self):
+        """Записи по возрастанию date_saved — ленивая последовательность, словари собираются при обращении."""
+        return RowsView(self, array("I", self._order) if not self.readonly else self._order)
+
+    def records(self):
+        return [self.record(r) for r in self._order]
+
+    def __len__(self):
+        return len(self._order)
+
+    @property
+    def total(self):
+        return self._sums_total[_TOTAL] / 100
+
+    @property
+    def sum_water(self):
+        return self._sums_total[0] / 100
+
+    @property
+    def sum_electricity(self):
+        return self._sums_total[1] / 100
+
+    @property
+    def average(self):
+        return self.total / len(self._order) if len(self._order) else 0
+
+    def last(self):
+        return self.record(self._order[-1]) if len(self._order) else None
+
+    def last_total(self, k=3):
+        if k <= 0:
+            return 0
+        col = self._sums["total"]
+        return sum(col[r] for r in islice(reversed(self._order), k)) / 100
+
+    def by_year(self):
+        return {
+            year: {"count": c, "total": t / 100, "sum_water": w / 100, "sum_electricity": e / 100}
+            for year, (c, w, e, t) in sorted(self._by_year.items())
+        }
+
+    # --- Двоичный файл ---
+
+    def save(self, path):
+        """Живые строки по порядку дат — в двоичный файл для open()."""
+        order = self._order
+        columns = [("id", self._ids), ("period", self._period), ("date", self._date), ("year", self._year)]
+        columns += [(f, self._sums[f]) for f in SUM_COLUMNS]
+        columns += [(f, self._readings[f]) for f in READING_COLUMNS]
+        blobs = []
+        meta = []
+        offset = 0
+        for name, col in columns:
+            typecode = getattr(col, "typecode", None) or col.format
+            data = array(typecode, [col[r] for r in order]).tobytes()
+            meta.append({"name": name, "typecode": typecode, "itemsize": col.itemsize,
+                         "offset": offset, "nbytes": len(data)})
+            blobs.append(data + b"\0" * (-len(data) % 8))
+            offset += len(blobs[-1])
+        extras = {}
+        for i, r in enumerate(order):
+            e = self._extras.get(r)
+            if e:
+                extras[str(i)] = {"set": {k: v for k, v in e.items() if v is not _ABSENT},
+                                  "absent": [k for k, v in e.items() if v is _ABSENT]}
+        header = json.dumps({
+            "n": len(order), "strings": self._strings, "columns": meta, "extras": extras,
+            "odd_years": {str(i): self._odd_years[r] for i, r in enumerate(order) if r in self._odd_years},
+            "sums": self._sums_total, "by_year": self._by_year,
+        }, ensure_ascii=False).encode("utf-8")
+        head = MAGIC + struct.pack("<I", len(header)) + header
+        with open(path, "wb") as f:
+            f.write(head + b"\0" * (-len(head) % 8))
+            for blob in blobs:
+                f.write(blob)
+
+    @classmethod
+    def open(cls, path):
+        """Таблица поверх файла через mmap: колонки не копируются в память, только чтение."""
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(MAGIC)] != MAGIC:
+            mm.close()
+            raise ValueError(f"{path}: не файл истории")
+        hlen = struct.unpack_from("<I", mm, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        header = json.loads(mm[start:start + hlen].decode("utf-8"))
+        base = start + hlen + (-(start + hlen) % 8)
+        view = memoryview(mm)
+        cols = {}
+        for c in header["columns"]:
+            if array(c["typecode"]).itemsize != c["itemsize"]:
+                raise ValueError(f"{path}: файл записан на машине с другим размером чисел")
+            offset = base + c["offset"]
+            cols[c["name"]] = view[offset:offset + c["nbytes"]].cast(c["typecode"])
+        n = header["n"]
+        t = cls.__new__(cls)
+        t.readonly = True
+        t._mmap = mm
+        t._ids, t._period, t._date, t._year = cols["id"], cols["period"], cols["date"], cols["year"]
+        t._sums = {f: cols[f] for f in SUM_COLUMNS}
+        t._readings = {f: cols[f] for f in READING_COLUMNS}
+        t._alive = b"\1" * n
+        t._strings = header["strings"]
+        t._string_index = {}
+        t._odd_years = {int(i): y for i, y in header["odd_years"].items()}
+        t._extras = {}
+        for i, e in header["extras"].items():
+            extras = dict(e["set"])
+            extras.update((k, _ABSENT) for k in e["absent"])
+            t._extras[int(i)] = extras
+        t._order = range(n)
+        t._sums_total = header["sums"]
+        t._by_year = header["by_year"]
+        return t
+
+    def close(self):
+        """Освобождает файл, открытый через open()."""
+        mm = getattr(self, "_mmap", None)
+        if mm is not None:
+            self._ids = self._period = self._date = self._year = self._sums = self._readings = None
+            self._mmap = None
+            mm.close()
+
+    # --- Внутреннее ---
+
+    def _check_writable(self):
+        if self.readonly:
+            raise TypeError("Таблица открыта из файла только для чтения")
+
+    def _period_str(self, row):
+        code = self._period[row]
+        return _month_str(code & ~_MONTH_FLAG) if code & _MONTH_FLAG else self._strings[code]
+
+    def _date_str(self, row):
+        code = self._date[row]
+        return _date_str(code) if code else None
+
+    def _raw(self, row, field, fmt):
+        """Значение поля как в записи: нестандартные и отсутствующие значения лежат в _extras."""
+        extras = self._extras.get(row)
+        if extras and field in extras:
+            v = extras[field]
+            return None if v is _ABSENT else v
+        return fmt(row)
+
+    def _intern(self, s):
+        i = self._string_index.get(s)
+        if i is None:
+            i = self._string_index[s] = len(self._strings)
+            self._strings.append(s)
+        return i
+
+    def _write_row(self, row, record, new):
+        extras = {}
+        period = record.get("period", _ABSENT)
+        code = _month_code(period) if isinstance(period, str) else None
+        if code is not None:
+            code |= _MONTH_FLAG
+        elif period is None or isinstance(period, str):
+            code = self._intern(period)
+        else:
+            extras["period"] = period
+            code = 0
+        self._put(self._period, row, code, new)
+        date = record.get("date_saved", _ABSENT)
+        code = _date_code(date)
+        if code is None:
+            extras["date_saved"] = date
+            code = 0
+        self._put(self._date, row, code, new)
+        year = record_year({"period": period if isinstance(period, str) else None,
+                            "date_saved": date if isinstance(date, str) else None})
+        self._odd_years.pop(row, None)
+        if len(year) == 4 and year.isdigit() and year[0] != "0":
+            self._put(self._year, row, int(year), new)
+        else:
+            self._put(self._year, row, 0, new)
+            if year:
+                self._odd_years[row] = year
+        for f in SUM_COLUMNS:
+            v = record.get(f, _ABSENT)
+            k, exact = _to_kopecks(v)
+            if not exact:
+                extras[f] = v
+            self._put(self._sums[f], row, k, new)
+        for f in READING_COLUMNS:
+            v = record.get(f, _ABSENT)
+            if v is None:
+                x = float("nan")
+            elif isinstance(v, float):
+                x = v
+            elif isinstance(v, int) and not isinstance(v, bool):
+                x = float(v)  # в колонке — для аналитики, в записи — исходный int
+                extras[f] = v
+            else:
+                extras[f] = v
+                x = float("nan")
+            self._put(self._readings[f], row, x, new)
+        for k, v in record.items():
+            if k not in _KNOWN:
+                extras[k] = v
+        if extras:
+            self._extras[row] = extras
+        else:
+            self._extras.pop(row, None)
+
+    @staticmethod
+    def _put(col, row, value, new):
+        if new:
+            col.append(value)
+        else:
+            col[row] = value
+
+    def _insert_order(self, row):
+        self._order.insert(self._date[row] << _ROW_BITS | row)
+
+    def _remove_order(self, row):
+        self._order.remove(self._date[row] << _ROW_BITS | row)
+
+    def _row_year(self, row):
+        year = self._year[row]
+        return f"{year:04d}" if year else self._odd_years.get(row, "")
+
+    def _account(self, row, sign):
+        kop = [self._sums[f][row] for f in SUM_COLUMNS]
+        for j in range(3):
+            self._sums_total[j] += sign * kop[j]
+        year = self._row_year(row)
+        acc = self._by_year.setdefault(year, [0, 0, 0, 0])
+        acc[0] += sign
+        for j in range(3):
+            acc[j + 1] += sign * kop[j]
+        if acc[0] == 0:
+            del self._by_year[year]
+
+
+_KNOWN = frozenset(("period", "date_saved") + SUM_COLUMNS + READING_COLUMNS)
+
+
+class DateOrder:
+    """
+    Номера строк по ключу (дата << 32 | строка) — список отсортированных блоков не длиннее 2 * LOAD.
+    Вставка и удаление: бисекция по последним ключам блоков и внутри блока — O(log n), сдвиг — только
+    внутри одного блока (не больше 2 * LOAD ключей), а не хвоста всего порядка. Доступ по позиции —
+    спуск по дереву Фенвика из длин блоков, O(log n). Дерево перестраивается целиком только при делении
+    или исчезновении блока — раз на LOAD вставок.
+    """
+
+    LOAD = 512
+
+    def __init__(self):
+        self._blocks = []  # array("q") ключей
+        self._maxes = []  # последний ключ каждого блока
+        self._tree = [0]  # дерево Фенвика по длинам блоков, с единицы
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for block in self._blocks:
+            for key in block:
+                yield key & _ROW_MASK
+
+    def __reversed__(self):
+        for block in reversed(self._blocks):
+            for key in reversed(block):
+                yield key & _ROW_MASK
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("позиция вне порядка")
+        b, j = self._locate(i)
+        return self._blocks[b][j] & _ROW_MASK
+
+    def insert(self, key):
+        blocks, maxes = self._blocks, self._maxes
+        self._len += 1
+        if not blocks:
+            blocks.append(array("q", (key,)))
+            maxes.append(key)
+            self._rebuild()
+            return
+        b = min(bisect_left(maxes, key), len(maxes) - 1)
+        block = blocks[b]
+        insort(block, key)
+        maxes[b] = block[-1]
+        if len(block) > 2 * self.LOAD:
+            half = self.LOAD
+            blocks[b:b + 1] = [block[:half], block[half:]]
+            maxes[b:b + 1] = [block[half - 1], block[-1]]
+            self._rebuild()
+        else:
+            self._add(b, 1)
+
+    def remove(self, key):
+        """Удаляет ключ; False — такого нет."""
+        blocks, maxes = self._blocks, self._maxes
+        b = bisect_left(maxes, key)
+        if b == len(maxes):
+            return False
+        block = blocks[b]
+        j = bisect_left(block, key)
+        if block[j] != key:
+            return False
+        del block[j]
+        self._len -= 1
+        if block:
+            maxes[b] = block[-1]
+            self._add(b, -1)
+        else:
+            del blocks[b], maxes[b]
+            self._rebuild()
+        return True
+
+    def _rebuild(self):
+        tree = [0] + [len(block) for block in self._blocks]
+        for i in range(1, len(tree)):
+            j = i + (i & -i)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _add(self, b, delta):
+        tree = self._tree
+        i = b + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _locate(self, pos):
+        """Позиция -> (блок, место в блоке)."""
+        tree = self._tree
+        b = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = b + step
+            if nxt < len(tree) and tree[nxt] <= pos:
+                b = nxt
+                pos -= tree[nxt]
+            step >>= 1
+        return b, pos
+
+
+class RowsView:
+    """Записи таблицы в заданном порядке; словарь собирается только для запрошенной строки."""
+
+    def __init__(self, table, order):
+        self._table = table
+        self._order = order
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._table.record(r) for r in self._order[i]]
+        return self._table.record(self._order[i])
+
+    def __iter__(self):
+        for r in self._order:
+            yield self._table.record(r)
+
+    def values(self, field):
+        """Колонка поля в порядке этого представления (см. HistoryColumns.values)."""
+        return self._table.values(field, self._order)
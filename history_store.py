@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+Хранилище истории в виде журнала JSON Lines (history.jsonl).
+Каждая строка — одна операция: {"op": "put", "id": N, "rec": {...}} или {"op": "del", "id": N}.
+Добавление и удаление дописывают строку в конец файла — весь файл не переписывается.
+Ключ записи — (period, date_saved), как и раньше при удалении из хронологии.
+Старый history.json переносится в журнал автоматически при первом чтении.
+
+Разобранные записи держатся в памяти в колоночном виде (history_columns.HistoryColumns):
+повторное чтение сверяет только mtime и размер файла (os.stat),
+а собственные записи приложения обновляют таблицу на месте.
+
+С defer=True изменения сразу видны в памяти, а на диск уходят при flush() —
+окно вызывает его из фонового потока записи (persist.BackgroundWriter).
+"""
+import json
+import os
+import threading
+
+from history_columns import HistoryColumns
+from instrument import traced
+from persist import atomic_write_text
+
+
+def record_key(record):
+    return (record.get("period"), record.get("date_saved"))
+
+
+class HistoryStore:
+    # Журнал сжимается, когда мёртвых строк больше, чем живых, и их набралось достаточно
+    COMPACT_MIN_DEAD = 1000
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._table = HistoryColumns()  # записи, id, порядок по дате и суммы
+        self._by_key = None  # (period, date_saved) -> [id, ...]; строится при первом удалении
+        self._next_id = 1
+        self._lines = 0
+        self._needs_newline = False
+        self._loaded = False
+        self._stat = None  # (mtime_ns, size) файла на момент последнего чтения/записи
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0  # повреждённых строк при последнем чтении
+        self.defer = False
+        self._lock = threading.Lock()  # очередь изменений
+        self._flush_lock = threading.Lock()  # одна запись на диск за раз
+        self._pending = []  # операции, ещё не записанные на диск
+        self._snapshot = None  # [(id, запись)] для полной перезаписи
+        self._inflight = 0
+
+    @traced("history_parse")
+    def load(self):
+        """Читает журнал с диска и возвращает список записей в порядке добавления."""
+        self.misses += 1
+        self._migrate_legacy()
+        self._table = HistoryColumns()
+        self._by_key = None
+        self._next_id = 1
+        self._lines = 0
+        self._needs_newline = False
+        self.skipped = 0
+        if os.path.isfile(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self._needs_newline = not line.endswith("\n")
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        op = json.loads(line)
+                        self._apply(op)
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        # Недописанная строка после сбоя — пропускаем, но считаем
+                        self.skipped += 1
+                        continue
+                    self._lines += 1
+        self._loaded = True
+        self._stat = self._stat_file()
+        return self._live_records()
+
+    def records(self):
+        """Записи в порядке добавления; с диска перечитываются, только если файл изменился."""
+        if self._is_stale():
+            return self.load()
+        self.hits += 1
+        return self._live_records()
+
+    def sorted_records(self):
+        """Записи, отсортированные по date_saved (при равных датах — в порядке добавления)."""
+        return self.aggregates().records()
+
+    def aggregates(self):
+        """
+        HistoryColumns с порядком по дате и суммами (всего, по годам),
+        обновляется на месте при собственных записях приложения.
+        """
+        if self._is_stale():
+            self.load()
+        else:
+            self.hits += 1
+        return self._table
+
+    def cache_stats(self):
+        return {"hits": self.hits, "misses": self.misses, "records": len(self._table)}
+
+    def append(self, record):
+        """Дописывает запись в конец журнала, возвращает её id."""
+        self._ensure_loaded()
+        rid = self._next_id
+        op = {"op": "put", "id": rid, "rec": record}
+        self._write([op])
+        self._apply(op)
+        return rid
+
+    def extend(self, records):
+        """Дописывает несколько записей одной порцией строк журнала, возвращает их id."""
+        self._ensure_loaded()
+        ops = [{"op": "put", "id": self._next_id + i, "rec": r} for i, r in enumerate(records)]
+        if not ops:
+            return []
+        self._write(ops)
+        for op in ops:
+            self._apply(op)
+        return [op["id"] for op in ops]
+
+    def delete(self, key):
+        """Удаляет все записи с ключом (period, date_saved). Возвращает число удалённых."""
+        self._ensure_loaded()
+        ops = [{"op": "del", "id": rid} for rid in self._key_index().get(tuple(key), ())]
+        if not ops:
+            return 0
+        self._write(ops)
+        for op in ops:
+            self._apply(op)
+        self._maybe_compact()
+        return len(ops)
+
+    def upsert(self, record):
+        """Заменяет записи с тем же ключом на новую (одной дописанной порцией строк)."""
+        self._ensure_loaded()
+        ops = [{"op": "del", "id": rid} for rid in self._key_index().get(record_key(record), ())]
+        ops.append({"op": "put", "id": self._next_id, "rec": record})
+        self._write(ops)
+        for op in ops:
+            self._apply(op)
+        self._maybe_compact()
+        return ops[-1]["id"]
+
+    def replace_all(self, records):
+        """Полная перезапись журнала (для массовых операций)."""
+        self._table = HistoryColumns()
+        self._by_key = None
+        self._next_id = 1
+        for record in records:
+            self._apply({"op": "put", "id": self._next_id, "rec": record})
+        self._loaded = True
+        self._rewrite()
+
+    def compact(self):
+        """Переписывает журнал, оставляя только живые записи (temp-файл + rename)."""
+        self._ensure_loaded()
+        self._rewrite()
+
+    def flush(self):
+        """Записывает на диск накопленные изменения одной операцией. Безопасно вызывать из другого потока."""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            ops, self._pending = self._pending, []
+            snapshot, self._snapshot = self._snapshot, None
+            if not ops and snapshot is None:
+                return
+            needs_newline = self._needs_newline
+            self._inflight += 1
+        try:
+            if snapshot is not None:
+                atomic_write_text(self.path, "".join(_dump({"op": "put", "id": rid, "rec": r}) for rid, r in snapshot))
+                needs_newline = False
+            if ops:
+                data = "".join(_dump(op) for op in ops)
+                if needs_newline:
+                    data = "\n" + data
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+        except Exception:
+            with self._lock:
+                # Не записалось — вернём в очередь, следующий flush() попробует снова.
+                # Если за это время журнал решили переписать целиком, новый снимок уже включает ops
+                if self._snapshot is None:
+                    self._snapshot = snapshot
+                    self._pending[:0] = ops
+                self._inflight -= 1
+            raise
+        with self._lock:
+            self._inflight -= 1
+            self._needs_newline = False
+            self._stat = self._stat_file()
+
+    def pending(self):
+        """Есть ли изменения, ещё не записанные на диск."""
+        with self._lock:
+            return bool(self._pending) or self._snapshot is not None or self._inflight > 0
+
+    def _rewrite(self):
+        table = self._table
+        snapshot = [(table.record_id(row), table.record(row)) for row in table.live_rows()]
+        if table.dead():
+            # Удалённые строки вычищаем и из колонок
+            table = HistoryColumns()
+            for rid, record in snapshot:
+                table.append(record, rid)
+            self._table = table
+        with self._lock:
+            self._snapshot = snapshot
+            self._pending = []
+        self._lines = len(table)
+        if not self.defer:
+            self.flush()
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._table)
+
+    def _ensure_loaded(self):
+        if self._is_stale():
+            self.load()
+
+    def _stat_file(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _is_stale(self):
+        if not self._loaded:
+            return True
+        if self.pending():
+            # Файл сейчас меняем мы сами — память новее диска
+            return False
+        return self._stat_file() != self._stat
+
+    def _live_records(self):
+        table = self._table
+        return [table.record(row) for row in table.live_rows()]
+
+    def _key_index(self):
+        if self._by_key is None:
+            table = self._table
+            rows = table.live_rows()
+            self._by_key = {}
+            for row, key in zip(rows, zip(table.values("period", rows), table.values("date_saved", rows))):
+                self._by_key.setdefault(key, []).append(table.record_id(row))
+        return self._by_key
+
+    def _unindex(self, row):
+        if self._by_key is not None:
+            table = self._table
+            key = (table.values("period", [row])[0], table.values("date_saved", [row])[0])
+            ids = self._by_key.get(key)
+            if ids:
+                ids.remove(table.record_id(row))
+                if not ids:
+                    del self._by_key[key]
+
+    def _apply(self, op):
+        rid = op["id"]
+        table = self._table
+        if op["op"] == "put":
+            record = op["rec"]
+            if not isinstance(record, dict):
+                raise TypeError("record must be a dict")
+            row = table.row_of(rid)
+            if row is not None:
+                # Повтор строки (запись повторили после сбоя) — заменяет прежнюю
+                self._unindex(row)
+                table.replace(row, record)
+            else:
+                table.append(record, rid)
+            if self._by_key is not None:
+                self._by_key.setdefault(record_key(record), []).append(rid)
+            self._next_id = max(self._next_id, rid + 1)
+        elif op["op"] == "del":
+            row = table.row_of(rid)
+            if row is not None:
+                self._unindex(row)
+                table.delete(row)
+
+    def _write(self, ops):
+        with self._lock:
+            self._pending.extend(ops)
+        self._lines += len(ops)
+        if not self.defer:
+            self.flush()
+
+    def _maybe_compact(self):
+        dead = self._lines - len(self._table)
+        if dead >= self.COMPACT_MIN_DEAD and dead > len(self._table):
+            self._rewrite()
+
+    def _migrate_legacy(self):
+        """history.json (JSON-массив) -> history.jsonl; старый файл остаётся как .bak."""
+        legacy = self.legacy_path
+        if not legacy or os.path.isfile(self.path) or not os.path.isfile(legacy):
+            return
+        with open(legacy, "r", encoding="utf-8") as f:
+            records = json.load(f)  # обрезанный файл — ошибка, а не пустая история
+        if not isinstance(records, list):
+            raise ValueError(f"{legacy}: ожидался список записей")
+        self.replace_all([r for r in records if isinstance(r, dict)])
+        self.flush()
+        os.replace(legacy, legacy + ".bak")
+
+
+def iter_journal(path):
+    """
+    Живые записи журнала по одной, без загрузки файла в память (подходит и для JSON Lines с записями).
+    Два прохода: сначала собираются id удалённых записей, затем отдаются остальные в порядке добавления.
+    Недописанные строки пропускаются, как при load().
+    """
+    deleted = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if '"del"' in line:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(op, dict) and op.get("op") == "del":
+                    deleted.add(op.get("id"))
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(item, dict):
+                continue
+            if "op" not in item:
+                yield item
+            elif item["op"] == "put" and item.get("id") not in deleted and isinstance(item.get("rec"), dict):
+                yield item["rec"]
+
+
+def iter_json_array(f, block=1 << 16, max_item=1 << 24):
+    """
+    Элементы JSON-массива (старый history.json) по одному: файл читается блоками,
+    в памяти — блок и текущий элемент. Обрезанный или испорченный файл — ValueError.
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(block)
+    pos = 0
+    started = False
+    while True:
+        # Пропуск пробелов и разделителей между элементами
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                break
+            more = f.read(block)
+            if not more:
+                raise ValueError("Файл истории обрезан: нет закрывающей «]»")
+            buf, pos = more, 0
+        c = buf[pos]
+        if not started:
+            if c != "[":
+                raise ValueError("Ожидался JSON-массив записей")
+            started = True
+            pos += 1
+            continue
+        if c == "]":
+            return
+        if c == ",":
+            pos += 1
+            continue
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                more = f.read(block)
+                if not more:
+                    raise ValueError("Файл истории обрезан посреди записи")
+                if len(buf) - pos > max_item:
+                    raise ValueError("Испорченная запись в файле истории")
+                buf, pos = buf[pos:] + more, 0
+                continue
+            if end == len(buf):
+                # Число в конце блока могло оборваться — дочитываем и разбираем ещё раз
+                more = f.read(block)
+                if more:
+                    buf, pos = buf[pos:] + more, 0
+                    continue
+            break
+        pos = end
+        yield item
+
+
+def iter_history_file(path):
+    """Записи любого файла истории по одной: history.json (массив), history.jsonl (журнал) или JSON Lines."""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        head = f.read(64).lstrip()
+        if head.startswith("["):
+            f.seek(0)
+            for item in iter_json_array(f):
+                if isinstance(item, dict):
+                    yield item
+            return
+    yield from iter_journal(path)
+
+
+def _dump(op):
+    return json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n"
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Виртуальная прокрутка истории: в виджете живут только видимые строки (плюс небольшой запас),
+при прокрутке они переиспользуются и заполняются из индекса.
+Сортировка и фильтры (период, год, сумма) работают над индексом в памяти, виджеты не пересоздаются.
+"""
+import tkinter as tk
+from tkinter import ttk
+
+from history_columns import record_year
+
+
+class HistoryIndex:
+    """Порядок и фильтр записей истории — списки индексов поверх исходного списка записей."""
+
+    COLUMN_KEYS = {
+        "period": lambda r: (record_year(r), r.get("period") or ""),
+        "water": lambda r: r.get("sum_water") or 0,
+        "electricity": lambda r: r.get("sum_electricity") or 0,
+        "total": lambda r: r.get("total") or 0,
+        "date": lambda r: r.get("date_saved") or "",
+    }
+    # Те же ключи, но прямо из колонок HistoryColumns (без сборки словарей)
+    COLUMN_FIELDS = {"water": "sum_water", "electricity": "sum_electricity", "total": "total", "date": "date_saved"}
+
+    def __init__(self, records, sort_column="date", reverse=True):
+        self.sort_column = sort_column
+        self.reverse = reverse
+        self._filters = {}
+        self.set_records(records)
+
+    def set_records(self, records):
+        """records — записи, уже отсортированные по date_saved: список словарей или HistoryColumns.rows()."""
+        self._records = records
+        self._keys = {}
+        self._order = None
+        self._apply()
+
+    def sort(self, column, reverse=None):
+        if reverse is None:
+            reverse = not self.reverse if column == self.sort_column else False
+        self.sort_column = column
+        self.reverse = reverse
+        self._order = None
+        self._apply()
+
+    def filter(self, period=None, year=None, min_total=None, max_total=None):
+        self._filters = {
+            "period": (period or "").strip().lower() or None,
+            "year": year or None,
+            "min_total": min_total,
+            "max_total": max_total,
+        }
+        self._apply()
+
+    def years(self):
+        return sorted({year for year, _ in self._column_keys("period") if year}, reverse=True)
+
+    def __len__(self):
+        return len(self._view)
+
+    def __getitem__(self, i):
+        return self._records[self._view[i]]
+
+    def row(self, i):
+        r = self[i]
+        return (
+            r.get("period", ""),
+            f"{r.get('sum_water', 0):.2f}",
+            f"{r.get('sum_electricity', 0):.2f}",
+            f"{r.get('total', 0):.2f}",
+            r.get("date_saved", ""),
+        )
+
+    def _column_keys(self, column):
+        keys = self._keys.get(column)
+        if keys is None:
+            values = getattr(self._records, "values", None)
+            if values is None:
+                key = self.COLUMN_KEYS[column]
+                keys = [key(r) for r in self._records]
+            elif column == "period":
+                keys = [(year, period or "") for year, period in zip(values("year"), values("period"))]
+            else:
+                empty = "" if column == "date" else 0
+                keys = [v or empty for v in values(self.COLUMN_FIELDS[column])]
+            self._keys[column] = keys
+        return keys
+
+    def _apply(self):
+        if self._order is None:
+            order = list(range(len(self._records)))
+            # Записи уже идут по дате — для этой колонки достаточно развернуть список
+            if self.sort_column != "date":
+                order.sort(key=self._column_keys(self.sort_column).__getitem__)
+            if self.reverse:
+                order.reverse()
+            self._order = order
+        f = self._filters
+        if not any(v is not None for v in f.values()):
+            self._view = self._order
+            return
+        periods = self._column_keys("period")
+        totals = self._column_keys("total")
+        view = []
+        for i in self._order:
+            year, period = periods[i]
+            if f["period"] and f["period"] not in period.lower():
+                continue
+            if f["year"] and year != f["year"]:
+                continue
+            if f["min_total"] is not None and totals[i] < f["min_total"]:
+                continue
+            if f["max_total"] is not None and totals[i] > f["max_total"]:
+                continue
+            view.append(i)
+        self._view = view
+
+
+class ListSource:
+    """Источник строк для виртуального виджета: список элементов и функция форматирования строки."""
+
+    def __init__(self, items, fmt):
+        self.items = items
+        self.fmt = fmt
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def row(self, i):
+        return self.fmt(self.items[i])
+
+
+class _VirtualScroll:
+    """Общая часть: смещение, полоса прокрутки, колесо мыши, кэш отформатированных строк."""
+
+    BUFFER = 20  # строк про запас сверху и снизу от видимых
+
+    def _init_scroll(self, widget, scrollbar, source, rows):
+        self._widget = widget
+        self._scrollbar = scrollbar
+        self.source = source
+        self.rows = rows
+        self.offset = 0
+        self._cache = {}
+        scrollbar.configure(command=self._on_scrollbar)
+        widget.bind("<MouseWheel>", self._on_wheel)
+        widget.bind("<Button-4>", lambda e: self.scroll(-3))
+        widget.bind("<Button-5>", lambda e: self.scroll(3))
+
+    def set_source(self, source):
+        self.source = source
+        self.refresh()
+
+    def refresh(self):
+        """Перерисовать после изменения данных, сортировки или фильтра."""
+        self._cache = {}
+        self.offset = max(0, min(self.offset, len(self.source) - self.rows))
+        self._render()
+
+    def scroll(self, delta):
+        return self.scroll_to(self.offset + delta)
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, len(self.source) - self.rows))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+        return "break"
+
+    def _on_wheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(value) * len(self.source)))
+        elif action == "scroll":
+            step = self.rows if unit == "pages" else 1
+            self.scroll(int(value) * step)
+
+    def _visible_rows(self):
+        n = len(self.source)
+        first, last = self.offset, min(self.offset + self.rows, n)
+        lo, hi = max(0, first - self.BUFFER), min(n, last + self.BUFFER)
+        cache = {i: self._cache[i] for i in range(lo, hi) if i in self._cache}
+        for i in range(lo, hi):
+            if i not in cache:
+                cache[i] = self.source.row(i)
+        self._cache = cache
+        if n:
+            self._scrollbar.set(first / n, last / n)
+        else:
+            self._scrollbar.set(0, 1)
+        return [cache[i] for i in range(first, last)]
+
+
+class VirtualTreeview(_VirtualScroll):
+    """ttk.Treeview с фиксированным числом строк-элементов, которые переиспользуются при прокрутке."""
+
+    def __init__(self, master, source, columns, height=12, on_sort=None):
+        self.frame = ttk.Frame(master)
+        names = [c[0] for c in columns]
+        self.tree = ttk.Treeview(self.frame, columns=names, show="headings", height=height, selectmode="none")
+        for name, title, width in columns:
+            self.tree.heading(name, text=title, command=(lambda n=name: on_sort(n)) if on_sort else "")
+            self.tree.column(name, width=width)
+        scroll = ttk.Scrollbar(self.frame, orient=tk.VERTICAL)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self._iids = [self.tree.insert("", tk.END, values=()) for _ in range(height)]
+        self._shown = height
+        self._init_scroll(self.tree, scroll, source, height)
+        self.tree.bind("<Up>", lambda e: self.scroll(-1))
+        self.tree.bind("<Down>", lambda e: self.scroll(1))
+        self.tree.bind("<Prior>", lambda e: self.scroll(-self.rows))
+        self.tree.bind("<Next>", lambda e: self.scroll(self.rows))
+        self.refresh()
+
+    def _render(self):
+        values = self._visible_rows()
+        n = len(values)
+        for k, iid in enumerate(self._iids):
+            if k < n:
+                self.tree.item(iid, values=values[k])
+                if k >= self._shown:
+                    self.tree.move(iid, "", k)
+            elif k < self._shown:
+                self.tree.detach(iid)
+        self._shown = n
+
+
+class VirtualListbox(_VirtualScroll):
+    """tk.Listbox, в котором лежат только видимые строки; source.row(i) возвращает текст строки."""
+
+    def __init__(self, listbox, scrollbar, source, height):
+        self.listbox = listbox
+        listbox.configure(yscrollcommand="")
+        self._init_scroll(listbox, scrollbar, source, height)
+        # Стрелки и страницы двигают выделение по всем записям, а не только по строкам в Listbox
+        listbox.bind("<Up>", lambda e: self.move_selection(-1))
+        listbox.bind("<Down>", lambda e: self.move_selection(1))
+        listbox.bind("<Prior>", lambda e: self.move_selection(-self.rows))
+        listbox.bind("<Next>", lambda e: self.move_selection(self.rows))
+        self.refresh()
+
+    def index_of(self, listbox_index):
+        """Номер записи в source для строки listbox."""
+        return self.offset + listbox_index
+
+    def move_selection(self, delta):
+        """
+        Сдвинуть выделение на delta записей, прокрутив окно строк, чтобы выбранная была видна;
+        выбор сообщается <<ListboxSelect>>, как при щелчке.
+        """
+        n = len(self.source)
+        if not n:
+            return "break"
+        sel = self.listbox.curselection()
+        current = self.index_of(sel[0]) if sel else None
+        target = max(0, min(self.offset if current is None else current + delta, n - 1))
+        if target == current:
+            return "break"
+        if target < self.offset:
+            self.scroll_to(target)
+        elif target >= self.offset + self.rows:
+            self.scroll_to(target - self.rows + 1)
+        row = target - self.offset
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(row)
+        self.listbox.activate(row)
+        self.listbox.event_generate("<<ListboxSelect>>")
+        return "break"
+
+    def _render(self):
+        self.listbox.delete(0, tk.END)
+        for text in self._visible_rows():
+            self.listbox.insert(tk.END, text)
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Импорт показаний из выгрузки управляющей компании (CSV) в историю — вместо ручного ввода по периодам.
+
+    python importer.py export.csv [--rejects rejected.csv] [--dry-run] [--config config.json]
+
+В файле — заголовок со столбцами period и 8 столбцами показаний (xvs_prev, xvs_curr, ..., el_night_curr),
+необязательный столбец date_saved (иначе — сегодняшняя дата). Десятичная запятая допускается,
+разделитель «,» или «;» определяется по заголовку (или задаётся --delimiter).
+
+Импорт — цепочка генераторов: чтение строк -> разбор чисел (parse_float) -> проверка -> расчёт -> запись.
+Строки идут пачками по --chunk: проверки окна расчёта (конечные — не nan и не inf — и неотрицательные
+показания, текущие не меньше предыдущих) выполняются по колонкам пачки (core.validate_columns),
+расчёт — пакетно в копейках по тарифам периода, как при сохранении из окна. Каждая пачка дописывается в журнал одной порцией,
+поэтому в памяти одновременно одна пачка, сколько бы строк ни было в файле.
+Отклонённые строки не прерывают импорт: они выдаются с номером строки файла и причиной.
+"""
+import argparse
+import csv
+import sys
+from array import array
+from datetime import datetime
+
+from core import READING_KEYS, extend_history, load_config, parse_float, validate_columns
+from tariff_rules import TariffRules
+from tariff_schedule import TariffSchedule
+
+REQUIRED_FIELDS = ("period",) + READING_KEYS
+REJECT_FIELDS = ("line", "period", "error")
+_CURR_KEYS = ("xvs_curr", "gvs_curr", "el_day_curr", "el_night_curr")
+
+
+class Chunk:
+    """Пачка строк файла: колонки показаний и то, что отклонено по дороге."""
+
+    def __init__(self):
+        self.lines = []  # номера строк файла
+        self.periods = []
+        self.dates = []
+        self.cols = {k: array("d") for k in READING_KEYS}
+        self.records = []  # готовые записи истории (после compute)
+        self.rejected = []  # (номер строки, период, причина)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def keep(self, mask):
+        """Оставляет строки, где mask истинно."""
+        self.lines = [x for x, ok in zip(self.lines, mask) if ok]
+        self.periods = [x for x, ok in zip(self.periods, mask) if ok]
+        self.dates = [x for x, ok in zip(self.dates, mask) if ok]
+        self.cols = {k: array("d", (x for x, ok in zip(col, mask) if ok)) for k, col in self.cols.items()}
+
+
+def detect_delimiter(f):
+    """«;» для выгрузок Excel, иначе «,» — по строке заголовка; файл остаётся в начале."""
+    pos = f.tell()
+    header = f.readline()
+    f.seek(pos)
+    return ";" if header.count(";") > header.count(",") else ","
+
+
+def read_rows(f, delimiter=","):
+    """Строки CSV по одной: (номер строки файла, {столбец: сырое значение}). Без нужных столбцов — ValueError."""
+    reader = csv.reader(f, delimiter=delimiter)
+    header = [h.strip() for h in next(reader, [])]
+    missing = [k for k in REQUIRED_FIELDS if k not in header]
+    if missing:
+        raise ValueError("В файле нет столбцов: " + ", ".join(missing))
+    fields = REQUIRED_FIELDS + (("date_saved",) if "date_saved" in header else ())
+    index = [header.index(k) for k in fields]
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        values = {k: row[i] if i < len(row) else None for k, i in zip(fields, index)}
+        yield reader.line_num, values
+
+
+def parse(rows, chunk_size=2000, today=None):
+    """Разбор чисел и периода; строки с пустыми или нечисловыми значениями сразу уходят в rejected."""
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    chunk = Chunk()
+    for line, values in rows:
+        period = (values["period"] or "").strip()
+        nums = [parse_float(values[k]) for k in READING_KEYS]
+        bad = [k for k, v in zip(READING_KEYS, nums) if v is None]
+        if not period:
+            chunk.rejected.append((line, period, "Не указан период."))
+        elif bad:
+            chunk.rejected.append((line, period, f"Не число: {', '.join(bad)}"))
+        else:
+            chunk.lines.append(line)
+            chunk.periods.append(period)
+            chunk.dates.append((values.get("date_saved") or "").strip() or today)
+            for k, v in zip(READING_KEYS, nums):
+                chunk.cols[k].append(v)
+        if len(chunk) + len(chunk.rejected) >= chunk_size:
+            yield chunk
+            chunk = Chunk()
+    if len(chunk) or chunk.rejected:
+        yield chunk
+
+
+def validate(chunks):
+    """Правила окна расчёта по колонкам пачки; нарушившие строки — в rejected."""
+    for chunk in chunks:
+        if len(chunk):
+            errors = validate_columns(chunk.cols)
+            if any(errors):
+                for line, period, error in zip(chunk.lines, chunk.periods, errors):
+                    if error:
+                        chunk.rejected.append((line, period, error))
+                chunk.keep([e is None for e in errors])
+                chunk.rejected.sort()  # по номеру строки файла
+        yield chunk
+
+
+def compute(chunks, schedule, rules=None):
+    """
+    Расчёт в копейках по тарифам периода каждой строки и правилам тарифов (tariff_rules);
+    строки с одинаковыми тарифами — одной пачкой.
+    """
+    rules = rules or TariffRules()
+    for chunk in chunks:
+        groups = {}
+        for i, period in enumerate(chunk.periods):
+            tariffs = schedule.for_period(period)
+            groups.setdefault(id(tariffs), (tariffs, []))[1].append(i)
+        records = [None] * len(chunk)
+        for tariffs, rows in groups.values():
+            cols = {k: [chunk.cols[k][i] for i in rows] for k in READING_KEYS}
+            res = rules.plan(tariffs).batch(**cols)
+            for j, i in enumerate(rows):
+                record = {
+                    "period": chunk.periods[i],
+                    "date_saved": chunk.dates[i],
+                    "sum_water": res["sum_water"][j] / 100,
+                    "sum_electricity": res["sum_electricity"][j] / 100,
+                    "total": res["total"][j] / 100,
+                }
+                for k in _CURR_KEYS:
+                    record[k] = chunk.cols[k][i]
+                records[i] = record
+        chunk.records = records
+        yield chunk
+
+
+def store(chunks, append=extend_history):
+    """Запись готовых пачек в историю; при ошибке записи — OSError, уже записанные пачки остаются."""
+    for chunk in chunks:
+        if chunk.records and not append(chunk.records):
+            raise OSError("Не удалось дописать history.jsonl.")
+        yield chunk
+
+
+def import_readings(f, schedule, delimiter=None, chunk_size=2000, dry_run=False, today=None, rules=None):
+    """
+    Вся цепочка целиком. Генератор пачек: у каждой records — записанные в историю записи,
+    rejected — отклонённые строки с причинами. dry_run=True — посчитать и проверить, ничего не записывая.
+    rules — TariffRules из config.json (по умолчанию — без правил, линейные тарифы).
+    """
+    delimiter = delimiter or detect_delimiter(f)
+    chunks = compute(validate(parse(read_rows(f, delimiter), chunk_size, today)), schedule, rules)
+    return chunks if dry_run else store(chunks)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Импорт показаний из CSV в историю.")
+    p.add_argument("input", help="CSV выгрузки («-» — stdin)")
+    p.add_argument("--delimiter", help="разделитель столбцов (по умолчанию — по заголовку)")
+    p.add_argument("--chunk", type=int, default=2000, help="строк в пачке")
+    p.add_argument("--rejects", help="записать отклонённые строки в этот CSV (иначе — в stderr)")
+    p.add_argument("--dry-run", action="store_true", help="только проверить и посчитать, историю не менять")
+    p.add_argument("--config", help="путь к config.json")
+    args = p.parse_args(argv)
+
+    config = load_config(args.config)
+    try:
+        schedule, rules = TariffSchedule.from_config(config), TariffRules.from_config(config)
+    except ValueError as e:
+        p.error(f"config.json: {e}")
+    if args.input == "-" and not args.delimiter:
+        p.error("для stdin укажите --delimiter")
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8-sig", newline="")
+    rejects = open(args.rejects, "w", encoding="utf-8", newline="") if args.rejects else None
+    out = csv.writer(rejects, lineterminator="\n") if rejects else None
+    if out:
+        out.writerow(REJECT_FIELDS)
+    imported = rejected = 0
+    try:
+        for chunk in import_readings(src, schedule, args.delimiter, args.chunk, args.dry_run, rules=rules):
+            imported += len(chunk.records)
+            rejected += len(chunk.rejected)
+            for line, period, error in chunk.rejected:
+                if out:
+                    out.writerow((line, period, error))
+                else:
+                    print(f"Строка {line} ({period or 'без периода'}): {error}", file=sys.stderr)
+    except (ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if rejects:
+            rejects.close()
+    verb = "Проверено" if args.dry_run else "Импортировано"
+    print(f"{verb}: {imported}, отклонено: {rejected}", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Замеры времени в горячих местах (чтение/запись истории и тарифов, расчёт, обновление списков).
+Включаются переменной окружения ZHKH_TRACE=1; при выключенных замерах @traced возвращает
+функцию как есть, без обёртки, — накладных расходов нет.
+Каждый интервал пишется строкой JSON в trace.jsonl (с ротацией по размеру)
+и копится в памяти для окна «Диагностика» (p50/p95/max).
+"""
+import os
+import time
+from collections import deque
+
+ENABLED = os.environ.get("ZHKH_TRACE", "") not in ("", "0")
+MAX_BYTES = 1_000_000  # размер trace.jsonl, после которого он переименовывается в trace.jsonl.1
+BACKUPS = 3
+KEEP = 2000  # последних замеров на интервал для процентилей
+
+_samples = {}  # имя -> deque длительностей, мс
+_counts = {}
+_log_path = os.environ.get("ZHKH_TRACE_LOG") or None
+_log = None
+
+
+def configure(log_path):
+    """Путь к журналу замеров (по умолчанию — trace.jsonl рядом с программой, задаёт core)."""
+    global _log_path, _log
+    if not os.environ.get("ZHKH_TRACE_LOG"):
+        if _log is not None:
+            _log.close()
+            _log = None
+        _log_path = log_path
+
+
+def traced(name):
+    """Декоратор: замер времени вызова под именем name."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, (time.perf_counter() - t0) * 1000)
+
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+    return decorate
+
+
+def record(name, ms):
+    samples = _samples.get(name)
+    if samples is None:
+        samples = _samples[name] = deque(maxlen=KEEP)
+    samples.append(ms)
+    _counts[name] = _counts.get(name, 0) + 1
+    _write(name, ms)
+
+
+def stats():
+    """{имя: {"count", "p50", "p95", "max"}} по последним KEEP замерам, мс."""
+    out = {}
+    for name, samples in sorted(_samples.items()):
+        values = sorted(samples)
+        n = len(values)
+        out[name] = {
+            "count": _counts[name],
+            "p50": values[(n - 1) // 2],
+            "p95": values[min(n - 1, int(n * 0.95))],
+            "max": values[-1],
+        }
+    return out
+
+
+def _write(name, ms):
+    global _log
+    if not _log_path:
+        return
+    try:
+        if _log is None:
+            _log = open(_log_path, "a", encoding="utf-8")
+        _log.write(f'{{"ts": {time.time():.3f}, "span": "{name}", "ms": {ms:.3f}}}\n')
+        _log.flush()
+        if _log.tell() >= MAX_BYTES:
+            _rotate()
+    except OSError:
+        pass
+
+
+def _rotate():
+    global _log
+    _log.close()
+    _log = None
+    for i in range(BACKUPS - 1, 0, -1):
+        src = f"{_log_path}.{i}"
+        if os.path.exists(src):
+            os.replace(src, f"{_log_path}.{i + 1}")
+    os.replace(_log_path, _log_path + ".1")
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Расчёт при вводе показаний (режим «Считать при вводе» в окне).
+
+LiveCalc помнит показания, расходы и строки счёта в копейках с прошлого нажатия:
+правка показания одного счётчика пересчитывает только его строки (ГВС — водоотведение, подогрев и ГВС;
+свет день — только «День», при общей норме зон — и «Ночь»), итоги складываются из готовых строк.
+Строки — из плана tariff_rules.TariffPlan, результат тот же, что у TariffPlan.calculate().
+LiveSession — отложенный запуск: серия нажатий даёт один расчёт через delay_ms после последнего;
+некорректный ввод вместо результата показывает причину и сбрасывает прошлый результат.
+changed_lines() сравнивает новый текст результата с показанным, show_lines() переписывает в поле tk.Text
+только изменившиеся строки.
+Без tkinter (таймер — любой объект с after/after_cancel, в окне — tk.Tk): проверки — tests/test_live.py,
+замер задержки — `python bench.py live`.
+"""
+from calc import CONSUMPTION_FIELDS, SUM_FIELDS
+from core import result_lines, validate_readings
+from instrument import traced
+from money import SCALE, to_scaled
+from tariff_rules import METERS
+
+# Бюджет на пересчёт и обновление поля результата после нажатия — один кадр при 60 Гц, мс
+LIVE_FRAME_BUDGET_MS = 16
+_WATER = ("sum_sewage", "sum_xvs", "sum_heating", "sum_gvs")
+_ELECTRICITY = ("sum_el_day", "sum_el_night")
+
+
+class LiveCalc:
+    def __init__(self, plan):
+        """plan — tariff_rules.TariffPlan: тарифы версии и правила строк счёта."""
+        self.set_plan(plan)
+
+    def set_plan(self, plan):
+        """Новые тарифы или правила: все строки будут пересчитаны при следующем update()."""
+        self.plan = plan
+        self._readings = {}  # счётчик -> (прошлое, текущее) в 1/SCALE
+        self._cons = {}
+        self._sums = {}
+        self.recomputed = 0  # сколько строк счёта пересчитано (для замеров)
+
+    def update(self, inputs):
+        """
+        Показания (ключи READING_KEYS) -> (результат как у plan.calculate(), изменившиеся ключи SUM_FIELDS).
+        Строки счёта, не зависящие от изменившихся счётчиков, берутся из прошлого вызова.
+        """
+        meters = set()
+        for m in METERS:
+            pair = (to_scaled(inputs[m + "_prev"]), to_scaled(inputs[m + "_curr"]))
+            if self._readings.get(m) != pair:
+                self._readings[m] = pair
+                self._cons[m] = pair[1] - pair[0]
+                meters.add(m)
+        changed = set()
+        if meters:
+            cons = self._cons
+            cons["sewage"] = cons["xvs"] + cons["gvs"]
+            sums = self._sums
+            for line in self.plan.lines:
+                if meters.isdisjoint(line.sources):
+                    continue
+                value = line.one(cons)
+                self.recomputed += 1
+                if sums.get(line.key) != value:
+                    sums[line.key] = value
+                    changed.add(line.key)
+            if not changed.isdisjoint(_WATER):
+                sums["sum_water"] = sum(sums[k] for k in _WATER)
+                changed.add("sum_water")
+            if not changed.isdisjoint(_ELECTRICITY):
+                sums["sum_electricity"] = sum(sums[k] for k in _ELECTRICITY)
+                changed.add("sum_electricity")
+            if changed:
+                sums["total"] = sums["sum_water"] + sums["sum_electricity"]
+                changed.add("total")
+        result = {"consumption": {f: self._cons[f] / SCALE for f in CONSUMPTION_FIELDS}}
+        for f in SUM_FIELDS:
+            result[f] = self._sums[f] / 100
+        return result, changed
+
+
+class LiveSession:
+    def __init__(self, scheduler, read, show, delay_ms=150):
+        """
+        scheduler — after(мс, функция) -> id и after_cancel(id), как у tk.Tk;
+        read() -> (показания или None, если поле не число; TariffPlan на сейчас);
+        show(результат или None, строки для поля результата).
+        """
+        self.scheduler = scheduler
+        self.read = read
+        self.show = show
+        self.delay_ms = delay_ms
+        self.calc = None  # LiveCalc текущего плана
+        self.job = None
+        self.runs = 0
+
+    def schedule(self):
+        """Нажатие: отложить расчёт, отменив ещё не выполненный."""
+        self.cancel()
+        self.job = self.scheduler.after(self.delay_ms, self.run)
+
+    def cancel(self):
+        if self.job is not None:
+            self.scheduler.after_cancel(self.job)
+            self.job = None
+
+    @traced("_live_recalc")
+    def run(self):
+        """Расчёт по текущему вводу: результат (с ключом "inputs") или None и причина, если ввод некорректен."""
+        self.job = None
+        self.runs += 1
+        inputs, plan = self.read()
+        error = validate_readings(inputs) if inputs else "Заполните все поля показаний числами."
+        if error:
+            self.show(None, [error])
+            return None
+        if self.calc is None or self.calc.plan is not plan:
+            self.calc = LiveCalc(plan)
+        result, _ = self.calc.update(inputs)
+        lines = result_lines(result)
+        result = dict(result, inputs=inputs)
+        self.show(result, lines)
+        return result
+
+
+def changed_lines(old, new):
+    """
+    Номера (с 0) и текст строк new, отличающихся от old. None — другое число строк,
+    текст переписывается целиком.
+    """
+    if old is None or len(old) != len(new):
+        return None
+    return [(i, line) for i, (was, line) in enumerate(zip(old, new)) if was != line]
+
+
+def show_lines(text, shown, lines):
+    """
+    Строки lines в поле tk.Text (вне правки оно state=disabled); shown — строки, показанные сейчас.
+    Возвращает число переписанных строк.
+    """
+    diff = changed_lines(shown, lines)
+    text.config(state="normal")
+    if diff is None:
+        text.delete("1.0", "end")
+        text.insert("end", "\n".join(lines))
+    else:
+        for i, line in diff:
+            text.delete(f"{i + 1}.0", f"{i + 1}.end")
+            text.insert(f"{i + 1}.0", line)
+    text.config(state="disabled")
+    return len(lines) if diff is None else len(diff)
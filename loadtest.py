@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест локального сервиса расчёта (service.py).
+
+    python loadtest.py --rate 500 --duration 10                 # против уже запущенного сервиса
+    python loadtest.py --spawn --rate 2000 --duration 5         # сам поднимет service.py на свободном порту
+
+Запросы POST /calculate отправляются с постоянной частотой --rate (открытая модель нагрузки):
+задержка считается от запланированного момента отправки, поэтому очередь на стороне клиента
+тоже попадает в замер. В конце печатаются p50/p90/p99/max и фактическая частота.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def _payload(rng):
+    xvs, gvs = rng.uniform(0, 500), rng.uniform(0, 500)
+    day, night = rng.uniform(0, 20000), rng.uniform(0, 10000)
+    body = json.dumps({
+        "xvs_prev": round(xvs, 2), "xvs_curr": round(xvs + rng.uniform(0, 15), 2),
+        "gvs_prev": round(gvs, 2), "gvs_curr": round(gvs + rng.uniform(0, 10), 2),
+        "el_day_prev": round(day, 2), "el_day_curr": round(day + rng.uniform(0, 400), 2),
+        "el_night_prev": round(night, 2), "el_night_curr": round(night + rng.uniform(0, 200), 2),
+    }).encode("utf-8")
+    return body
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def post(self, host, path, body):
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        await self.reader.readexactly(length)
+        return status
+
+
+async def run(url, rate, duration, connections, seed=1):
+    parts = urlsplit(url)
+    host, port, path = parts.hostname, parts.port or 80, parts.path or "/calculate"
+    if parts.query:
+        path += "?" + parts.query
+    pool = asyncio.Queue()
+    for _ in range(connections):
+        pool.put_nowait(_Connection(*await asyncio.open_connection(host, port)))
+    rng = random.Random(seed)
+    bodies = [_payload(rng) for _ in range(1000)]
+    latencies = []
+    errors = 0
+
+    async def one(scheduled, body):
+        nonlocal errors
+        conn = await pool.get()
+        try:
+            status = await conn.post(host, path, body)
+        except (ConnectionError, asyncio.IncompleteReadError, IndexError, ValueError):
+            errors += 1
+            conn = _Connection(*await asyncio.open_connection(host, port))
+        else:
+            if status == 200:
+                latencies.append(time.perf_counter() - scheduled)
+            else:
+                errors += 1
+        pool.put_nowait(conn)
+
+    total = int(rate * duration)
+    interval = 1.0 / rate
+    tasks = []
+    start = time.perf_counter()
+    for i in range(total):
+        scheduled = start + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(scheduled, bodies[i % len(bodies)])))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    while not pool.empty():
+        pool.get_nowait().writer.close()
+    return latencies, errors, elapsed
+
+
+def report(latencies, errors, elapsed, rate):
+    values = sorted(ms * 1000 for ms in latencies)
+    sent = len(values) + errors
+    print(f"Запросов: {sent} за {elapsed:.2f} с (задано {rate:g}/с, вышло {sent / elapsed:.0f}/с), ошибок: {errors}")
+    if values:
+        print("Задержка, мс: p50 {:.2f}  p90 {:.2f}  p99 {:.2f}  max {:.2f}".format(
+            percentile(values, 0.50), percentile(values, 0.90), percentile(values, 0.99), values[-1]))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn(config):
+    port = _free_port()
+    cmd = [sys.executable, os.path.join(BASE_DIR, "service.py"), "--port", str(port)]
+    if config:
+        cmd += ["--config", config]
+    proc = subprocess.Popen(cmd, stderr=subprocess.PIPE)
+    proc.stderr.readline()  # «Сервис расчёта: http://...» — сервер слушает порт
+    return proc, f"http://127.0.0.1:{port}/calculate"
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Нагрузочный тест service.py.")
+    p.add_argument("--url", default="http://127.0.0.1:8765/calculate")
+    p.add_argument("--rate", type=float, default=500, help="запросов в секунду")
+    p.add_argument("--duration", type=float, default=10, help="секунд")
+    p.add_argument("--connections", type=int, default=32, help="соединений keep-alive")
+    p.add_argument("--spawn", action="store_true", help="запустить service.py на свободном порту")
+    p.add_argument("--config", help="config.json для --spawn")
+    args = p.parse_args(argv)
+
+    proc = None
+    url = args.url
+    if args.spawn:
+        proc, url = _spawn(args.config)
+    try:
+        latencies, errors, elapsed = asyncio.run(run(url, args.rate, args.duration, args.connections))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    report(latencies, errors, elapsed, args.rate)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,93 +1,33 @@
 # -*- coding: utf-8 -*-
 """
 Калькулятор коммунальных платежей (ХВС, ГВС, свет день/ночь).
-Логика расчётов как в Excel. Тарифы в config.json, история — в history.json.
+Логика расчётов как в Excel. Тарифы в config.json, история — в history.jsonl.
 """
 import json
 import os
-import sys
+import time
 from datetime import datetime
 
 import tkinter as tk
-from tkinter import ttk, messagebox, font as tkfont
-
-from calc import calculate
-
-# Путь к данным: рядом с exe или рядом со скриптом
-if getattr(sys, "frozen", False):
-    BASE_DIR = os.path.dirname(sys.executable)
-else:
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-CONFIG_PATH = os.path.join(BASE_DIR, "config.json")
-HISTORY_PATH = os.path.join(BASE_DIR, "history.json")
-
-MONTHS_RU = (
-    "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
-    "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"
+from tkinter import ttk, messagebox
+
+import instrument
+from instrument import traced
+from core import (
+    CONFIG_PATH, DEFAULT_TARIFFS, READING_KEYS, TRACE_PATH, load_config, save_config, save_config_async,
+    history_store, history_aggregates, append_history, delete_history,
+    background_writer, defer_history_writes, flush_history_async, take_errors,
+    default_period_name, parse_float, result_lines, validate_readings,
 )
+from tariff_schedule import TariffSchedule, push_tariff_version
 
-DEFAULT_TARIFFS = {
-    "tariff_sewage": 46.73,
-    "tariff_xvs": 43.24,
-    "tariff_gvs": 43.24,
-    "tariff_heating_per_gcal": 2891.74,
-    "norm_gcal_per_m3": 0.06,
-    "tariff_el_day": 6.79,
-    "tariff_el_night": 2.81,
-}
-
-
-def load_config():
-    if os.path.isfile(CONFIG_PATH):
-        try:
-            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return dict(DEFAULT_TARIFFS)
-
-
-def save_config(tariffs):
-    try:
-        with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-            json.dump(tariffs, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception:
-        return False
-
+# anomaly, history_view, live и tariff_rules для первой отрисовки окна не нужны —
+# они импортируются при загрузке истории (_load_history) или при первом использовании
 
-def load_history():
-    if os.path.isfile(HISTORY_PATH):
-        try:
-            with open(HISTORY_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return []
-
-
-def save_history(records):
-    try:
-        with open(HISTORY_PATH, "w", encoding="utf-8") as f:
-            json.dump(records, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception:
-        return False
-
-
-def default_period_name():
-    now = datetime.now()
-    return f"{MONTHS_RU[now.month - 1]} {now.year}"
 
-
-def parse_float(s, default=None):
-    s = (s or "").strip().replace(",", ".")
-    if not s:
-        return default
-    try:
-        return float(s)
-    except ValueError:
-        return None
+def timeline_row_text(r, note=None):
+    text = f"  {r.get('period', '—')}  —  {r.get('total', 0):,.2f} руб".replace(",", " ")
+    return f"{text}   {note}" if note else text
 
 
 # Стиль в духе Apple: светлый фон, аккуратная типографика
@@ -99,6 +39,12 @@ TEXT_SECONDARY = "#6e6e73"
 FONT_UI = "Segoe UI"
 FONT_SIZE = 10
 FONT_HEAD = 11
+# Пауза после последнего нажатия, после которой считает режим «Считать при вводе», мс
+LIVE_DELAY_MS = 150
+# Строк CSV на один шаг импорта: между шагами окно обрабатывает события
+IMPORT_CHUNK_ROWS = 500
+# Замер запуска (startup_bench.py): время первой отрисовки и загрузки истории — в этот файл, затем выход
+STARTUP_PROBE = os.environ.get("ZHKH_STARTUP_PROBE")
 
 
 class App:
@@ -114,8 +60,24 @@ class App:
         self.config = load_config()
         if not os.path.isfile(CONFIG_PATH):
             save_config(self.config)
+        self._schedule = TariffSchedule.from_config(self.config)
+        # Правила (ступени, нормы) компилируются один раз; планы расчёта кэшируются по версии тарифов.
+        # Читаются после первой отрисовки (_load_history), раньше расчёта по ним быть не может
+        self._rules = self._rules_error = None
         self._last_result = None
+        self._shown_lines = None  # строки, показанные в result_text
+        # «Считать при вводе»: отложенный расчёт по таймеру окна (live.LiveSession — при первом включении)
+        self._live = None
+        # Запись на диск — в фоновом потоке, окно не ждёт её
+        defer_history_writes()
+        self._import = None  # идущий импорт CSV: файл, пачки, счётчики
         self._build_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        # История читается после первой отрисовки: окно появляется сразу, хронология — следом.
+        # after_idle — из главного цикла, после уже запланированных раскладки и отрисовки виджетов;
+        # всё состояние, которое читают обработчики окна, к этому моменту уже задано
+        self._history_job = self.root.after_idle(self._load_history)
+        self.root.bind("<Control-D>", lambda e: self._show_diagnostics())  # Ctrl+Shift+D
 
     def _setup_style(self):
         style = ttk.Style()
@@ -128,6 +90,7 @@ class App:
         style.configure("TButton", padding=(16, 10), font=(FONT_UI, FONT_SIZE))
         style.map("TButton", background=[("active", "#e5e5ea")])
         style.configure("TEntry", padding=8, font=(FONT_UI, FONT_SIZE))
+        style.configure("TCheckbutton", background=BG_MAIN, foreground=TEXT, font=(FONT_UI, FONT_SIZE))
 
     def _build_ui(self):
         main = ttk.Frame(self.root, padding=(24, 20))
@@ -135,6 +98,8 @@ class App:
 
         # --- Периоды (хронология) ---
         self._timeline_records = []
+        self._anomaly_detector = None  # оценки расхода по хронологии — для отметок в списке
+        self._anomalies = {}  # (period, date_saved) -> подпись подозрительного периода
         row_top = 0
         lf_timeline = ttk.LabelFrame(main, text="Периоды  ·  клик — подставить в «предыдущие»  ·  ПКМ — удалить")
         lf_timeline.grid(row=row_top, column=0, columnspan=5, sticky=tk.EW, pady=(0, 16))
@@ -150,10 +115,11 @@ class App:
             bg=BG_CARD, fg=TEXT, selectbackground=ACCENT, selectforeground="white",
             relief=tk.FLAT, highlightthickness=0
         )
-        scroll_t = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self._timeline_listbox.yview)
-        self._timeline_listbox.configure(yscrollcommand=scroll_t.set)
+        self._timeline_scroll = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
         self._timeline_listbox.grid(row=0, column=0, sticky=tk.NSEW)
-        scroll_t.grid(row=0, column=1, sticky=tk.NS)
+        self._timeline_scroll.grid(row=0, column=1, sticky=tk.NS)
+        # В Listbox только видимые строки, прокрутка — через VirtualListbox (создаётся в _load_history)
+        self._timeline_view = None
         list_frame.columnconfigure(0, weight=1)
         self._timeline_listbox.bind("<<ListboxSelect>>", self._on_timeline_select)
         self._timeline_listbox.bind("<Button-3>", self._on_timeline_rightclick)
@@ -162,7 +128,7 @@ class App:
         )
         self._analytics_label.grid(row=1, column=0, sticky=tk.EW, pady=(12, 0))
         inner.columnconfigure(0, weight=1)
-        self._refresh_timeline()
+        self._analytics_label.config(text="Загрузка истории…")
 
         # --- Показания ---
         row_start = row_top + 1
@@ -179,13 +145,16 @@ class App:
             ("Электричество ночь, кВт·ч", "el_night_prev", "el_night_curr"),
         ]
         self.entries = {}
+        self._live_mode = tk.BooleanVar(value=bool(self.config.get("live_calc")))
         for i, (text, key_prev, key_curr) in enumerate(labels):
             row = row_start + i + 1
             ttk.Label(main, text=text).grid(row=row, column=0, sticky=tk.W, pady=6)
-            self.entries[key_prev] = ttk.Entry(main, width=14)
-            self.entries[key_prev].grid(row=row, column=1, padx=6, pady=6)
-            self.entries[key_curr] = ttk.Entry(main, width=14)
-            self.entries[key_curr].grid(row=row, column=3, padx=6, pady=6)
+            for key, col in ((key_prev, 1), (key_curr, 3)):
+                # Любая правка поля (ввод, вставка, подстановка из хронологии) — пересчёт «при вводе»
+                var = tk.StringVar()
+                var.trace_add("write", lambda *args: self._schedule_live())
+                self.entries[key] = ttk.Entry(main, width=14, textvariable=var)
+                self.entries[key].grid(row=row, column=col, padx=6, pady=6)
 
         ttk.Separator(main, orient=tk.HORIZONTAL).grid(
             row=row_start + 5, column=0, columnspan=5, sticky=tk.EW, pady=20
@@ -203,6 +172,9 @@ class App:
         # --- Результаты ---
         self.result_frame = ttk.LabelFrame(main, text="Результат", padding=16)
         self.result_frame.grid(row=row_start + 7, column=0, columnspan=5, sticky=tk.EW, pady=10)
+        ttk.Checkbutton(
+            self.result_frame, text="Считать при вводе", variable=self._live_mode, command=self._toggle_live
+        ).pack(anchor=tk.W, pady=(0, 8))
         self.result_text = tk.Text(
             self.result_frame, height=11, width=50, wrap=tk.WORD,
             font=(FONT_UI, FONT_SIZE), bg=BG_CARD, fg=TEXT, relief=tk.FLAT, padx=12, pady=12
@@ -214,51 +186,94 @@ class App:
         ttk.Button(main, text="История по месяцам", command=self._show_history).grid(
             row=row_start + 8, column=0, columnspan=2, pady=12, padx=(0, 6))
         ttk.Button(main, text="Тарифы", command=self._edit_tariffs).grid(
-            row=row_start + 8, column=2, columnspan=3, pady=12, padx=6)
-
-        self._fill_previous_from_latest()
+            row=row_start + 8, column=2, pady=12, padx=6)
+        self.btn_import = ttk.Button(main, text="Импорт CSV", command=self._import_csv)
+        self.btn_import.grid(row=row_start + 8, column=3, columnspan=2, pady=12, padx=6)
 
         for c in (0, 1, 2, 3):
             main.columnconfigure(c, weight=0)
         main.columnconfigure(4, weight=1)
 
+    def _load_history(self):
+        """
+        После первой отрисовки окна: правила тарифов, хронология, подстановка прошлых показаний,
+        ошибки чтения данных. Вложенного цикла событий (root.update()) нет: щелчки и нажатия,
+        пришедшие за это время, обрабатываются после, когда состояние окна уже готово.
+        """
+        from history_view import ListSource, VirtualListbox
+
+        self._history_job = None
+        self.root.update_idletasks()  # только раскладка и отрисовка, события ввода ждут
+        painted = time.time()
+        self._rules, self._rules_error = self._load_rules(self.config)
+        self._timeline_view = VirtualListbox(
+            self._timeline_listbox, self._timeline_scroll, ListSource([], timeline_row_text), height=4
+        )
+        self._refresh_timeline()
+        self._fill_previous_from_latest()
+        if STARTUP_PROBE:
+            self.root.update_idletasks()  # хронология отрисована
+            with open(STARTUP_PROBE, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"paint": painted, "ready": time.time()}) + "\n")
+            self.root.after_idle(self._on_close)
+            return
+        self._show_load_errors()
+
     def _get_inputs(self):
         out = {}
-        for key in (
-            "xvs_prev", "xvs_curr", "gvs_prev", "gvs_curr",
-            "el_day_prev", "el_day_curr", "el_night_prev", "el_night_curr",
-        ):
+        for key in READING_KEYS:
             val = parse_float(self.entries[key].get())
             if val is None:
                 return None, key
             out[key] = val
         return out, None
 
-    def _refresh_timeline(self):
-        records = load_history()
-        self._timeline_records = sorted(records, key=lambda r: r.get("date_saved", ""))
-        self._timeline_listbox.delete(0, tk.END)
-        total_sum = 0
-        for r in self._timeline_records:
-            total_sum += r.get("total", 0)
-            period = r.get("period", "—")
-            total = r.get("total", 0)
-            self._timeline_listbox.insert(tk.END, f"  {period}  —  {total:,.2f} руб".replace(",", " "))
-        n = len(self._timeline_records)
+    @traced("_refresh_timeline")
+    def _refresh_timeline(self, added=()):
+        from history_view import ListSource
+
+        agg = history_aggregates()
+        self._timeline_records = agg.rows()
+        self._update_anomalies(self._timeline_records, added)
+        notes = self._anomalies
+        self._timeline_view.set_source(ListSource(
+            self._timeline_records,
+            lambda r: timeline_row_text(r, notes.get((r.get("period"), r.get("date_saved")))),
+        ))
+        n = len(agg)
         if n == 0:
             self._analytics_label.config(text="Нет сохранённых периодов. После расчёта нажмите «Сохранить в историю».")
         else:
-            avg = total_sum / n
-            last_period = self._timeline_records[-1].get("period", "—") if self._timeline_records else "—"
+            last_period = agg.last().get("period", "—")
             self._analytics_label.config(
-                text=f"Всего за {n} мес.: {total_sum:,.2f} руб  |  В среднем: {avg:,.2f} руб/мес.  |  Последний период: {last_period}".replace(",", " ")
+                text=f"Всего за {n} мес.: {agg.total:,.2f} руб  |  В среднем: {agg.average:,.2f} руб/мес.  |  Последний период: {last_period}".replace(",", " ")
             )
 
+    def _update_anomalies(self, rows, added):
+        """
+        Новые периоды в конце хронологии (сохранение, импорт) только дополняют оценки — O(1) на период.
+        Иначе (удаление, период задним числом, первый показ) хронология проходится заново по колонкам.
+        """
+        from anomaly import CURR_FIELDS, AnomalyDetector, describe, scan_columns
+
+        n, k = len(rows), len(added)
+        detector = self._anomaly_detector
+        if detector is not None and k and detector.periods == n - k and rows[n - k:] == list(added):
+            for r in added:
+                flags = detector.update(r)
+                if flags:
+                    self._anomalies[(r.get("period"), r.get("date_saved"))] = describe(flags)
+            return
+        detector = self._anomaly_detector = AnomalyDetector()
+        found = scan_columns([rows.values(f) for f in CURR_FIELDS], detector)
+        periods, dates = rows.values("period"), rows.values("date_saved")
+        self._anomalies = {(periods[i], dates[i]): describe(flags) for i, flags in found}
+
     def _on_timeline_select(self, event):
         sel = self._timeline_listbox.curselection()
-        if not sel or sel[0] >= len(self._timeline_records):
+        if not sel or self._timeline_view.index_of(sel[0]) >= len(self._timeline_records):
             return
-        r = self._timeline_records[sel[0]]
+        r = self._timeline_records[self._timeline_view.index_of(sel[0])]
         for key, attr in [
             ("xvs_prev", "xvs_curr"), ("gvs_prev", "gvs_curr"),
             ("el_day_prev", "el_day_curr"), ("el_night_prev", "el_night_curr"),
@@ -292,9 +307,9 @@ class App:
 
     def _on_timeline_rightclick(self, event):
         sel = self._timeline_listbox.curselection()
-        if not sel or sel[0] >= len(self._timeline_records):
+        if not sel or self._timeline_view.index_of(sel[0]) >= len(self._timeline_records):
             return
-        idx = sel[0]
+        idx = self._timeline_view.index_of(sel[0])
         menu = tk.Menu(self.root, tearoff=0)
         menu.add_command(label="Удалить запись", command=lambda: self._delete_timeline_record(idx))
         try:
@@ -309,15 +324,57 @@ class App:
         period = r.get("period", "")
         if not messagebox.askyesno("Удалить запись", f"Удалить период «{period}» из истории?"):
             return
-        records = load_history()
-        key = (r.get("period"), r.get("date_saved"))
-        records = [x for x in records if (x.get("period"), x.get("date_saved")) != key]
-        if save_history(records):
+        if delete_history((r.get("period"), r.get("date_saved"))):
             self._refresh_timeline()
-            messagebox.showinfo("История", "Запись удалена.")
+            self._persist_history("Запись удалена.")
         else:
             messagebox.showwarning("История", "Не удалось сохранить изменения.")
 
+    def _persist_history(self, done_message):
+        def on_done(error):
+            if error is None:
+                messagebox.showinfo("История", done_message)
+            else:
+                messagebox.showwarning("История", f"Не удалось сохранить history.jsonl: {error}")
+
+        flush_history_async(on_done)
+        self._watch_writer()
+
+    def _watch_writer(self):
+        """Пока идёт фоновая запись, раз в 50 мс забираем её результаты в главный поток."""
+        background_writer().watch(self.root, 50)
+
+    def _load_rules(self, config):
+        """Правила тарифов из config.json -> (TariffRules, ошибка); с ошибкой в правилах считаем без них."""
+        from tariff_rules import TariffRules
+
+        try:
+            return TariffRules.from_config(config), None
+        except ValueError as e:
+            return TariffRules(), f"Правила тарифов (rules) в config.json не применены: {e}"
+
+    def _show_load_errors(self):
+        errors = take_errors()
+        if self._rules_error:
+            errors.append(self._rules_error)
+        if errors:
+            messagebox.showwarning("Данные", "\n".join(errors))
+
+    def _on_close(self):
+        if self._history_job is not None:
+            self.root.after_cancel(self._history_job)
+        if self._import is not None:
+            # Импорт обрывается на границе пачки: прочитанные пачки уже в журнале
+            self.root.after_cancel(self._import["job"])
+            self._import["file"].close()
+            self._import = None
+        # Несохранённое дописываем до закрытия окна
+        if history_store().pending():
+            flush_history_async()
+        if not background_writer().flush(timeout=10) or history_store().pending():
+            messagebox.showwarning("Сохранение", "Не удалось дописать историю на диск, последние изменения могут пропасть.")
+        self.root.destroy()
+
     def _on_calc(self):
         inputs, missing = self._get_inputs()
         if inputs is None:
@@ -326,50 +383,128 @@ class App:
                 "Заполните все поля показаний числами.\nНе найдено значение для одного из полей.",
             )
             return
-        if any(inputs[k] < 0 for k in inputs):
-            messagebox.showwarning("Ввод", "Показания не могут быть отрицательными.")
-            return
-        if inputs["xvs_curr"] < inputs["xvs_prev"] or inputs["gvs_curr"] < inputs["gvs_prev"]:
-            messagebox.showwarning("Ввод", "Текущие показания воды должны быть не меньше предыдущих.")
-            return
-        if inputs["el_day_curr"] < inputs["el_day_prev"] or inputs["el_night_curr"] < inputs["el_night_prev"]:
-            messagebox.showwarning("Ввод", "Текущие показания электричества должны быть не меньше предыдущих.")
+        error = validate_readings(inputs)
+        if error:
+            messagebox.showwarning("Ввод", error)
             return
 
-        tariffs = {k: self.config.get(k, v) for k, v in DEFAULT_TARIFFS.items()}
-        result = calculate(**inputs, **tariffs)
-
-        cons = result["consumption"]
-        lines = [
-            "Расход: ХВС {:.2f} м³, ГВС {:.2f} м³ | эл. день {:.2f}, ночь {:.2f} кВт·ч".format(
-                cons["xvs"], cons["gvs"], cons["el_day"], cons["el_night"]
-            ),
-            "",
-            "——— Вода ———",
-            f"  Водоотведение:     {result['sum_sewage']:.2f} руб",
-            f"  ХВС:               {result['sum_xvs']:.2f} руб",
-            f"  Подогрев ГВС:      {result['sum_heating']:.2f} руб",
-            f"  ГВС:               {result['sum_gvs']:.2f} руб",
-            f"  Итого за воду:     {result['sum_water']:.2f} руб",
-            "",
-            "——— Электричество ———",
-            f"  День:              {result['sum_el_day']:.2f} руб",
-            f"  Ночь:              {result['sum_el_night']:.2f} руб",
-            f"  Итого за свет:     {result['sum_electricity']:.2f} руб",
-            "",
-            "═══════════════════════",
-            f"  ИТОГО (свет+вода): {result['total']:.2f} руб",
-        ]
-
-        self.result_text.config(state=tk.NORMAL)
-        self.result_text.delete("1.0", tk.END)
-        self.result_text.insert(tk.END, "\n".join(lines))
-        self.result_text.config(state=tk.DISABLED)
+        # Тарифы текущего месяца; при сохранении в историю пересчитаем по тарифам выбранного периода
+        tariffs = self._schedule.for_period(default_period_name())
+        # Суммы в копейках: строки расчёта всегда сходятся с итогом
+        result = self._rules.plan(tariffs).calculate(**inputs)
 
+        self._show_result(result_lines(result))
         self._last_result = dict(result)
         self._last_result["inputs"] = inputs
         self.btn_save_history.config(state=tk.NORMAL)
 
+    def _show_result(self, lines):
+        """Текст результата; при том же числе строк переписываются только изменившиеся."""
+        from live import show_lines
+
+        show_lines(self.result_text, self._shown_lines, lines)
+        self._shown_lines = lines
+
+    def _toggle_live(self):
+        self.config = dict(self.config, live_calc=self._live_mode.get())
+        save_config_async(self.config)
+        self._watch_writer()
+        if self._live_mode.get():
+            self._schedule_live()
+        elif self._live is not None:
+            self._live.cancel()
+
+    def _schedule_live(self):
+        """Отложенный пересчёт: серия нажатий подряд даёт один расчёт через LIVE_DELAY_MS после последнего."""
+        if not self._live_mode.get():
+            return
+        if self._live is None:
+            from live import LiveSession
+
+            self._live = LiveSession(self.root, self._live_inputs, self._show_live_result, LIVE_DELAY_MS)
+        self._live.schedule()
+
+    def _live_inputs(self):
+        inputs, _ = self._get_inputs()
+        return inputs, self._rules.plan(self._schedule.for_period(default_period_name()))
+
+    def _show_live_result(self, result, lines):
+        """Результат «при вводе» или причина, почему не посчитано; прошлый результат тогда не сохранить."""
+        self._show_result(lines)
+        self._last_result = result
+        self.btn_save_history.config(state=tk.NORMAL if result is not None else tk.DISABLED)
+
+    def _import_csv(self):
+        """
+        Импорт CSV по шагам: на шаг — одна пачка строк (расчёт и запись в журнал в фоновом потоке),
+        между шагами окно отвечает. В памяти — только счётчики и первые отклонённые строки;
+        хронология обновляется один раз, в конце.
+        """
+        if self._import is not None:
+            return
+        from tkinter import filedialog
+
+        path = filedialog.askopenfilename(
+            parent=self.root, title="Импорт показаний",
+            filetypes=[("CSV", "*.csv"), ("Все файлы", "*.*")],
+        )
+        if not path:
+            return
+        from importer import import_readings
+
+        f = None
+        try:
+            f = open(path, "r", encoding="utf-8-sig", newline="")
+            chunks = import_readings(f, self._schedule, chunk_size=IMPORT_CHUNK_ROWS, rules=self._rules)
+        except (ValueError, OSError, UnicodeDecodeError) as e:
+            if f is not None:
+                f.close()
+            messagebox.showwarning("Импорт", f"Не удалось импортировать {os.path.basename(path)}: {e}")
+            return
+        self._import = {"path": path, "file": f, "chunks": chunks, "imported": 0, "rejected": 0, "shown": []}
+        self.btn_import.config(state=tk.DISABLED)
+        self.root.config(cursor="watch")
+        self._import["job"] = self.root.after(0, self._import_step)
+
+    def _import_step(self):
+        state = self._import
+        try:
+            chunk = next(state["chunks"], None)
+        except (ValueError, OSError, UnicodeDecodeError) as e:
+            self._finish_import(e)
+            return
+        if chunk is None:
+            self._finish_import(None)
+            return
+        state["imported"] += len(chunk.records)
+        state["rejected"] += len(chunk.rejected)
+        state["shown"].extend(chunk.rejected[:20 - len(state["shown"])])  # первые — для сообщения
+        if chunk.records:
+            # Пачка уходит на диск сразу, а не копится в очереди журнала до конца импорта
+            flush_history_async()
+            self._watch_writer()
+        state["job"] = self.root.after(1, self._import_step)
+
+    def _finish_import(self, error):
+        state, self._import = self._import, None
+        state["file"].close()
+        self.root.config(cursor="")
+        self.btn_import.config(state=tk.NORMAL)
+        imported, rejected, shown = state["imported"], state["rejected"], state["shown"]
+        lines = []
+        if error is not None:
+            lines.append(f"Не удалось импортировать {os.path.basename(state['path'])}: {error}")
+        lines.append(f"Импортировано периодов: {imported}.")
+        if rejected:
+            lines.append(f"Отклонено строк: {rejected}" + (", первые из них:" if rejected > len(shown) else ":"))
+            lines += [f"  строка {line}: {reason}" for line, _, reason in shown]
+        if imported:
+            # Уже прочитанные пачки остаются в истории и при ошибке посреди файла
+            self._refresh_timeline()
+            self._persist_history("\n".join(lines))
+        else:
+            messagebox.showwarning("Импорт", "\n".join(lines))
+
     def _save_to_history(self):
         if not self._last_result:
             return
@@ -391,31 +526,35 @@ class App:
             if not period:
                 messagebox.showwarning("История", "Введите название периода.")
                 return
-            records = load_history()
             inp = self._last_result.get("inputs") or {}
-            records.append({
+            result = self._rules.plan(self._schedule.for_period(period)).calculate(**inp)
+            record = {
                 "period": period,
                 "date_saved": datetime.now().strftime("%Y-%m-%d"),
-                "sum_water": self._last_result["sum_water"],
-                "sum_electricity": self._last_result["sum_electricity"],
-                "total": self._last_result["total"],
+                "sum_water": result["sum_water"],
+                "sum_electricity": result["sum_electricity"],
+                "total": result["total"],
                 "xvs_curr": inp.get("xvs_curr"),
                 "gvs_curr": inp.get("gvs_curr"),
                 "el_day_curr": inp.get("el_day_curr"),
                 "el_night_curr": inp.get("el_night_curr"),
-            })
-            if save_history(records):
-                messagebox.showinfo("История", f"Период «{period}» сохранён в историю.")
-                self._refresh_timeline()
+            }
+            if append_history(record):
+                self._refresh_timeline([record])
                 win.destroy()
+                self._persist_history(f"Период «{period}» сохранён в историю.")
             else:
-                messagebox.showwarning("История", "Не удалось сохранить history.json.")
+                messagebox.showwarning("История", "Не удалось сохранить history.jsonl.")
 
         ttk.Button(f, text="Сохранить", command=do_save).pack(anchor=tk.W)
         win.bind("<Return>", lambda e: do_save())
 
+    @traced("_show_history")
     def _show_history(self):
-        records = load_history()
+        from history_view import HistoryIndex, VirtualTreeview
+
+        agg = history_aggregates()
+        records = agg.rows()
         win = tk.Toplevel(self.root)
         win.title("История по месяцам")
         win.geometry("580x400")
@@ -424,44 +563,95 @@ class App:
         f = ttk.Frame(win, padding=20)
         f.pack(fill=tk.BOTH, expand=True)
 
-        cols = ("period", "water", "electricity", "total", "date")
-        tree = ttk.Treeview(f, columns=cols, show="headings", height=12)
-        tree.heading("period", text="Период")
-        tree.heading("water", text="Вода, руб")
-        tree.heading("electricity", text="Свет, руб")
-        tree.heading("total", text="Итого, руб")
-        tree.heading("date", text="Дата сохранения")
-        tree.column("period", width=140)
-        tree.column("water", width=90)
-        tree.column("electricity", width=90)
-        tree.column("total", width=90)
-        tree.column("date", width=110)
-        scroll = ttk.Scrollbar(f, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscrollcommand=scroll.set)
-        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scroll.pack(side=tk.RIGHT, fill=tk.Y)
-
-        # Сортируем по дате (новые сверху)
-        sorted_records = sorted(records, key=lambda r: r.get("date_saved", ""), reverse=True)
-        total_sum = 0
-        for r in sorted_records:
-            total_sum += r.get("total", 0)
-            tree.insert("", tk.END, values=(
-                r.get("period", ""),
-                f"{r.get('sum_water', 0):.2f}",
-                f"{r.get('sum_electricity', 0):.2f}",
-                f"{r.get('total', 0):.2f}",
-                r.get("date_saved", ""),
-            ))
-        n = len(records)
-        avg = total_sum / n if n else 0
-        last3 = sum(r.get("total", 0) for r in sorted_records[:3])
-        lines = [f"Всего за {n} мес.: {total_sum:,.2f} руб  |  В среднем: {avg:,.2f} руб/мес.".replace(",", " ")]
+        # Фильтры: подстрока периода, год, сумма «от» и «до»
+        bar = ttk.Frame(f)
+        bar.pack(fill=tk.X, pady=(0, 8))
+        index = HistoryIndex(records)
+        ttk.Label(bar, text="Период:").pack(side=tk.LEFT)
+        e_period = ttk.Entry(bar, width=12)
+        e_period.pack(side=tk.LEFT, padx=(4, 8))
+        ttk.Label(bar, text="Год:").pack(side=tk.LEFT)
+        cb_year = ttk.Combobox(bar, width=6, state="readonly", values=[""] + index.years())
+        cb_year.pack(side=tk.LEFT, padx=(4, 8))
+        ttk.Label(bar, text="Сумма от:").pack(side=tk.LEFT)
+        e_min = ttk.Entry(bar, width=8)
+        e_min.pack(side=tk.LEFT, padx=(4, 4))
+        ttk.Label(bar, text="до:").pack(side=tk.LEFT)
+        e_max = ttk.Entry(bar, width=8)
+        e_max.pack(side=tk.LEFT, padx=(4, 0))
+
+        def on_sort(column):
+            index.sort(column)
+            view.refresh()
+
+        def on_filter(event=None):
+            index.filter(
+                period=e_period.get(),
+                year=cb_year.get(),
+                min_total=parse_float(e_min.get()),
+                max_total=parse_float(e_max.get()),
+            )
+            view.offset = 0
+            view.refresh()
+
+        for w in (e_period, e_min, e_max):
+            w.bind("<KeyRelease>", on_filter)
+        cb_year.bind("<<ComboboxSelected>>", on_filter)
+
+        # Новые сверху; в таблице живут только видимые строки
+        view = VirtualTreeview(f, index, [
+            ("period", "Период", 140),
+            ("water", "Вода, руб", 90),
+            ("electricity", "Свет, руб", 90),
+            ("total", "Итого, руб", 90),
+            ("date", "Дата сохранения", 110),
+        ], height=12, on_sort=on_sort)
+        view.frame.pack(fill=tk.BOTH, expand=True)
+
+        n = len(agg)
+        lines = [f"Всего за {n} мес.: {agg.total:,.2f} руб  |  В среднем: {agg.average:,.2f} руб/мес.".replace(",", " ")]
         if n >= 3:
-            lines.append(f"  За последние 3 мес.: {last3:,.2f} руб".replace(",", " "))
+            lines.append(f"  За последние 3 мес.: {agg.last_total(3):,.2f} руб".replace(",", " "))
         lbl = ttk.Label(f, text="  ".join(lines))
         lbl.pack(anchor=tk.W, pady=(8, 0))
 
+    def _show_diagnostics(self):
+        win = tk.Toplevel(self.root)
+        win.title("Диагностика")
+        win.geometry("520x320")
+        win.transient(self.root)
+        win.configure(bg=BG_MAIN)
+        f = ttk.Frame(win, padding=20)
+        f.pack(fill=tk.BOTH, expand=True)
+
+        if not instrument.ENABLED:
+            ttk.Label(f, text="Замеры выключены. Запустите программу с переменной окружения ZHKH_TRACE=1.",
+                      wraplength=460).pack(anchor=tk.W)
+            return
+
+        columns = ("count", "p50", "p95", "max")
+        tree = ttk.Treeview(f, columns=columns, height=10)
+        tree.heading("#0", text="Участок")
+        tree.column("#0", width=160)
+        for col, title in zip(columns, ("Вызовов", "p50, мс", "p95, мс", "max, мс")):
+            tree.heading(col, text=title)
+            tree.column(col, width=80, anchor=tk.E)
+        tree.pack(fill=tk.BOTH, expand=True)
+        lbl = ttk.Label(f, text="")
+        lbl.pack(anchor=tk.W, pady=(8, 0))
+
+        def refresh():
+            tree.delete(*tree.get_children())
+            for name, st in instrument.stats().items():
+                tree.insert("", tk.END, text=name, values=(
+                    st["count"], f"{st['p50']:.2f}", f"{st['p95']:.2f}", f"{st['max']:.2f}"))
+            cache = history_store().cache_stats()
+            lbl.config(text=f"Кэш истории: попаданий {cache['hits']}, чтений с диска {cache['misses']}, "
+                            f"записей {cache['records']}.  Журнал: {TRACE_PATH}")
+
+        refresh()
+        ttk.Button(f, text="Обновить", command=refresh).pack(anchor=tk.W, pady=(8, 0))
+
     def _edit_tariffs(self):
         win = tk.Toplevel(self.root)
         win.title("Тарифы")
@@ -489,20 +679,30 @@ class App:
             entries_t[key] = e
 
         def save():
-            new_config = {}
+            new_tariffs = {}
             for key in DEFAULT_TARIFFS:
                 v = parse_float(entries_t[key].get(), DEFAULT_TARIFFS[key])
                 if v is None or v < 0:
                     messagebox.showwarning("Тарифы", f"Некорректное значение для «{key}».")
                     return
-                new_config[key] = v
+                new_tariffs[key] = v
+            # Прежние тарифы остаются в расписании для пересчёта старых периодов
+            new_config = push_tariff_version(self.config, new_tariffs)
             self.config = new_config
-            if save_config(new_config):
-                messagebox.showinfo("Тарифы", "Тарифы сохранены в config.json рядом с программой.")
-            else:
-                messagebox.showwarning("Тарифы", "Не удалось сохранить config.json.")
+            self._schedule = TariffSchedule.from_config(new_config)
+            self._rules, _ = self._load_rules(new_config)  # планы прежних тарифов больше не нужны
             win.destroy()
 
+            def on_done(error):
+                if error is None:
+                    messagebox.showinfo("Тарифы", "Тарифы сохранены в config.json рядом с программой.")
+                else:
+                    messagebox.showwarning("Тарифы", f"Не удалось сохранить config.json: {error}")
+
+            save_config_async(new_config, on_done)
+            self._watch_writer()
+            self._schedule_live()
+
         ttk.Button(f, text="Сохранить", command=save).grid(
             row=len(rows), column=0, columnspan=2, pady=12
         )
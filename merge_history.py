@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Слияние историй нескольких копий программы (history.json рядом с каждым exe) в одну.
+
+    python merge_history.py history.json dist/history.json -o merged.json
+                            [--key period,date_saved] [--policy keep-all|first|last|error]
+
+Входы — history.json (JSON-массив), history.jsonl (журнал) или JSON Lines с записями в любом сочетании.
+Выход — JSON-массив или, если имя кончается на .jsonl, журнал, который программа читает как history.jsonl.
+
+Записи упорядочиваются по периоду («Октябрь 2025» -> 2025-10; записи без периода — по date_saved)
+и сливаются k-путевым слиянием (heapq.merge) потоков из всех файлов. Файл читается потоком;
+чтобы отсортировать его без загрузки целиком, он режется на отрезки по --run записей, каждый отрезок
+сортируется в памяти и, если отрезков больше одного, сбрасывается во временный файл. В памяти —
+не больше одного отрезка и по записи на каждый отрезок в куче слияния.
+
+Одинаковые записи (все поля совпадают) остаются в одном экземпляре всегда. Разные записи с одним
+ключом (--key) — конфликт, его решает --policy:
+    keep-all  — оставить все варианты (по умолчанию; конфликты только перечисляются);
+    first     — вариант из файла, указанного раньше (в одном файле — сохранённый раньше);
+    last      — вариант из файла, указанного позже;
+    error     — прервать слияние, выходной файл не создаётся.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import sys
+import tempfile
+
+from history_store import iter_history_file
+from tariff_schedule import period_start
+
+POLICIES = ("keep-all", "first", "last", "error")
+KEY_FIELDS = ("period", "date_saved")
+
+
+class MergeConflict(ValueError):
+    def __init__(self, key, records):
+        super().__init__(f"Разные записи с ключом {key}: {len(records)} варианта")
+        self.key = key
+        self.records = records
+
+
+def sort_key(record):
+    """(месяц периода или date_saved, период, date_saved): записи одного периода идут подряд."""
+    period = record.get("period")
+    date_saved = record.get("date_saved")
+    if not isinstance(period, str):
+        period = ""
+    if not isinstance(date_saved, str):
+        date_saved = ""
+    chrono = (period_start(period) or "") if period else date_saved
+    return chrono, period, date_saved
+
+
+def _content(record):
+    return json.dumps(record, ensure_ascii=False, sort_keys=True)
+
+
+def sorted_runs(records, source, run_size=50_000, tmpdir=None):
+    """
+    Один вход -> список отсортированных потоков (sort_key, номер входа, номер записи, запись).
+    Помещается в один отрезок — поток в памяти, иначе отрезки лежат во временных файлах.
+    """
+    runs = []
+    seq = itertools.count()
+    it = iter(records)
+    while True:
+        chunk = [(sort_key(r), source, next(seq), r) for r in itertools.islice(it, run_size)]
+        if not chunk:
+            break
+        chunk.sort(key=lambda item: item[:3])
+        runs.append(chunk)
+        if len(runs) > 1 or len(chunk) == run_size:
+            # Возможно, будут ещё отрезки: держать их все в памяти нельзя
+            runs[-1] = _spill(chunk, tmpdir)
+    return [iter(r) if isinstance(r, list) else r for r in runs]
+
+
+def _spill(chunk, tmpdir):
+    f = tempfile.TemporaryFile("w+", encoding="utf-8", dir=tmpdir)
+    for _, source, seq, record in chunk:
+        f.write(json.dumps([source, seq, record], ensure_ascii=False) + "\n")
+    f.seek(0)
+    return _read_run(f)
+
+
+def _read_run(f):
+    with f:
+        for line in f:
+            source, seq, record = json.loads(line)
+            yield sort_key(record), source, seq, record
+
+
+def merge_records(inputs, key=KEY_FIELDS, policy="keep-all", run_size=50_000, on_conflict=None, tmpdir=None):
+    """
+    Слияние нескольких потоков записей (итерируемые объекты в порядке приоритета) в один упорядоченный.
+    key — поля ключа записи, policy — см. POLICIES; on_conflict(ключ, [записи]) вызывается на каждый конфликт.
+    Генератор: записи отдаются по мере слияния.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Неизвестная политика {policy}; допустимо: {', '.join(POLICIES)}")
+    if set(key) == set(KEY_FIELDS):
+        key, group_of = KEY_FIELDS, (lambda sk: sk)
+    elif tuple(key) == ("period",):
+        key, group_of = ("period",), (lambda sk: sk[:2])
+    else:
+        # Ключ обязан входить в порядок слияния, иначе одинаковые ключи не окажутся рядом
+        raise ValueError("Ключ записи — period или period,date_saved")
+    runs = []
+    for source, records in enumerate(inputs):
+        runs.extend(sorted_runs(records, source, run_size, tmpdir))
+    merged = heapq.merge(*runs, key=lambda item: item[:3])
+    # Записи с одним ключом идут подряд: ключ — часть sort_key, сама группа мала
+    for group, items in itertools.groupby(merged, key=lambda item: group_of(item[0])):
+        variants = {}
+        for _, source, seq, record in items:
+            variants.setdefault(_content(record), (source, seq, record))
+        if len(variants) == 1:
+            yield next(iter(variants.values()))[2]
+            continue
+        ordered = sorted(variants.values(), key=lambda v: v[:2])
+        records = [v[2] for v in ordered]
+        record_key = tuple(records[0].get(k) for k in key)
+        if not all(record_key):
+            # Без периода или даты записи не сравнить по ключу — остаются все
+            yield from records
+            continue
+        if on_conflict:
+            on_conflict(record_key, records)
+        if policy == "error":
+            raise MergeConflict(record_key, records)
+        if policy == "first":
+            yield records[0]
+        elif policy == "last":
+            yield records[-1]
+        else:
+            yield from records
+
+
+def write_history(records, path):
+    """Поток записей -> файл: JSON-массив или (для .jsonl) журнал. Через временный файл и переименование."""
+    journal = path.endswith(".jsonl")
+    tmp = f"{path}.tmp{os.getpid()}"
+    n = 0
+    try:
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            if not journal:
+                f.write("[")
+            for n, record in enumerate(records, 1):
+                if journal:
+                    f.write(json.dumps({"op": "put", "id": n, "rec": record}, ensure_ascii=False,
+                                       separators=(",", ":")) + "\n")
+                else:
+                    f.write(("\n  " if n == 1 else ",\n  ") + json.dumps(record, ensure_ascii=False))
+            if not journal:
+                f.write("\n]\n" if n else "]\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return n
+
+
+def merge_files(paths, output, key=KEY_FIELDS, policy="keep-all", run_size=50_000, on_conflict=None):
+    """Слияние файлов истории paths в output. Возвращает число записей в результате."""
+    records = merge_records((iter_history_file(p) for p in paths), key, policy, run_size, on_conflict,
+                            tmpdir=os.path.dirname(os.path.abspath(output)))
+    return write_history(records, output)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Слияние историй нескольких копий программы.")
+    p.add_argument("inputs", nargs="+", help="history.json / history.jsonl в порядке приоритета")
+    p.add_argument("-o", "--output", required=True, help="результат (.json — массив, .jsonl — журнал)")
+    p.add_argument("--key", default="period,date_saved", help="ключ записи: period,date_saved или period")
+    p.add_argument("--policy", default="keep-all", choices=POLICIES, help="что делать с разными записями одного ключа")
+    p.add_argument("--run", type=int, default=50_000, help="записей в отрезке сортировки (память)")
+    args = p.parse_args(argv)
+
+    out = os.path.abspath(args.output)
+    if any(os.path.abspath(path) == out for path in args.inputs):
+        p.error("выходной файл совпадает с одним из входных")
+    conflicts = 0
+
+    def report(key, records):
+        nonlocal conflicts
+        conflicts += 1
+        if conflicts <= 20:
+            totals = ", ".join(f"{r.get('total')}" for r in records)
+            print(f"Конфликт {' / '.join(str(k) for k in key)}: {len(records)} варианта (итого: {totals})",
+                  file=sys.stderr)
+
+    key = tuple(k.strip() for k in args.key.split(",") if k.strip())
+    try:
+        n = merge_files(args.inputs, args.output, key, args.policy, args.run, report)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"Записей: {n}, конфликтов: {conflicts} (политика {args.policy})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Расчёт в целых копейках.
+Показания и тарифы переводятся в целые числа с фиксированной точностью (4 знака после запятой),
+каждая сумма округляется до копейки по правилу Excel ОКРУГЛ (половина — от нуля),
+а «Итого за воду», «Итого за свет» и «ИТОГО» складываются из уже округлённых слагаемых.
+Поэтому напечатанные строки всегда сходятся с напечатанным итогом.
+"""
+from array import array
+
+from calc import CONSUMPTION_FIELDS, SUM_FIELDS
+from instrument import traced
+
+SCALE = 10_000  # 4 знака после запятой для показаний, тарифов и норматива
+_UNIT = SCALE * SCALE // 100  # (показание × тариф) -> копейки
+_UNIT_HEATING = _UNIT * SCALE  # (показание × норматив × тариф) -> копейки
+
+# Строка счёта: (ключ результата, колонка расхода, тарифы, подогрев ли)
+TERMS = (
+    ("sum_sewage", "sewage", ("tariff_sewage",), False),
+    ("sum_xvs", "xvs", ("tariff_xvs",), False),
+    ("sum_heating", "gvs", ("norm_gcal_per_m3", "tariff_heating_per_gcal"), True),
+    ("sum_gvs", "gvs", ("tariff_gvs",), False),
+    ("sum_el_day", "el_day", ("tariff_el_day",), False),
+    ("sum_el_night", "el_night", ("tariff_el_night",), False),
+)
+
+
+def to_scaled(x):
+    """Число -> целое с точностью SCALE (12.3456 -> 123456)."""
+    return int(round(x * SCALE))
+
+
+def round_div(n, d):
+    """n / d с округлением до целого, половина — от нуля (как ОКРУГЛ в Excel); d > 0."""
+    q, r = divmod(abs(n), d)
+    if 2 * r >= d:
+        q += 1
+    return q if n >= 0 else -q
+
+
+def kopecks_to_str(k):
+    """12345 -> "123.45"."""
+    sign = "-" if k < 0 else ""
+    k = abs(k)
+    return f"{sign}{k // 100}.{k % 100:02d}"
+
+
+def calculate_kopecks(
+    xvs_prev: float,
+    xvs_curr: float,
+    gvs_prev: float,
+    gvs_curr: float,
+    el_day_prev: float,
+    el_day_curr: float,
+    el_night_prev: float,
+    el_night_curr: float,
+    tariff_sewage: float = 46.73,
+    tariff_xvs: float = 43.24,
+    tariff_gvs: float = 43.24,
+    tariff_heating_per_gcal: float = 2891.74,
+    norm_gcal_per_m3: float = 0.06,
+    tariff_el_day: float = 6.79,
+    tariff_el_night: float = 2.81,
+):
+    """
+    То же, что calc.calculate(), но все суммы — целые копейки (int),
+    а расходы — целые в единицах 1/SCALE.
+    """
+    c_xvs = to_scaled(xvs_curr) - to_scaled(xvs_prev)
+    c_gvs = to_scaled(gvs_curr) - to_scaled(gvs_prev)
+    c_day = to_scaled(el_day_curr) - to_scaled(el_day_prev)
+    c_night = to_scaled(el_night_curr) - to_scaled(el_night_prev)
+    c_sewage = c_xvs + c_gvs
+
+    sum_sewage = round_div(c_sewage * to_scaled(tariff_sewage), _UNIT)
+    sum_xvs = round_div(c_xvs * to_scaled(tariff_xvs), _UNIT)
+    sum_heating = round_div(c_gvs * to_scaled(norm_gcal_per_m3) * to_scaled(tariff_heating_per_gcal), _UNIT_HEATING)
+    sum_gvs = round_div(c_gvs * to_scaled(tariff_gvs), _UNIT)
+    sum_el_day = round_div(c_day * to_scaled(tariff_el_day), _UNIT)
+    sum_el_night = round_div(c_night * to_scaled(tariff_el_night), _UNIT)
+    sum_water = sum_sewage + sum_xvs + sum_heating + sum_gvs
+    sum_electricity = sum_el_day + sum_el_night
+
+    return {
+        "consumption": {
+            "xvs": c_xvs,
+            "gvs": c_gvs,
+            "sewage": c_sewage,
+            "el_day": c_day,
+            "el_night": c_night,
+        },
+        "sum_sewage": sum_sewage,
+        "sum_xvs": sum_xvs,
+        "sum_heating": sum_heating,
+        "sum_gvs": sum_gvs,
+        "sum_water": sum_water,
+        "sum_el_day": sum_el_day,
+        "sum_el_night": sum_el_night,
+        "sum_electricity": sum_electricity,
+        "total": sum_water + sum_electricity,
+    }
+
+
+@traced("calculate_exact")
+def calculate_exact(*args, **kwargs):
+    """
+    Как calc.calculate() (те же аргументы и ключи результата, суммы — float с двумя знаками),
+    но посчитано в копейках: слагаемые всегда сходятся с итогами.
+    """
+    k = calculate_kopecks(*args, **kwargs)
+    result = {"consumption": {f: v / SCALE for f, v in k["consumption"].items()}}
+    for f in SUM_FIELDS:
+        result[f] = k[f] / 100
+    return result
+
+
+def term_kopecks(consumption, rate, heating=False):
+    """
+    Одна строка счёта для колонки расходов (целые в 1/SCALE): array("q") копеек.
+    rate — to_scaled(тариф), для подогрева — to_scaled(норматив) * to_scaled(тариф за Гкал) и heating=True.
+    Округление то же, что в calculate_kopecks().
+    """
+    unit = _UNIT_HEATING if heating else _UNIT
+    half = unit // 2
+    return array("q", [(c * rate + half) // unit if c >= 0 else round_div(c * rate, unit) for c in consumption])
+
+
+def calculate_batch_exact(
+    xvs_prev,
+    xvs_curr,
+    gvs_prev,
+    gvs_curr,
+    el_day_prev,
+    el_day_curr,
+    el_night_prev,
+    el_night_curr,
+    tariff_sewage: float = 46.73,
+    tariff_xvs: float = 43.24,
+    tariff_gvs: float = 43.24,
+    tariff_heating_per_gcal: float = 2891.74,
+    norm_gcal_per_m3: float = 0.06,
+    tariff_el_day: float = 6.79,
+    tariff_el_night: float = 2.81,
+):
+    """
+    Пакетный вариант calculate_kopecks(): колонки показаний на входе,
+    колонки копеек array("q") на выходе (ключи SUM_FIELDS) и расходов в 1/SCALE (ключ "consumption").
+    Тарифы переводятся в целые один раз на всю пачку.
+    """
+    cols = (xvs_prev, xvs_curr, gvs_prev, gvs_curr,
+            el_day_prev, el_day_curr, el_night_prev, el_night_curr)
+    n = len(xvs_prev)
+    if any(len(c) != n for c in cols):
+        raise ValueError("Колонки показаний должны быть одинаковой длины")
+    t_sewage, t_xvs, t_gvs, t_day, t_night = (
+        to_scaled(t) for t in (tariff_sewage, tariff_xvs, tariff_gvs, tariff_el_day, tariff_el_night)
+    )
+    t_heating = to_scaled(norm_gcal_per_m3) * to_scaled(tariff_heating_per_gcal)
+    unit, unit_h = _UNIT, _UNIT_HEATING
+    half, half_h = _UNIT // 2, _UNIT_HEATING // 2
+
+    cons = {k: array("q") for k in CONSUMPTION_FIELDS}
+    sums = {k: array("q") for k in SUM_FIELDS}
+    c_xvs_a, c_gvs_a, c_sew_a = cons["xvs"].append, cons["gvs"].append, cons["sewage"].append
+    c_day_a, c_night_a = cons["el_day"].append, cons["el_night"].append
+    (o_sewage, o_xvs, o_heating, o_gvs, o_water,
+     o_day, o_night, o_el, o_total) = (sums[k].append for k in SUM_FIELDS)
+    s = SCALE
+    for xp, xc, gp, gc, dp, dc, night_p, night_c in zip(*cols):
+        c_xvs = int(round(xc * s)) - int(round(xp * s))
+        c_gvs = int(round(gc * s)) - int(round(gp * s))
+        c_day = int(round(dc * s)) - int(round(dp * s))
+        c_night = int(round(night_c * s)) - int(round(night_p * s))
+        c_sewage = c_xvs + c_gvs
+        # Быстрый путь для неотрицательных расходов (после проверки показаний — всегда):
+        # (n + d/2) // d — то же округление «половина от нуля», что и round_div()
+        if c_xvs >= 0 and c_gvs >= 0 and c_day >= 0 and c_night >= 0:
+            sum_sewage = (c_sewage * t_sewage + half) // unit
+            sum_xvs = (c_xvs * t_xvs + half) // unit
+            sum_heating = (c_gvs * t_heating + half_h) // unit_h
+            sum_gvs = (c_gvs * t_gvs + half) // unit
+            sum_el_day = (c_day * t_day + half) // unit
+            sum_el_night = (c_night * t_night + half) // unit
+        else:
+            sum_sewage = round_div(c_sewage * t_sewage, unit)
+            sum_xvs = round_div(c_xvs * t_xvs, unit)
+            sum_heating = round_div(c_gvs * t_heating, unit_h)
+            sum_gvs = round_div(c_gvs * t_gvs, unit)
+            sum_el_day = round_div(c_day * t_day, unit)
+            sum_el_night = round_div(c_night * t_night, unit)
+        sum_water = sum_sewage + sum_xvs + sum_heating + sum_gvs
+        sum_electricity = sum_el_day + sum_el_night
+        c_xvs_a(c_xvs)
+        c_gvs_a(c_gvs)
+        c_sew_a(c_sewage)
+        c_day_a(c_day)
+        c_night_a(c_night)
+        o_sewage(sum_sewage)
+        o_xvs(sum_xvs)
+        o_heating(sum_heating)
+        o_gvs(sum_gvs)
+        o_water(sum_water)
+        o_day(sum_el_day)
+        o_night(sum_el_night)
+        o_el(sum_electricity)
+        o_total(sum_water + sum_electricity)
+    result = {"consumption": cons}
+    result.update(sums)
+    return result
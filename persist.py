@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Надёжная запись файлов и фоновый поток записи.
+atomic_write_text() пишет во временный файл рядом, делает fsync и подменяет файл через os.replace:
+после сбоя на диске остаётся либо старая, либо новая версия, но не обрезанная.
+BackgroundWriter выполняет запись вне главного потока Tk: задания с одним ключом,
+пришедшие, пока поток занят, склеиваются в одно — серия правок даёт одну запись.
+Результаты забираются из главного потока методом poll(); watch() опрашивает по таймеру after()
+(в окне — tk.Tk, в тестах — поддельный таймер).
+"""
+import json
+import os
+import threading
+from collections import deque
+
+
+def atomic_write_text(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def atomic_write_json(path, data):
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=2))
+
+
+class BackgroundWriter:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._jobs = {}  # ключ -> (функция, [обработчики]) в порядке поступления
+        self._done = deque()  # ([обработчики], ошибка или None)
+        self._busy = False
+        self._thread = None
+        self._watch = None  # задание таймера опроса (watch)
+        self.writes = 0  # выполненных заданий (после склейки)
+        self.submitted = 0
+
+    def submit(self, key, fn, on_done=None):
+        """
+        Ставит fn() в очередь под ключом key. Если задание с тем же ключом ещё ждёт,
+        вместо него выполнится новое, а обработчики обоих получат один результат.
+        on_done(ошибка или None) вызывается из poll() — то есть в главном потоке.
+        """
+        with self._cond:
+            self.submitted += 1
+            callbacks = self._jobs.pop(key, (None, []))[1]
+            if on_done is not None:
+                callbacks.append(on_done)
+            self._jobs[key] = (fn, callbacks)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="zhkh-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def poll(self):
+        """Вызывает обработчики завершённых заданий. True — если запись ещё идёт."""
+        while True:
+            with self._cond:
+                if not self._done:
+                    return bool(self._jobs) or self._busy
+                callbacks, error = self._done.popleft()
+            for cb in callbacks:
+                cb(error)
+
+    def watch(self, scheduler, interval_ms=50):
+        """
+        Опрос poll() раз в interval_ms через scheduler.after, пока запись идёт; потом опрос прекращается.
+        Повторный вызов во время опроса ничего не делает.
+        """
+        if self._watch is not None:
+            return
+
+        def tick():
+            self._watch = None
+            if self.poll():
+                self._watch = scheduler.after(interval_ms, tick)
+
+        self._watch = scheduler.after(interval_ms, tick)
+
+    def flush(self, timeout=None):
+        """Ждёт окончания всех заданий (при закрытии окна). False — не успели за timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._jobs and not self._busy, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._jobs)
+                key = next(iter(self._jobs))
+                fn, callbacks = self._jobs.pop(key)
+                self._busy = True
+            error = None
+            try:
+                fn()
+            except Exception as e:
+                error = e
+            with self._cond:
+                self.writes += 1
+                self._busy = False
+                self._done.append((callbacks, error))
+                self._cond.notify_all()
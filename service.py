@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный HTTP-сервис расчёта для других программ (без окна, tkinter не импортируется).
+
+    python service.py [--host 127.0.0.1] [--port 8765] [--config config.json]
+
+    POST /calculate         {"xvs_prev": 55.58, ..., "period": "Октябрь 2025"} или массив таких объектов;
+                            ?exact=1 — расчёт в копейках, как в окне программы
+    GET  /tariffs           действующие тарифы (?period=Октябрь 2025 — тарифы того периода)
+    GET  /history           записи истории, новые сверху; ?period=&year=&min_total=&max_total=&limit=&offset=
+    GET  /history/summary   итоги: всего, в среднем, по годам
+    GET  /health            счётчики запросов и пачек
+
+Одновременные запросы на расчёт собираются в пачки (окно --window-ms, не больше --max-batch строк)
+и считаются одним вызовом calculate_batch() (с правилами тарифов из config.json — планом tariff_rules
+в копейках, как в окне программы). config.json и история держатся в памяти
+и перечитываются, только если файл на диске изменился (проверка по os.stat).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from math import isfinite
+from urllib.parse import parse_qs, urlsplit
+
+from calc import CONSUMPTION_FIELDS, SUM_FIELDS, calculate_batch
+from core import (
+    CONFIG_PATH, READING_KEYS, history_aggregates, load_config, load_rules, parse_float, parse_readings,
+    tariffs_from_config,
+)
+from money import SCALE, calculate_batch_exact
+from tariff_schedule import TariffSchedule
+
+MAX_BODY = 16 * 1024 * 1024
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class CalcBatcher:
+    """Собирает запросы на расчёт в пачки и считает каждую пачку одним вызовом пакетного расчёта."""
+
+    def __init__(self, window=0.002, max_batch=512):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = []  # (показания, тарифы, exact, план правил или None, future)
+        self._timer = None
+        self.batches = 0
+        self.rows = 0
+
+    def submit(self, inputs, tariffs, exact=False, plan=None):
+        """plan — tariff_rules.TariffPlan для tariffs, если в config.json есть правила тарифов."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((inputs, tariffs, exact, plan, future))
+        if len(self._queue) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        queue, self._queue = self._queue, []
+        # Запросы с разными тарифами (периодами) и режимами считаются разными пачками
+        groups = {}
+        for item in queue:
+            key = (id(item[1]), item[2], id(item[3]))
+            groups.setdefault(key, []).append(item)
+        for items in groups.values():
+            try:
+                results = _calculate_rows([i[0] for i in items], items[0][1], items[0][2], items[0][3])
+            except Exception:
+                # Ошибка одной строки не должна ронять соседние запросы пачки: пересчёт по одной строке
+                results = [_calculate_one(item) for item in items]
+            for item, result in zip(items, results):
+                if item[4].done():
+                    continue
+                if isinstance(result, Exception):
+                    item[4].set_exception(result)
+                else:
+                    item[4].set_result(result)
+            self.batches += 1
+            self.rows += len(items)
+
+
+def _calculate_one(item):
+    """Расчёт одной строки очереди: результат или исключение, которым завершится её future."""
+    inputs, tariffs, exact, plan, _ = item
+    try:
+        return _calculate_rows([inputs], tariffs, exact, plan)[0]
+    except Exception as e:
+        return e
+
+
+def _calculate_rows(rows, tariffs, exact, plan=None):
+    """Список показаний -> список результатов в форме calc.calculate(); с планом правил — всегда в копейках."""
+    cols = {k: [r[k] for r in rows] for k in READING_KEYS}
+    if plan is not None:
+        res = plan.batch(**cols)
+        cons_div, sum_div = SCALE, 100
+    elif exact:
+        res = calculate_batch_exact(**cols, **tariffs)
+        cons_div, sum_div = SCALE, 100
+    else:
+        res = calculate_batch(**cols, **tariffs)
+        cons_div, sum_div = 1, 1
+    cons = [(f, res["consumption"][f]) for f in CONSUMPTION_FIELDS]
+    sums = [(f, res[f]) for f in SUM_FIELDS]
+    out = []
+    for j in range(len(rows)):
+        result = {"consumption": {f: col[j] / cons_div for f, col in cons}}
+        for f, col in sums:
+            result[f] = col[j] / sum_div
+        out.append(result)
+    return out
+
+
+class BillingService:
+    def __init__(self, config_path=None, window=0.002, max_batch=512):
+        self.config_path = config_path or CONFIG_PATH
+        self.batcher = CalcBatcher(window, max_batch)
+        self.requests = 0
+        self._config_stat = False
+        self._config = None
+        self._schedule = None
+        self._rules = None
+
+    # --- Данные в памяти ---
+
+    def schedule(self):
+        """Тарифы по датам (и правила тарифов); config.json перечитывается, только если изменился на диске."""
+        try:
+            st = os.stat(self.config_path)
+            stat = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stat = None
+        if stat != self._config_stat:
+            config = load_config(self.config_path)
+            try:
+                rules = load_rules(config)
+            except ValueError as e:
+                raise HttpError(500, f"config.json: {e}")
+            self._config = config
+            self._schedule = TariffSchedule.from_config(config)
+            self._rules = rules
+            self._config_stat = stat
+        return self._schedule
+
+    # --- Обработчики ---
+
+    async def calculate(self, query, body):
+        exact = _flag(query, "exact")
+        payload = _json_body(body)
+        single = not isinstance(payload, list)
+        items = [payload] if single else payload
+        if not all(isinstance(item, dict) for item in items):
+            raise HttpError(400, "Ожидался объект показаний или массив объектов.")
+        schedule = self.schedule()
+        futures = []
+        for item in items:
+            period = item.get("period")
+            if period is not None and not isinstance(period, str):
+                futures.append("Поле period должно быть строкой («Октябрь 2025»).")
+                continue
+            try:
+                inputs = parse_readings(item)
+            except ValueError as e:
+                futures.append(str(e))
+                continue
+            tariffs = schedule.for_period(period) if period else schedule.at(_today())
+            plan = self._rules.plan(tariffs) if self._rules else None
+            futures.append(self.batcher.submit(inputs, tariffs, exact, plan))
+        results = []
+        for f in futures:
+            results.append({"error": f} if isinstance(f, str) else await f)
+        if single:
+            if "error" in results[0]:
+                raise HttpError(400, results[0]["error"])
+            return results[0]
+        return results
+
+    async def tariffs(self, query, body):
+        schedule = self.schedule()
+        period = _param(query, "period")
+        if period:
+            return {"period": period, "tariffs": schedule.for_period(period)}
+        config = self._config
+        return {
+            "tariffs": tariffs_from_config(config),
+            "tariffs_from": config.get("tariffs_from"),
+            "schedule": config.get("schedule") or [],
+        }
+
+    async def history(self, query, body):
+        period = (_param(query, "period") or "").strip().lower()
+        year = _param(query, "year")
+        min_total = _number(query, "min_total")
+        max_total = _number(query, "max_total")
+        limit = _count(query, "limit", 100)
+        offset = _count(query, "offset", 0)
+        rows = history_aggregates().rows()
+        # Фильтруем по колонкам, словари собираем только для отдаваемой страницы
+        columns = zip(rows.values("period"), rows.values("year"), rows.values("total"))
+        matched = []
+        for i, (p, y, total) in enumerate(columns):
+            if period and period not in (p or "").lower():
+                continue
+            if year and y != year:
+                continue
+            if min_total is not None and total < min_total:
+                continue
+            if max_total is not None and total > max_total:
+                continue
+            matched.append(i)
+        matched.reverse()
+        return {"count": len(matched), "records": [rows[i] for i in matched[offset:offset + limit]]}
+
+    async def history_summary(self, query, body):
+        agg = history_aggregates()
+        return {
+            "count": len(agg),
+            "total": agg.total,
+            "average": round(agg.average, 2),
+            "sum_water": agg.sum_water,
+            "sum_electricity": agg.sum_electricity,
+            "last": agg.last(),
+            "by_year": agg.by_year(),
+        }
+
+    async def health(self, query, body):
+        return {"ok": True, "requests": self.requests,
+                "batches": self.batcher.batches, "rows": self.batcher.rows}
+
+    ROUTES = {
+        ("POST", "/calculate"): calculate,
+        ("GET", "/tariffs"): tariffs,
+        ("GET", "/history"): history,
+        ("GET", "/history/summary"): history_summary,
+        ("GET", "/health"): health,
+    }
+
+    # --- HTTP ---
+
+    async def handle(self, reader, writer):
+        """Одно соединение; HTTP/1.1 keep-alive — несколько запросов подряд."""
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = await self.dispatch(method, target, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HttpError as e:
+            writer.write(_response(e.status, {"error": str(e)}, False))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, body):
+        self.requests += 1
+        url = urlsplit(target)
+        handler = self.ROUTES.get((method, url.path))
+        try:
+            if handler is None:
+                if any(path == url.path for _, path in self.ROUTES):
+                    raise HttpError(405, f"Метод {method} не поддерживается для {url.path}.")
+                raise HttpError(404, f"Нет ресурса {url.path}.")
+            return 200, await handler(self, parse_qs(url.query), body)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Некорректная строка запроса.")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(400, "Некорректный Content-Length.")
+    if length < 0:
+        raise HttpError(400, "Некорректный Content-Length.")
+    if length > MAX_BODY:
+        raise HttpError(413, "Слишком большой запрос.")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def _response(status, payload, keep_alive=True):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+def _json_body(body):
+    try:
+        return json.loads(body or b"null")
+    except ValueError as e:
+        raise HttpError(400, f"Некорректный JSON: {e}")
+
+
+def _param(query, name):
+    values = query.get(name)
+    return values[-1] if values else None
+
+
+def _number(query, name):
+    value = _param(query, name)
+    if value is None:
+        return None
+    v = parse_float(value)
+    if v is None or not isfinite(v):
+        raise HttpError(400, f"Параметр {name} должен быть числом.")
+    return v
+
+
+def _count(query, name, default):
+    """Неотрицательное целое из строки запроса (limit, offset); nan, дробь или минус — 400."""
+    value = _param(query, name)
+    if value is None:
+        return default
+    try:
+        v = int(value)
+    except ValueError:
+        v = -1
+    if v < 0:
+        raise HttpError(400, f"Параметр {name} должен быть неотрицательным целым числом.")
+    return v
+
+
+def _flag(query, name):
+    return (_param(query, name) or "").lower() in ("1", "true", "yes")
+
+
+def _today():
+    from datetime import date
+
+    return date.today().isoformat()
+
+
+async def serve(host="127.0.0.1", port=8765, config_path=None, window=0.002, max_batch=512):
+    service = BillingService(config_path, window, max_batch)
+    server = await asyncio.start_server(service.handle, host, port)
+    sockname = server.sockets[0].getsockname()
+    print(f"Сервис расчёта: http://{sockname[0]}:{sockname[1]}", file=sys.stderr, flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Локальный HTTP-сервис расчёта ЖКХ.")
+    p.add_argument("--host", default="127.0.0.1", help="адрес (по умолчанию только этот компьютер)")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--config", help="путь к config.json")
+    p.add_argument("--window-ms", type=float, default=2.0, help="сколько ждать попутных запросов для пачки")
+    p.add_argument("--max-batch", type=int, default=512, help="строк в пачке не больше")
+    args = p.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.config, args.window_ms / 1000, args.max_batch))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
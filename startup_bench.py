@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Время запуска окна: от старта процесса до первой отрисовки и до загруженной истории.
+
+    python startup_bench.py [--exe dist/Kalkulyator_ZHKH] [--exe dist/Kalkulyator_ZHKH_dir/Kalkulyator_ZHKH]
+                            [--build] [--runs 10] [--history 10000] [--budget 1500] [--out startup.json]
+
+Цели замера: окно из исходников (python main.py) и собранные программы (--exe, можно несколько раз);
+--build собирает обе (Kalkulyator_ZHKH.spec — один файл, Kalkulyator_ZHKH_onedir.spec — папка)
+PyInstaller'ом во временную папку и меряет их. На Linux собирается Linux-версия — та же схема запуска
+(распаковка одного файла против готовой папки), что и у exe для Windows.
+
+Каждый запуск — новый процесс в свежей папке данных (ZHKH_DATA_DIR) с историей на --history записей.
+С переменной ZHKH_STARTUP_PROBE окно пишет время первой отрисовки и загрузки истории и закрывается;
+время отсчитывается от запуска процесса, поэтому в замер входит и распаковка собранной программы.
+Окно открывается на виртуальном дисплее Xvfb (как в ui_bench.py) или на --display.
+Печатаются медиана и разброс по целям; код выхода 1, если медиана первой отрисовки больше --budget мс,
+2 — замер не удался.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from ui_bench import start_xvfb
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPECS = (("один файл", "Kalkulyator_ZHKH.spec", "Kalkulyator_ZHKH"),
+         ("папка", "Kalkulyator_ZHKH_onedir.spec", os.path.join("Kalkulyator_ZHKH_dir", "Kalkulyator_ZHKH")))
+
+
+def build(workdir):
+    """Обе сборки PyInstaller'ом в workdir -> [(название, путь к программе)]."""
+    dist = os.path.join(workdir, "dist")
+    suffix = ".exe" if sys.platform == "win32" else ""
+    targets = []
+    for name, spec, exe in SPECS:
+        cmd = [sys.executable, "-m", "PyInstaller", "--noconfirm", "--log-level", "WARN",
+               "--distpath", dist, "--workpath", os.path.join(workdir, "build"), os.path.join(HERE, spec)]
+        proc = subprocess.run(cmd, cwd=HERE, capture_output=True, text=True)
+        if proc.returncode:
+            raise RuntimeError(f"Сборка {spec} не удалась (нужен pip install pyinstaller):\n{proc.stderr.strip()}")
+        targets.append((name, os.path.join(dist, exe + suffix)))
+    return targets
+
+
+def prepare(n, datadir):
+    """Папка данных: журнал history.jsonl на n записей (как после обычной работы) и config.json."""
+    from bench import synthetic_history
+    from core import DEFAULT_TARIFFS
+    from history_store import HistoryStore
+
+    os.makedirs(datadir, exist_ok=True)
+    store = HistoryStore(os.path.join(datadir, "history.jsonl"))
+    store.replace_all(synthetic_history(n))
+    store.flush()
+    with open(os.path.join(datadir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(DEFAULT_TARIFFS, f, ensure_ascii=False)
+
+
+def measure(cmd, template, display, timeout=120):
+    """Один запуск в копии папки данных template -> (мс до первой отрисовки, до истории, до выхода)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        datadir = os.path.join(tmp, "data")
+        shutil.copytree(template, datadir)
+        probe = os.path.join(tmp, "probe.jsonl")
+        env = dict(os.environ, ZHKH_DATA_DIR=datadir, ZHKH_STARTUP_PROBE=probe, DISPLAY=display)
+        env.pop("ZHKH_TRACE", None)
+        t0 = time.time()
+        proc = subprocess.run(cmd, env=env, cwd=tmp, capture_output=True, text=True, timeout=timeout)
+        exited = time.time()
+        if proc.returncode or not os.path.isfile(probe):
+            raise RuntimeError(f"{' '.join(cmd)}: код {proc.returncode}\n{proc.stderr.strip()}")
+        with open(probe, "r", encoding="utf-8") as f:
+            marks = json.loads(f.readline())
+    return (marks["paint"] - t0) * 1000, (marks["ready"] - t0) * 1000, (exited - t0) * 1000
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Время до первой отрисовки окна: исходники и собранные программы.")
+    p.add_argument("--exe", action="append", default=[], help="собранная программа (можно несколько раз)")
+    p.add_argument("--build", action="store_true", help="собрать один файл и папку PyInstaller'ом и замерить их")
+    p.add_argument("--no-source", action="store_true", help="не замерять запуск из исходников")
+    p.add_argument("--runs", type=int, default=10, help="запусков на цель")
+    p.add_argument("--history", type=int, default=10_000, help="записей в истории")
+    p.add_argument("--budget", type=float, help="допустимая медиана до первой отрисовки, мс")
+    p.add_argument("--display", help="готовый X-дисплей (по умолчанию запускается Xvfb)")
+    p.add_argument("--out", help="сохранить результаты в JSON")
+    args = p.parse_args(argv)
+
+    targets = [] if args.no_source else [("исходники", [sys.executable, os.path.join(HERE, "main.py")])]
+    targets += [(os.path.basename(path), [os.path.abspath(path)]) for path in args.exe]
+    xvfb = None
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            if args.build:
+                targets += [(name, [path]) for name, path in build(workdir)]
+            if not targets:
+                p.error("нечего замерять: укажите --exe или --build")
+            template = os.path.join(workdir, "data")
+            prepare(args.history, template)
+            display = args.display
+            if not display:
+                xvfb, display = start_xvfb()
+            for name, cmd in targets:
+                measure(cmd, template, display)  # прогрев: кэш диска, первая распаковка
+                results[name] = [measure(cmd, template, display) for _ in range(args.runs)]
+    except (OSError, RuntimeError, ValueError, subprocess.TimeoutExpired) as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+    print(f"История: {args.history} записей, запусков на цель: {args.runs}; медиана (min–max)")
+    over = []
+    for name, runs in results.items():
+        paint, ready, exited = ([r[i] for r in runs] for i in range(3))
+        print(f"{name:<20} первая отрисовка {statistics.median(paint):.0f} мс ({min(paint):.0f}–{max(paint):.0f}), "
+              f"история {statistics.median(ready):.0f} мс ({min(ready):.0f}–{max(ready):.0f}), "
+              f"выход {statistics.median(exited):.0f} мс")
+        if args.budget is not None and statistics.median(paint) > args.budget:
+            over.append(name)
+    if args.out:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "history": args.history,
+            },
+            "results": {name: [{"paint_ms": a, "ready_ms": b, "exit_ms": c} for a, b, c in runs]
+                        for name, runs in results.items()},
+        }
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if over:
+        print(f"Первая отрисовка дольше {args.budget:.0f} мс: {', '.join(over)}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
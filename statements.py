@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Квитанции по квартирам после массового расчёта: по файлу HTML и/или текста на квартиру.
+
+    python statements.py readings.csv -o statements [--period "Октябрь 2025"] [--format html,txt]
+                         [--workers 4] [--chunk 500] [--delimiter ";"] [--config config.json]
+
+Вход — тот же CSV, что у bulk.py (apartment и 8 столбцов показаний). Суммы считаются в копейках
+по тарифам периода и правилам тарифов из config.json (tariff_rules), разбивка в квитанции — те же строки,
+что в окне «Результат» (core.RESULT_SECTIONS).
+Шаблоны разбираются один раз при запуске процесса-исполнителя (Template): квитанция — склейка готовых
+кусков текста с подставленными значениями. Пачки строк считаются и отрисовываются в процессах,
+главный процесс пишет файлы по мере готовности пачек, в порядке входа; в работе не больше workers * 2 пачек.
+Строки с ошибками квитанций не получают — они перечислены в errors.csv в той же папке.
+"""
+import argparse
+import csv
+import html
+import multiprocessing
+import os
+import re
+import string
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from bulk import parse_chunk, read_chunks
+from calc import CONSUMPTION_FIELDS, SUM_FIELDS
+from core import (
+    RESULT_SECTIONS, TOTAL_LABEL, consumption_line, default_period_name, load_config, load_rules,
+)
+from money import SCALE, calculate_batch_exact, kopecks_to_str
+from tariff_schedule import TariffSchedule
+
+FORMATS = ("html", "txt")
+
+
+class Template:
+    """
+    Шаблон с полями {имя}: текст разбирается один раз в список (литерал, поле),
+    render() только склеивает куски. escape — функция для подставляемых значений (html.escape для HTML).
+    """
+
+    def __init__(self, text, escape=None):
+        self.parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if spec or conversion:
+                raise ValueError(f"Поле {{{field}}}: форматирование задаётся при подготовке значений")
+            self.parts.append((literal, field))
+        self.fields = {field for _, field in self.parts if field is not None}
+        self.escape = escape
+
+    def render(self, values):
+        escape = self.escape
+        out = []
+        for literal, field in self.parts:
+            out.append(literal)
+            if field is not None:
+                value = values[field]
+                out.append(escape(value) if escape else value)
+        return "".join(out)
+
+
+def _text_source():
+    """Текст квитанции: заголовок и те же строки, что core.result_lines()."""
+    lines = ["Квитанция: квартира {apartment}, {period}", "", "{consumption}"]
+    for title, rows in RESULT_SECTIONS:
+        lines += ["", f"——— {title} ———"]
+        lines += [f"  {label + ':':<19}{{{key}}} руб" for label, key in rows]
+    lines += ["", "═══════════════════════", f"  {TOTAL_LABEL + ':':<19}{{total}} руб", ""]
+    return "\n".join(lines)
+
+
+def _html_source():
+    rows = []
+    for title, items in RESULT_SECTIONS:
+        rows.append(f'<tr class="section"><th colspan="2">{html.escape(title)}</th></tr>')
+        for label, key in items:
+            cls = ' class="subtotal"' if key in ("sum_water", "sum_electricity") else ""
+            rows.append(f'<tr{cls}><td>{html.escape(label)}</td><td class="sum">{{{key}}} руб</td></tr>')
+    rows.append(f'<tr class="total"><td>{html.escape(TOTAL_LABEL)}</td><td class="sum">{{total}} руб</td></tr>')
+    # Фигурные скобки CSS удвоены — это литералы, а не поля шаблона
+    return (
+        '<!DOCTYPE html>\n<html lang="ru"><head><meta charset="utf-8">'
+        "<title>Квитанция: кв. {apartment}, {period}</title>"
+        "<style>body{{font-family:Segoe UI,Arial,sans-serif;margin:24px}}"
+        "table{{border-collapse:collapse;min-width:360px}}td,th{{padding:4px 8px;text-align:left}}"
+        ".sum{{text-align:right}}.section th{{padding-top:12px}}.subtotal td,.total td{{font-weight:bold}}"
+        ".total td{{border-top:2px solid #333}}@media print{{body{{margin:0}}}}</style></head>\n"
+        "<body><h1>Квартира {apartment}</h1><p>{period}</p><p>{consumption}</p>\n<table>\n"
+        + "\n".join(rows)
+        + "\n</table></body></html>\n"
+    )
+
+
+_templates = None
+
+
+def _compile_templates():
+    """Один раз на процесс (initializer пула): разбор шаблонов."""
+    global _templates
+    _templates = {"txt": Template(_text_source()), "html": Template(_html_source(), html.escape)}
+    return _templates
+
+
+def render_chunk(lines, columns, tariffs, period, formats, delimiter=",", rules=None):
+    """
+    Расчёт и отрисовка пачки строк в процессе-исполнителе; rules — tariff_rules.TariffRules или None.
+    Возвращает ([(квартира, {формат: текст})], [(квартира, ошибка)]).
+    """
+    templates = _templates or _compile_templates()
+    apartments, errors, cols = parse_chunk(lines, columns, delimiter)
+    res = rules.plan(tariffs).batch(**cols) if rules else calculate_batch_exact(**cols, **tariffs)
+    cons = [(f, res["consumption"][f]) for f in CONSUMPTION_FIELDS]
+    sums = [(f, res[f]) for f in SUM_FIELDS]
+    out = []
+    failed = []
+    j = 0
+    for apartment, error in zip(apartments, errors):
+        if error:
+            failed.append((apartment, error))
+            continue
+        values = {"apartment": apartment, "period": period,
+                  "consumption": consumption_line({f: col[j] / SCALE for f, col in cons})}
+        for f, col in sums:
+            values[f] = kopecks_to_str(col[j])
+        out.append((apartment, {fmt: templates[fmt].render(values) for fmt in formats}))
+        j += 1
+    return out, failed
+
+
+_UNSAFE = re.compile(r"[^\w.-]+")
+
+
+def file_name(apartment, taken):
+    """Имя файла по номеру квартиры; повтор номера получает суффикс -2, -3, ..."""
+    base = _UNSAFE.sub("_", apartment.strip()).strip("._") or "без_номера"
+    name, n = base, 1
+    while name.lower() in taken:
+        n += 1
+        name = f"{base}-{n}"
+    taken.add(name.lower())
+    return name
+
+
+def run(src, out_dir, tariffs, period, formats=FORMATS, workers=None, chunk_size=500, delimiter=",",
+        rules=None):
+    """Квитанции по всем строкам src в out_dir. Возвращает (квитанций, ошибок, секунд)."""
+    workers = workers or os.cpu_count() or 1
+    columns, chunks = read_chunks(src, chunk_size, delimiter)
+    os.makedirs(out_dir, exist_ok=True)
+    taken = set()
+    written = failed = 0
+    t0 = time.perf_counter()
+    with open(os.path.join(out_dir, "errors.csv"), "w", encoding="utf-8", newline="") as errors_file:
+        errors = csv.writer(errors_file, lineterminator="\n")
+        errors.writerow(("apartment", "error"))
+
+        def flush(future):
+            nonlocal written, failed
+            rendered, bad = future.result()
+            for apartment, texts in rendered:
+                name = file_name(apartment, taken)
+                for fmt, text in texts.items():
+                    with open(os.path.join(out_dir, f"{name}.{fmt}"), "w", encoding="utf-8", newline="\n") as f:
+                        f.write(text)
+            errors.writerows(bad)
+            written += len(rendered)
+            failed += len(bad)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_compile_templates) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(render_chunk, chunk, columns, tariffs, period, formats, delimiter,
+                                           rules))
+                while len(pending) >= workers * 2:
+                    flush(pending.popleft())
+            while pending:
+                flush(pending.popleft())
+    return written, failed, time.perf_counter() - t0
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Квитанции по квартирам (HTML и текст) по файлу показаний.")
+    p.add_argument("input", help="CSV с показаниями, как для bulk.py («-» — stdin)")
+    p.add_argument("-o", "--output", default="statements", help="папка для квитанций")
+    p.add_argument("--period", default=None, help="период квитанций (по умолчанию — текущий месяц)")
+    p.add_argument("--format", default="html,txt", help="html, txt или оба через запятую")
+    p.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — по числу ядер)")
+    p.add_argument("--chunk", type=int, default=500, help="строк в пачке")
+    p.add_argument("--delimiter", default=",", help="разделитель столбцов (для выгрузок Excel — «;»)")
+    p.add_argument("--config", help="путь к config.json")
+    args = p.parse_args(argv)
+
+    formats = tuple(f.strip() for f in args.format.split(",") if f.strip())
+    if not formats or any(f not in FORMATS for f in formats):
+        p.error("--format: html, txt или html,txt")
+    period = args.period or default_period_name()
+    config = load_config(args.config)
+    try:
+        rules = load_rules(config)
+    except ValueError as e:
+        p.error(f"config.json: {e}")
+    tariffs = TariffSchedule.from_config(config).for_period(period)
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8-sig", newline="")
+    try:
+        written, failed, seconds = run(src, args.output, tariffs, period, formats,
+                                       args.workers, args.chunk, args.delimiter, rules)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        if src is not sys.stdin:
+            src.close()
+    rate = f"{written / seconds if seconds else 0:,.0f}".replace(",", " ")
+    print(f"Квитанций: {written}, с ошибками: {failed}, время: {seconds:.2f} с, {rate} квитанций/с",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
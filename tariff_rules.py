@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Правила тарифов из config.json: ступени по норме потребления (социальная норма), норма на жильца,
+общая норма для зон электричества. Ставки берутся из тарифов версии (TariffSchedule, окно «Тарифы»),
+правила задают только то, как считается строка счёта:
+
+    "rules": {
+        "residents": 2,
+        "lines": {
+            "sum_xvs": {"tiers": [{"upto": 6.0, "per_resident": true}, {"k": 1.5}]},
+            "sum_sewage": {"tiers": [{"upto": 10.5, "per_resident": true}, {"k": 1.5}]},
+            "sum_el_day": {"tiers": [{"upto": 80, "per_resident": true}, {"k": 1.3}],
+                           "norm_of": ["el_day", "el_night"]},
+            "sum_el_night": {"tiers": [{"upto": 80, "per_resident": true}, {"k": 1.3}],
+                             "norm_of": ["el_day", "el_night"]}
+        }
+    }
+
+Ступень: upto — верхняя граница расхода (у последней ступени её нет), per_resident — граница на одного
+жильца (× residents), k — множитель ставки строки (по умолчанию 1) или rate — своя ставка ступени.
+norm_of — ступени считаются по сумме расходов зон (день + ночь), зона платит за долю каждой ступени
+по своему расходу. Строки без правил — линейные, как money.calculate_kopecks().
+
+Правила разбираются и проверяются один раз (TariffRules.from_config), а для каждой версии тарифов
+компилируются в план (TariffPlan): замыкание на строку счёта для одного расчёта и колоночная функция
+для пачки. Границы и ставки уже целые, поэтому на вызов — только целочисленная арифметика; без правил
+план сразу вызывает calculate_kopecks() / calculate_batch_exact(). Планы кэшируются по версии тарифов;
+новые правила или тарифы (сохранение в окне «Тарифы») — новый TariffRules и пустой кэш.
+"""
+from array import array
+
+from calc import CONSUMPTION_FIELDS, SUM_FIELDS
+from money import (
+    SCALE, TERMS, _UNIT, _UNIT_HEATING, calculate_batch_exact, calculate_kopecks, round_div, term_kopecks,
+    to_scaled,
+)
+
+METERS = ("xvs", "gvs", "el_day", "el_night")
+# Колонка расхода -> счётчики, от которых она зависит
+SOURCES = {"xvs": ("xvs",), "gvs": ("gvs",), "sewage": ("xvs", "gvs"),
+           "el_day": ("el_day",), "el_night": ("el_night",)}
+_WATER = ("sum_sewage", "sum_xvs", "sum_heating", "sum_gvs")
+_ELECTRICITY = ("sum_el_day", "sum_el_night")
+_TERM_BY_NAME = {t[0]: t for t in TERMS}
+
+
+class PlanLine:
+    """
+    Скомпилированная строка счёта: key — ключ результата, sources — счётчики, от которых она зависит,
+    one(расходы) -> копейки, column(колонки расходов) -> array("q") копеек. Расходы — в 1/SCALE.
+    """
+
+    __slots__ = ("key", "sources", "one", "column")
+
+    def __init__(self, key, sources, one, column):
+        self.key = key
+        self.sources = sources
+        self.one = one
+        self.column = column
+
+
+def _linear_line(key, column, rate, heating):
+    unit = _UNIT_HEATING if heating else _UNIT
+    return PlanLine(
+        key, SOURCES[column],
+        lambda cons: round_div(cons[column] * rate, unit),
+        lambda cols: term_kopecks(cols[column], rate, heating),
+    )
+
+
+def _tiered_line(key, column, bounds, rates, unit, group):
+    """
+    Ступенчатая строка: bounds — верхние границы ступеней (последняя — None), rates — целые ставки ступеней.
+    group — колонки, по сумме которых считаются ступени (None — по своей колонке).
+    """
+    steps = []
+    lower = 0
+    for bound, rate in zip(bounds, rates):
+        steps.append((lower, bound, rate))
+        lower = bound
+    first = rates[0]
+
+    def charge(c, total):
+        # Сумма по ступеням для общего расхода total, доля зоны — c / total; одно округление на строку
+        if total <= 0:
+            return round_div(c * first, unit)
+        num = 0
+        for low, high, rate in steps:
+            if total <= low:
+                break
+            num += ((total if high is None or total < high else high) - low) * rate
+        if c == total:
+            return round_div(num, unit)
+        return round_div(c * num, total * unit)
+
+    if group is None:
+        return PlanLine(
+            key, SOURCES[column],
+            lambda cons: charge(cons[column], cons[column]),
+            lambda cols: array("q", [charge(c, c) for c in cols[column]]),
+        )
+    sources = tuple(dict.fromkeys(m for g in group for m in SOURCES[g]))
+    return PlanLine(
+        key, sources,
+        lambda cons: charge(cons[column], sum(cons[g] for g in group)),
+        lambda cols: array("q", [charge(c, sum(t)) for c, t in zip(cols[column], zip(*(cols[g] for g in group)))]),
+    )
+
+
+def _number(value, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"{where}: ожидалось неотрицательное число")
+    return value
+
+
+def _parse_line(key, spec):
+    """Проверка правила строки -> (ступени [(upto, per_resident, k, rate)], norm_of)."""
+    where = f"rules.lines.{key}"
+    if key not in _TERM_BY_NAME:
+        raise ValueError(f"{where}: нет такой строки счёта; допустимо: {', '.join(_TERM_BY_NAME)}")
+    if not isinstance(spec, dict):
+        raise ValueError(f"{where}: ожидался объект")
+    tiers = spec.get("tiers")
+    if not isinstance(tiers, list) or not tiers:
+        raise ValueError(f"{where}.tiers: ожидался непустой список ступеней")
+    parsed = []
+    last = -1.0
+    for i, tier in enumerate(tiers):
+        at = f"{where}.tiers[{i}]"
+        if not isinstance(tier, dict):
+            raise ValueError(f"{at}: ожидался объект")
+        upto = tier.get("upto")
+        if (upto is None) != (i == len(tiers) - 1):
+            raise ValueError(f"{at}: upto нужна у всех ступеней, кроме последней")
+        if upto is not None:
+            # Границы сравниваются без учёта жильцов: per_resident у ступеней одной строки одинаков
+            if _number(upto, f"{at}.upto") <= last:
+                raise ValueError(f"{at}.upto: границы ступеней должны возрастать")
+            last = upto
+        if "k" in tier and "rate" in tier:
+            raise ValueError(f"{at}: k или rate, не оба")
+        k = _number(tier.get("k", 1), f"{at}.k")
+        rate = _number(tier["rate"], f"{at}.rate") if "rate" in tier else None
+        parsed.append((upto, bool(tier.get("per_resident")), k, rate))
+    if len({per for upto, per, _, _ in parsed if upto is not None}) > 1:
+        raise ValueError(f"{where}: per_resident у границ одной строки должен быть одинаков")
+    norm_of = spec.get("norm_of")
+    if norm_of is not None:
+        column = _TERM_BY_NAME[key][1]
+        if (not isinstance(norm_of, list) or column not in norm_of
+                or any(g not in CONSUMPTION_FIELDS for g in norm_of)):
+            raise ValueError(f"{where}.norm_of: список колонок расхода ({', '.join(CONSUMPTION_FIELDS)}), "
+                             f"включая {column}")
+        norm_of = tuple(dict.fromkeys(norm_of))
+    return parsed, norm_of
+
+
+class TariffRules:
+    def __init__(self, lines=None, residents=1):
+        """lines — {ключ строки счёта: правило, как в config.json}; проверяются сразу (ValueError)."""
+        self.residents = _number(residents, "rules.residents")
+        if lines is not None and not isinstance(lines, dict):
+            raise ValueError("rules.lines: ожидался объект {строка счёта: правило}")
+        self.lines = {key: _parse_line(key, spec) for key, spec in (lines or {}).items()}
+        self._plans = {}  # id(тарифы) -> (тарифы, план)
+
+    @classmethod
+    def from_config(cls, config):
+        rules = config.get("rules")
+        if rules is None:
+            return cls()
+        if not isinstance(rules, dict):
+            raise ValueError("rules: ожидался объект")
+        return cls(rules.get("lines"), rules.get("residents", 1))
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __getstate__(self):
+        # В процессы-исполнители (bulk.py, statements.py) уходят разобранные правила без планов:
+        # замыкания строк не сериализуются, план строится в процессе
+        return dict(self.__dict__, _plans={})
+
+    def plan(self, tariffs):
+        """План расчёта для версии тарифов (из кэша, если эта версия уже встречалась)."""
+        cached = self._plans.get(id(tariffs))
+        if cached is None or cached[0] is not tariffs:
+            cached = (tariffs, TariffPlan(tariffs, self))
+            self._plans[id(tariffs)] = cached
+        return cached[1]
+
+
+class TariffPlan:
+    """Расчёт по тарифам одной версии и правилам; результаты те же по форме, что у money.*."""
+
+    def __init__(self, tariffs, rules=None):
+        self.tariffs = tariffs
+        self.linear = not rules
+        lines = []
+        for key, column, keys, heating in TERMS:
+            rates = [to_scaled(tariffs[k]) for k in keys]
+            rate = rates[0] * rates[1] if heating else rates[0]
+            if self.linear or key not in rules.lines:
+                lines.append(_linear_line(key, column, rate, heating))
+                continue
+            tiers, group = rules.lines[key]
+            factor = rates[0] if heating else 1  # у подогрева ставка ступени умножается на норматив Гкал/м³
+            bounds = [None if upto is None else to_scaled(upto * (rules.residents if per else 1))
+                      for upto, per, _, _ in tiers]
+            tier_rates = [factor * to_scaled(own) * SCALE if own is not None else rate * to_scaled(k)
+                          for _, _, k, own in tiers]
+            unit = (_UNIT_HEATING if heating else _UNIT) * SCALE
+            lines.append(_tiered_line(key, column, bounds, tier_rates, unit, group))
+        self.lines = tuple(lines)
+
+    def kopecks(self, **readings):
+        """Как money.calculate_kopecks(), но по правилам."""
+        if self.linear:
+            return calculate_kopecks(**readings, **self.tariffs)
+        cons = {m: to_scaled(readings[m + "_curr"]) - to_scaled(readings[m + "_prev"]) for m in METERS}
+        cons["sewage"] = cons["xvs"] + cons["gvs"]
+        result = {"consumption": {f: cons[f] for f in CONSUMPTION_FIELDS}}
+        for line in self.lines:
+            result[line.key] = line.one(cons)
+        _subtotals(result)
+        return result
+
+    def calculate(self, **readings):
+        """Как money.calculate_exact(): суммы в рублях (float с двумя знаками), посчитанные в копейках."""
+        k = self.kopecks(**readings)
+        result = {"consumption": {f: v / SCALE for f, v in k["consumption"].items()}}
+        for f in SUM_FIELDS:
+            result[f] = k[f] / 100
+        return result
+
+    def batch(self, **cols):
+        """Как money.calculate_batch_exact(): колонки показаний -> колонки копеек array("q")."""
+        if self.linear:
+            return calculate_batch_exact(**cols, **self.tariffs)
+        n = len(cols["xvs_prev"])
+        if any(len(cols[m + suffix]) != n for m in METERS for suffix in ("_prev", "_curr")):
+            raise ValueError("Колонки показаний должны быть одинаковой длины")
+        cons = {}
+        for m in METERS:
+            cons[m] = array("q", [to_scaled(c) - to_scaled(p) for p, c in zip(cols[m + "_prev"], cols[m + "_curr"])])
+        cons["sewage"] = array("q", map(int.__add__, cons["xvs"], cons["gvs"]))
+        result = {"consumption": {f: cons[f] for f in CONSUMPTION_FIELDS}}
+        for line in self.lines:
+            result[line.key] = line.column(cons)
+        result["sum_water"] = array("q", map(sum, zip(*(result[k] for k in _WATER))))
+        result["sum_electricity"] = array("q", map(sum, zip(*(result[k] for k in _ELECTRICITY))))
+        result["total"] = array("q", map(int.__add__, result["sum_water"], result["sum_electricity"]))
+        return result
+
+
+def _subtotals(sums):
+    sums["sum_water"] = sum(sums[k] for k in _WATER)
+    sums["sum_electricity"] = sum(sums[k] for k in _ELECTRICITY)
+    sums["total"] = sums["sum_water"] + sums["sum_electricity"]
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Тарифы по датам. В config.json плоские ключи (tariff_sewage и т. д.) — действующие тарифы,
+"tariffs_from" — с какой даты они действуют, "schedule" — прежние версии:
+
+    "schedule": [{"from": "2024-07-01", "tariff_sewage": 44.1, ...}, ...]
+
+Версия для даты ищется бисекцией по отсортированным датам начала: O(log k) на запрос.
+Даты раньше первой версии получают самую раннюю версию.
+
+После правки schedule пересчитать сохранённые периоды по тарифам, действовавшим в каждом из них:
+
+    python tariff_schedule.py            # какие итоги изменятся
+    python tariff_schedule.py --apply    # записать пересчитанные суммы в историю
+"""
+import bisect
+import sys
+from datetime import date
+
+from core import DEFAULT_TARIFFS, MONTHS_RU, tariffs_from_config
+
+_MONTHS = {name.lower(): i + 1 for i, name in enumerate(MONTHS_RU)}
+_EARLIEST = "0000-00-00"
+
+
+def period_start(period):
+    """«Октябрь 2025» -> "2025-10-01"; нераспознанный период -> None."""
+    parts = (period or "").split()
+    if len(parts) != 2 or parts[0].lower() not in _MONTHS or not parts[1].isdigit():
+        return None
+    return f"{int(parts[1]):04d}-{_MONTHS[parts[0].lower()]:02d}-01"
+
+
+def month_start(d=None):
+    d = d or date.today()
+    return f"{d.year:04d}-{d.month:02d}-01"
+
+
+class TariffSchedule:
+    def __init__(self, versions):
+        """versions — [(дата начала "YYYY-MM-DD", тарифы), ...] в любом порядке."""
+        versions = sorted(versions, key=lambda v: v[0])
+        if not versions:
+            versions = [(_EARLIEST, dict(DEFAULT_TARIFFS))]
+        self._dates = [v[0] for v in versions]
+        self._tariffs = [v[1] for v in versions]
+
+    @classmethod
+    def from_config(cls, config):
+        current = tariffs_from_config(config)
+        versions = [(config.get("tariffs_from") or _EARLIEST, current)]
+        for v in config.get("schedule") or ():
+            if isinstance(v, dict) and v.get("from"):
+                # Недостающие в старой версии ключи берём из текущих тарифов
+                versions.append((v["from"], {k: v.get(k, current[k]) for k in DEFAULT_TARIFFS}))
+        return cls(versions)
+
+    def at(self, day):
+        """Тарифы, действующие на дату "YYYY-MM-DD"."""
+        i = bisect.bisect_right(self._dates, day) - 1
+        return self._tariffs[max(i, 0)]
+
+    def for_period(self, period, fallback_date=None):
+        """Тарифы для периода «Октябрь 2025»; если период не распознан — на fallback_date или сегодня."""
+        return self.at(period_start(period) or fallback_date or date.today().isoformat())
+
+    def __len__(self):
+        return len(self._dates)
+
+
+def push_tariff_version(config, tariffs, effective_from=None):
+    """
+    Новая конфигурация, где tariffs — действующие с effective_from (по умолчанию — с начала месяца),
+    а прежние действующие тарифы уходят в schedule. Правка в том же месяце заменяет версию.
+    """
+    effective_from = effective_from or month_start()
+    old = tariffs_from_config(config)
+    old_from = config.get("tariffs_from") or _EARLIEST
+    schedule = [v for v in config.get("schedule") or () if isinstance(v, dict) and v.get("from")]
+    if old != tariffs and old_from < effective_from:
+        schedule = [v for v in schedule if v["from"] != old_from]
+        schedule.append(dict(old, **{"from": old_from}))
+    new_config = dict(config)
+    new_config.update(tariffs)
+    new_config["tariffs_from"] = effective_from if old != tariffs else old_from
+    if schedule:
+        new_config["schedule"] = sorted(schedule, key=lambda v: v["from"])
+    return new_config
+
+
+def chronological(records):
+    """Записи по дате периода (нераспознанные периоды — по date_saved)."""
+    return sorted(records, key=lambda r: (period_start(r.get("period")) or r.get("date_saved") or "",
+                                          r.get("date_saved") or ""))
+
+
+def recalculate_history(records, schedule, rules=None):
+    """
+    Пересчёт сохранённых периодов по тарифам, действовавшим в каждом периоде, — в копейках
+    и по правилам rules (tariff_rules.TariffRules), как при сохранении периода в окне.
+    Расход периода — разница с показаниями предыдущего периода, поэтому первая запись,
+    записи без показаний и запись сразу после них получают None. Возвращает [(запись, результат или None), ...]
+    в хронологическом порядке. Тарифы ищутся бисекцией и кэшируются по дате периода: O(n log k).
+    """
+    if rules is None:
+        # tariff_rules — только для пересчёта: окно импортирует этот модуль до первой отрисовки
+        from tariff_rules import TariffRules
+
+        rules = TariffRules()
+    keys = ("xvs", "gvs", "el_day", "el_night")
+    by_day = {}
+    out = []
+    prev = None
+    for r in chronological(records):
+        curr = [r.get(k + "_curr") for k in keys]
+        if None in curr:
+            # Без показаний расход следующего периода не известен: он охватил бы несколько месяцев
+            out.append((r, None))
+            prev = None
+            continue
+        result = None
+        if prev is not None:
+            day = period_start(r.get("period")) or r.get("date_saved") or date.today().isoformat()
+            tariffs = by_day.get(day)
+            if tariffs is None:
+                tariffs = by_day[day] = schedule.at(day)
+            inputs = {}
+            for k, p, c in zip(keys, prev, curr):
+                inputs[k + "_prev"] = p
+                inputs[k + "_curr"] = c
+            result = rules.plan(tariffs).calculate(**inputs)
+        out.append((r, result))
+        prev = curr
+    return out
+
+
+_SUMS = ("sum_water", "sum_electricity", "total")
+
+
+def main(argv=None):
+    import argparse
+
+    from core import load_config, load_history, save_history, take_errors
+    from tariff_rules import TariffRules
+
+    p = argparse.ArgumentParser(description="Пересчёт сохранённых периодов по тарифам, действовавшим в каждом из них.")
+    p.add_argument("--config", help="путь к config.json")
+    p.add_argument("--apply", action="store_true", help="записать пересчитанные суммы в историю")
+    args = p.parse_args(argv)
+
+    config = load_config(args.config)
+    try:
+        rules = TariffRules.from_config(config)
+    except ValueError as e:
+        print(f"Ошибка в правилах тарифов: {e}", file=sys.stderr)
+        return 2
+    records = load_history()
+    errors = take_errors()
+    if errors:
+        print("\n".join(errors), file=sys.stderr)
+        if args.apply:
+            # Перезапись журнала потеряла бы непрочитанные строки
+            print("История прочитана не полностью — не перезаписываю.", file=sys.stderr)
+            return 2
+    changed = {}
+    for r, result in recalculate_history(records, TariffSchedule.from_config(config), rules):
+        if result is not None and any(r.get(f) != result[f] for f in _SUMS):
+            changed[id(r)] = dict(r, **{f: result[f] for f in _SUMS})
+            print(f"{r.get('period') or r.get('date_saved')}: {r.get('total', 0):.2f} -> {result['total']:.2f} руб")
+    if not changed:
+        print("Все сохранённые суммы совпадают с тарифами своих периодов.")
+        return 0
+    if not args.apply:
+        print(f"Изменится периодов: {len(changed)}; записать — с --apply.")
+        return 0
+    if not save_history([changed.get(id(r), r) for r in records]):
+        print("Не удалось записать историю.", file=sys.stderr)
+        return 2
+    print(f"Пересчитано периодов: {len(changed)}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
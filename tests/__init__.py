@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Проверки расчёта: python -m unittest discover -s tests -t .  (или python -m pytest tests)
+"""
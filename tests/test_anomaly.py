@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+anomaly: первые warmup расходов только набирают статистику, флаг — строго выше порога, выброс сдвигает
+норму не больше чем на alpha * threshold отклонений, уменьшение показания и пропуск показания
+начинают отсчёт расхода заново, не сбрасывая накопленную норму.
+"""
+import unittest
+
+from anomaly import CURR_FIELDS, AnomalyDetector, MeterStats, describe, scan, scan_columns
+
+
+def feed(stats, readings, alpha=0.1, threshold=5.0, warmup=3):
+    return [stats.update(r, alpha, threshold, warmup) for r in readings]
+
+
+def steady(n=6, step=10.0):
+    """Счётчик с ровным расходом step: норма step, отклонение 0 (в оценке — нижняя граница)."""
+    stats = MeterStats()
+    feed(stats, [i * step for i in range(n)])
+    return stats
+
+
+class WarmupTest(unittest.TestCase):
+    def test_first_reading_has_no_consumption(self):
+        self.assertIsNone(MeterStats().update(100.0, 0.1, 5.0, 3))
+
+    def test_no_flags_during_warmup(self):
+        stats = MeterStats()
+        results = feed(stats, [0.0, 1.0, 101.0, 102.0])  # расходы 1, 100, 1 — без флагов
+        self.assertEqual([r[1] for r in results[1:]], [None, None, None])
+        self.assertEqual(stats.count, 3)
+        self.assertAlmostEqual(stats.level, 34.0)
+
+    def test_first_flag_right_after_warmup(self):
+        stats = MeterStats()
+        results = feed(stats, [0.0, 10.0, 20.0, 30.0, 130.0])
+        self.assertEqual(results[-1][:2], (100.0, "spike"))
+
+    def test_longer_warmup_delays_flags(self):
+        stats = MeterStats()
+        results = feed(stats, [0.0, 10.0, 20.0, 30.0, 130.0], warmup=4)
+        self.assertIsNone(results[-1][1])
+
+
+class ThresholdTest(unittest.TestCase):
+    def test_spread_floor_for_steady_consumption(self):
+        # Норма 10, отклонение 0: в оценке — max(0.1 * 10, 0.5) = 1
+        stats = steady()
+        _, flag, score = stats.update(stats.prev + 10.4, 0.1, 5.0, 3)
+        self.assertIsNone(flag)
+        self.assertAlmostEqual(score, 0.4)
+
+    def test_flag_strictly_above_threshold(self):
+        stats = steady()
+        self.assertIsNone(stats.update(stats.prev + 15.0, 0.1, 5.0, 3)[1])
+        stats = steady()
+        consumption, flag, score = stats.update(stats.prev + 15.5, 0.1, 5.0, 3)
+        self.assertEqual((consumption, flag), (15.5, "spike"))
+        self.assertAlmostEqual(score, 5.5)
+
+    def test_dip(self):
+        stats = steady(step=100.0)  # отклонение в оценке — 10
+        consumption, flag, score = stats.update(stats.prev + 40.0, 0.1, 5.0, 3)
+        self.assertEqual(flag, "dip")
+        self.assertAlmostEqual(score, -6.0)
+
+    def test_lower_threshold_flags_more(self):
+        stats = steady()
+        self.assertEqual(stats.update(stats.prev + 13.0, 0.1, 2.0, 3)[1], "spike")
+
+    def test_outlier_moves_level_at_most_alpha_threshold_spreads(self):
+        stats = steady()
+        stats.update(stats.prev + 10_000.0, 0.1, 5.0, 3)
+        self.assertAlmostEqual(stats.level, 10.0 + 0.1 * 5.0 * 1.0)
+        # Следующий обычный период не флагуется: норма не уехала за выбросом
+        self.assertIsNone(stats.update(stats.prev + 10.0, 0.1, 5.0, 3)[1])
+
+
+class ResetTest(unittest.TestCase):
+    def test_negative_flagged_and_not_learned(self):
+        stats = steady()
+        level, spread, count = stats.level, stats.spread, stats.count
+        self.assertEqual(stats.update(5.0, 0.1, 5.0, 3), (5.0 - 50.0, "negative", 0.0))
+        self.assertEqual((stats.level, stats.spread, stats.count), (level, spread, count))
+        # Новое показание — новая точка отсчёта (замена счётчика)
+        self.assertEqual(stats.update(15.0, 0.1, 5.0, 3)[:2], (10.0, None))
+
+    def test_missing_reading_restarts_consumption(self):
+        detector = AnomalyDetector()
+        for i in range(6):
+            detector.update_values([i * 10.0, i * 2.0, i * 100.0, i * 50.0])
+        count = detector.meters["xvs"].count
+        # Период без показания ХВС: расход за два месяца не считается выбросом
+        self.assertEqual(detector.update_values([None, 12.0, 600.0, 300.0]), [])
+        self.assertEqual(detector.update_values([500.0, 14.0, 700.0, 350.0]), [])
+        self.assertEqual(detector.meters["xvs"].count, count)
+        # Норма сохранилась — прогрев заново не нужен
+        flags = detector.update_values([700.0, 16.0, 800.0, 400.0])
+        self.assertEqual([(m, kind) for m, _, kind, _ in flags], [("xvs", "spike")])
+
+    def test_non_numeric_reading_treated_as_missing(self):
+        detector = AnomalyDetector()
+        detector.update_values([1.0, 1.0, 1.0, 1.0])
+        detector.update_values([True, "2", 2.0, 2.0])
+        self.assertIsNone(detector.meters["xvs"].prev)
+        self.assertIsNone(detector.meters["gvs"].prev)
+        self.assertEqual(detector.meters["el_day"].prev, 2.0)
+
+
+class ScanTest(unittest.TestCase):
+    def records(self):
+        out = []
+        for i in range(12):
+            xvs = i * 10.0 + (90.0 if i >= 8 else 0.0)  # утечка в 8-м периоде
+            el_day = 1000.0 - 1.0 if i == 5 else i * 100.0  # опечатка в 5-м
+            out.append({"period": f"P{i}", "xvs_curr": xvs, "gvs_curr": i * 2.0,
+                        "el_day_curr": el_day, "el_night_curr": i * 50.0})
+        return out
+
+    def test_scan_and_columns_agree(self):
+        records = self.records()
+        found = [(i, flags) for i, _, flags in scan(records)]
+        columns = [[r[f] for r in records] for f in CURR_FIELDS]
+        self.assertEqual(list(scan_columns(columns)), found)
+        self.assertEqual([(i, [f[0] + ":" + f[2] for f in flags]) for i, flags in found],
+                         [(5, ["el_day:spike"]), (6, ["el_day:negative"]), (8, ["xvs:spike"])])
+
+    def test_describe(self):
+        flags = [("gvs", 9.0, "spike", 5.24), ("el_day", -3.0, "negative", 0.0), ("xvs", 1.0, "dip", -6.0)]
+        self.assertEqual(describe(flags), "⚠ ГВС ↑5.2σ, свет день < 0, ХВС ↓6.0σ")
+        self.assertEqual(describe([]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""calc.calculate_batch() поэлементно совпадает с calc.calculate() — на списках и на numpy-массивах."""
+import random
+import unittest
+from array import array
+
+from calc import CONSUMPTION_FIELDS, SUM_FIELDS, calculate, calculate_batch
+
+READINGS = ("xvs_prev", "xvs_curr", "gvs_prev", "gvs_curr",
+            "el_day_prev", "el_day_curr", "el_night_prev", "el_night_curr")
+TARIFFS = {
+    "tariff_sewage": 46.73, "tariff_xvs": 43.24, "tariff_gvs": 43.24, "tariff_heating_per_gcal": 2891.74,
+    "norm_gcal_per_m3": 0.06, "tariff_el_day": 6.79, "tariff_el_night": 2.81,
+}
+
+
+def random_rows(n, seed):
+    """Показания с двумя знаками, как в окне."""
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        row = {}
+        for meter in ("xvs", "gvs", "el_day", "el_night"):
+            prev = round(rnd.uniform(0, 5000), 2)
+            row[meter + "_prev"] = prev
+            row[meter + "_curr"] = round(prev + rnd.uniform(0, 300), 2)
+        rows.append(row)
+    return rows
+
+
+def boundary_rows():
+    """
+    Суммы ровно на половине копейки: расход кратен 0.005, тариф 1 или 0.01 (x.xx5 руб),
+    и показания с тремя знаками при обычных тарифах — round(x, 2) там решает каждый бит.
+    """
+    rows = []
+    for i in range(1, 400):
+        c = i * 0.005
+        for prev in (0.0, 0.005, 12.345, 1487.595):
+            rows.append({"xvs_prev": prev, "xvs_curr": prev + c, "gvs_prev": prev, "gvs_curr": prev + c,
+                         "el_day_prev": prev, "el_day_curr": prev + c, "el_night_prev": 0.0, "el_night_curr": c})
+    return rows
+
+
+BOUNDARY_TARIFFS = (
+    TARIFFS,
+    dict(TARIFFS, tariff_sewage=1.0, tariff_xvs=0.01, tariff_gvs=0.1, tariff_el_day=1.0, tariff_el_night=0.01,
+         tariff_heating_per_gcal=1.0, norm_gcal_per_m3=0.5),
+)
+
+
+def columns(rows):
+    return {k: [row[k] for row in rows] for k in READINGS}
+
+
+class BatchParityMixin:
+    """Общие проверки; to_column переводит список в тип колонки (list, array, numpy)."""
+
+    def to_column(self, values):
+        raise NotImplementedError
+
+    def assert_parity(self, rows, tariffs):
+        cols = {k: self.to_column(v) for k, v in columns(rows).items()}
+        batch = calculate_batch(**cols, **tariffs)
+        for i, row in enumerate(rows):
+            expected = calculate(**row, **tariffs)
+            for f in CONSUMPTION_FIELDS:
+                self.assertEqual(float(batch["consumption"][f][i]), expected["consumption"][f], (i, f, row))
+            for f in SUM_FIELDS:
+                self.assertEqual(float(batch[f][i]), expected[f], (i, f, row))
+
+    def test_random_rows(self):
+        self.assert_parity(random_rows(5000, seed=1), TARIFFS)
+
+    def test_half_kopeck_boundaries(self):
+        rows = boundary_rows()
+        for tariffs in BOUNDARY_TARIFFS:
+            with self.subTest(tariffs=tariffs):
+                self.assert_parity(rows, tariffs)
+
+    def test_negative_consumption(self):
+        rows = [{k: (v if k.endswith("_prev") else v - 7.125) for k, v in row.items()}
+                for row in random_rows(500, seed=2)]
+        self.assert_parity(rows, TARIFFS)
+
+    def test_empty(self):
+        batch = calculate_batch(**{k: self.to_column([]) for k in READINGS})
+        self.assertEqual(len(batch["total"]), 0)
+
+    def test_length_mismatch(self):
+        cols = {k: self.to_column([1.0, 2.0]) for k in READINGS}
+        cols["gvs_curr"] = self.to_column([1.0])
+        with self.assertRaises(ValueError):
+            calculate_batch(**cols)
+
+
+class PythonBatchTest(BatchParityMixin, unittest.TestCase):
+    def to_column(self, values):
+        return values
+
+    def test_array_input(self):
+        rows = random_rows(100, seed=3)
+        as_lists = calculate_batch(**columns(rows))
+        as_arrays = calculate_batch(**{k: array("d", v) for k, v in columns(rows).items()})
+        self.assertEqual(as_lists, as_arrays)
+
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "numpy не установлен")
+class NumpyBatchTest(BatchParityMixin, unittest.TestCase):
+    def to_column(self, values):
+        return numpy.asarray(values, dtype=numpy.float64)
+
+    def test_returns_numpy(self):
+        batch = calculate_batch(**{k: self.to_column(v) for k, v in columns(random_rows(10, seed=4)).items()})
+        self.assertIsInstance(batch["total"], numpy.ndarray)
+        self.assertIsInstance(batch["consumption"]["xvs"], numpy.ndarray)
+
+
+if __name__ == "__main__":
+    unittest.main()
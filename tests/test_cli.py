@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+cli и bulk: по умолчанию расчёт в копейках, как в окне программы (итог совпадает с планом без правил
+и на показаниях, где float расходится на копейку); --float — прежний расчёт в float.
+"""
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import bulk
+import cli
+from calc import calculate
+from core import DEFAULT_TARIFFS, READING_KEYS
+from money import calculate_exact
+from tariff_rules import TariffRules
+
+TARIFFS = dict(DEFAULT_TARIFFS)
+# float даёт 11861.95, копейки (и окно) — 11861.96
+ROW = {"xvs_prev": 187.72, "xvs_curr": 190.55, "gvs_prev": 1671.53, "gvs_curr": 1714.81,
+       "el_day_prev": 1524.56, "el_day_curr": 1524.77, "el_night_prev": 890.77, "el_night_curr": 962.92}
+
+
+class CliTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.config = os.path.join(tmp.name, "config.json")
+        with open(self.config, "w", encoding="utf-8") as f:
+            json.dump(TARIFFS, f)
+
+    def run_cli(self, *flags):
+        out = io.StringIO()
+        argv = ["--config", self.config, *flags] + [str(ROW[k]) for k in READING_KEYS]
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(cli.main(argv), 0)
+        return json.loads(out.getvalue())
+
+
+class DefaultKopecksTest(CliTestCase):
+    def test_compute_matches_window(self):
+        window = TariffRules().plan(TARIFFS).calculate(**ROW)
+        self.assertEqual(cli.compute(ROW, TARIFFS), window)
+        self.assertEqual(cli.compute(ROW, TARIFFS)["total"], 11861.96)
+        self.assertNotEqual(round(calculate(**ROW, **TARIFFS)["total"], 2), window["total"])
+
+    def test_main_default_and_exact_are_kopecks(self):
+        expected = json.loads(json.dumps(calculate_exact(**ROW, **TARIFFS)))
+        self.assertEqual(self.run_cli(), expected)
+        self.assertEqual(self.run_cli("--exact"), expected)
+
+    def test_float_flag(self):
+        self.assertEqual(self.run_cli("--float"), json.loads(json.dumps(calculate(**ROW, **TARIFFS))))
+        self.assertEqual(cli.compute(ROW, TARIFFS, exact=False), calculate(**ROW, **TARIFFS))
+
+    def test_fast_path_is_kopecks(self):
+        # 8 чисел без флагов разбираются без argparse
+        self.assertTrue(cli._parse_args([str(ROW[k]) for k in READING_KEYS]).exact)
+
+
+class BulkTest(CliTestCase):
+    def csv_text(self):
+        return ",".join(("apartment",) + READING_KEYS) + "\n1," + ",".join(str(ROW[k]) for k in READING_KEYS) + "\n"
+
+    def total(self, text):
+        header, row = text.splitlines()[:2]
+        return dict(zip(header.split(","), row.split(",")))["total"]
+
+    def test_bill_chunk_default_is_kopecks(self):
+        src = io.StringIO(self.csv_text())
+        columns, chunks = bulk.read_chunks(src, 10)
+        lines = next(chunks)
+        self.assertEqual(bulk.bill_chunk(lines, columns, TARIFFS)[0].split(",")[-2], "11861.96")
+        self.assertEqual(bulk.bill_chunk(lines, columns, TARIFFS, exact=False)[0].split(",")[-2], "11861.95")
+
+    def test_main_float_flag(self):
+        src = os.path.join(os.path.dirname(self.config), "readings.csv")
+        with open(src, "w", encoding="utf-8") as f:
+            f.write(self.csv_text())
+        for flags, total in (([], "11861.96"), (["--exact"], "11861.96"), (["--float"], "11861.95")):
+            dst = os.path.join(os.path.dirname(self.config), "bills.csv")
+            with contextlib.redirect_stderr(io.StringIO()):
+                code = bulk.main([src, "-o", dst, "--workers", "1", "--config", self.config, *flags])
+            self.assertEqual(code, 0)
+            with open(dst, "r", encoding="utf-8") as f:
+                self.assertEqual(self.total(f.read()), total, flags)
+
+
+if __name__ == "__main__":
+    unittest.main()
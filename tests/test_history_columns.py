@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+history_columns: порядок по дате (DateOrder) после случайных добавлений, замен и удалений совпадает
+с полной сортировкой, доступ по позиции и с конца — тоже; маленький LOAD заставляет блоки делиться и исчезать.
+Суммы (всего, по годам) совпадают с пересчётом по живым записям.
+"""
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from history_columns import DateOrder, HistoryColumns
+
+
+def random_record(rng):
+    year = rng.choice((2023, 2024, 2025))
+    return {"period": f"Май {year}", "date_saved": f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "sum_water": rng.randint(0, 5000) / 100, "sum_electricity": rng.randint(0, 5000) / 100,
+            "total": rng.randint(0, 10000) / 100}
+
+
+class DateOrderTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(DateOrder, "LOAD", 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_random_operations_match_sorted(self):
+        rng = random.Random(5)
+        table = HistoryColumns()
+        for step in range(3000):
+            live = table.live_rows()
+            op = rng.random()
+            if op < 0.6 or not live:
+                table.append(random_record(rng))
+            elif op < 0.8:
+                table.replace(rng.choice(live), random_record(rng))
+            else:
+                table.delete(rng.choice(live))
+            if step % 250 == 0 or step == 2999:
+                self.check(table)
+
+    def test_delete_everything_then_append(self):
+        table = HistoryColumns(random_record(random.Random(1)) for _ in range(50))
+        for row in table.live_rows():
+            table.delete(row)
+        self.assertEqual(len(table), 0)
+        self.assertEqual(list(table._order), [])
+        table.append(random_record(random.Random(2)))
+        self.check(table)
+
+    def test_remove_missing_key(self):
+        order = DateOrder()
+        self.assertFalse(order.remove(5))
+        order.insert(7)
+        self.assertFalse(order.remove(5))
+        self.assertFalse(order.remove(9))
+        self.assertTrue(order.remove(7))
+
+    def check(self, table):
+        live = table.live_rows()
+        dates = [table.values("date_saved", [r])[0] for r in live]
+        expected = [r for _, r in sorted(zip(dates, live))]
+        order = table._order
+        self.assertEqual(list(order), expected)
+        self.assertEqual(list(reversed(order)), expected[::-1])
+        self.assertEqual([order[i] for i in range(len(order))], expected)
+        if expected:
+            self.assertEqual(order[-1], expected[-1])
+        with self.assertRaises(IndexError):
+            order[len(expected)]
+        records = [table.record(r) for r in expected]
+        self.assertEqual(table.records(), records)
+        self.assertEqual(list(table.rows()), records)
+        self.assertAlmostEqual(table.total, sum(r["total"] for r in records))
+        self.assertAlmostEqual(table.last_total(3), sum(r["total"] for r in records[-3:]))
+        by_year = {}
+        for r in records:
+            by_year[r["period"][-4:]] = by_year.get(r["period"][-4:], 0) + 1
+        self.assertEqual({y: v["count"] for y, v in table.by_year().items()}, by_year)
+
+
+class SaveOpenTest(unittest.TestCase):
+    def test_opened_table_keeps_order(self):
+        rng = random.Random(9)
+        table = HistoryColumns(random_record(rng) for _ in range(200))
+        for row in table.live_rows()[::3]:
+            table.delete(row)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "history.col")
+            table.save(path)
+            opened = HistoryColumns.open(path)
+            try:
+                self.assertEqual(opened.records(), table.records())
+                self.assertEqual(opened.last_total(5), table.last_total(5))
+                self.assertEqual(opened.last(), table.last())
+            finally:
+                opened.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
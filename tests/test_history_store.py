@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+history_store: журнал history.jsonl во временной папке — повтор операций put/del/upsert при чтении,
+перенос старого history.json, недописанная последняя строка, сжатие журнала и сообщение take_errors(); кэш в памяти — перечитывание только после изменения файла
+на диске (mtime или размер), счётчики попаданий и промахов.
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import core
+from history_store import HistoryStore
+
+
+def record(i, period=None):
+    return {"period": period or f"Период {i}", "date_saved": f"2025-01-{i % 28 + 1:02d}",
+            "sum_water": 100.0 + i, "sum_electricity": 50.0, "total": 150.0 + i}
+
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.path = os.path.join(self.dir, "history.jsonl")
+        self.legacy = os.path.join(self.dir, "history.json")
+
+    def store(self):
+        return HistoryStore(self.path, self.legacy)
+
+    def journal(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+
+class JournalReplayTest(StoreTestCase):
+    def test_operations_replay_in_new_store(self):
+        store = self.store()
+        store.append(record(1))
+        store.extend([record(2), record(3), record(4)])
+        self.assertEqual(store.delete(("Период 2", record(2)["date_saved"])), 1)
+        store.upsert(dict(record(3), total=999.0))
+        expected = [record(1), record(4), dict(record(3), total=999.0)]
+        self.assertEqual(store.records(), expected)
+        self.assertEqual(self.store().records(), expected)
+
+    def test_append_and_delete_only_add_lines(self):
+        store = self.store()
+        store.extend([record(1), record(2)])
+        before = self.journal()
+        store.delete(("Период 1", record(1)["date_saved"]))
+        self.assertEqual(self.journal()[:2], before)
+        self.assertEqual(self.journal()[2], {"op": "del", "id": 1})
+
+    def test_delete_removes_every_record_with_key(self):
+        store = self.store()
+        store.extend([record(1, "Май 2025"), record(1, "Май 2025"), record(2)])
+        self.assertEqual(store.delete(("Май 2025", record(1)["date_saved"])), 2)
+        self.assertEqual(store.delete(("Май 2025", record(1)["date_saved"])), 0)
+        self.assertEqual(self.store().records(), [record(2)])
+
+    def test_repeated_put_replaces(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"op": "put", "id": 1, "rec": record(1)}) + "\n")
+            f.write(json.dumps({"op": "put", "id": 1, "rec": record(7)}) + "\n")
+        store = self.store()
+        self.assertEqual(store.records(), [record(7)])
+        self.assertEqual(store.append(record(2)), 2)
+
+
+class LegacyMigrationTest(StoreTestCase):
+    def test_history_json_moves_to_journal(self):
+        records = [record(1), record(2)]
+        with open(self.legacy, "w", encoding="utf-8") as f:
+            json.dump(records + ["не запись"], f)
+        self.assertEqual(self.store().records(), records)
+        self.assertFalse(os.path.exists(self.legacy))
+        self.assertTrue(os.path.isfile(self.legacy + ".bak"))
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+        self.assertEqual(self.store().records(), records)
+
+    def test_truncated_history_json_is_an_error(self):
+        with open(self.legacy, "w", encoding="utf-8") as f:
+            f.write(json.dumps([record(1), record(2)])[:-20])
+        with self.assertRaises(ValueError):
+            self.store().records()
+        # Старый файл не тронут, пустой журнал не создан
+        self.assertTrue(os.path.isfile(self.legacy))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_existing_journal_wins(self):
+        self.store().append(record(1))
+        with open(self.legacy, "w", encoding="utf-8") as f:
+            json.dump([record(9)], f)
+        self.assertEqual(self.store().records(), [record(1)])
+        self.assertTrue(os.path.isfile(self.legacy))
+
+
+class TruncatedLineTest(StoreTestCase):
+    def write_truncated(self):
+        store = self.store()
+        store.extend([record(1), record(2)])
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"op":"put","id":3,"rec":{"period":"Пери')
+
+    def test_last_line_skipped_and_counted(self):
+        self.write_truncated()
+        store = self.store()
+        self.assertEqual(store.records(), [record(1), record(2)])
+        self.assertEqual(store.skipped, 1)
+
+    def test_next_append_starts_on_new_line(self):
+        self.write_truncated()
+        store = self.store()
+        store.append(record(3))
+        reread = self.store()
+        self.assertEqual(reread.records(), [record(1), record(2), record(3)])
+        self.assertEqual(reread.skipped, 1)
+
+    def test_take_errors_reports_skipped_lines(self):
+        self.write_truncated()
+        store = self.store()
+        store.records()
+        with mock.patch.object(core, "_history", store), mock.patch.object(core, "_errors", []):
+            errors = core.take_errors()
+            self.assertEqual(len(errors), 1)
+            self.assertIn("пропущено повреждённых строк: 1", errors[0])
+            # Список очищается, но пока строка в файле — сообщение повторяется при следующем запросе
+            self.assertEqual(core.take_errors(), errors)
+
+    def test_clean_journal_reports_nothing(self):
+        store = self.store()
+        store.append(record(1))
+        with mock.patch.object(core, "_history", store), mock.patch.object(core, "_errors", []):
+            self.assertEqual(core.take_errors(), [])
+
+
+class CompactionTest(StoreTestCase):
+    def test_deletes_trigger_compaction(self):
+        store = self.store()
+        store.COMPACT_MIN_DEAD = 4
+        store.extend([record(i) for i in range(1, 11)])
+        for i in range(1, 7):
+            store.delete((f"Период {i}", record(i)["date_saved"]))
+        # После 4-го удаления мёртвых строк 8 при 6 живых — журнал переписан, два удаления дописаны после
+        self.assertEqual([(op["op"], op["id"]) for op in self.journal()],
+                         [("put", i) for i in range(5, 11)] + [("del", 5), ("del", 6)])
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+        expected = [record(i) for i in range(7, 11)]
+        self.assertEqual(store.records(), expected)
+        reread = self.store()
+        self.assertEqual(reread.records(), expected)
+        # id не переиспользуются после сжатия
+        self.assertEqual(reread.append(record(11)), 11)
+
+    def test_few_deletes_do_not_compact(self):
+        store = self.store()
+        store.extend([record(i) for i in range(1, 5)])
+        store.delete(("Период 1", record(1)["date_saved"]))
+        self.assertEqual(len(self.journal()), 5)
+
+    def test_compact_keeps_live_records(self):
+        store = self.store()
+        store.extend([record(1), record(2), record(3)])
+        store.upsert(dict(record(2), total=1.0))
+        store.compact()
+        self.assertEqual(len(self.journal()), 3)
+        self.assertEqual(self.store().records(), store.records())
+
+
+class StatCacheTest(StoreTestCase):
+    def test_unchanged_file_served_from_memory(self):
+        self.store().extend([record(1), record(2)])
+        store = self.store()
+        first = store.records()
+        with mock.patch.object(store, "load", side_effect=AssertionError("перечитан неизменённый файл")):
+            self.assertEqual(store.records(), first)
+            store.aggregates()
+        self.assertEqual(store.cache_stats(), {"hits": 2, "misses": 1, "records": 2})
+
+    def test_own_writes_do_not_force_reload(self):
+        store = self.store()
+        store.records()
+        store.append(record(1))
+        store.delete(("Период 1", record(1)["date_saved"]))
+        store.upsert(record(2))
+        self.assertEqual(store.records(), [record(2)])
+        self.assertEqual(store.misses, 1)
+
+    def test_external_append_forces_reload(self):
+        store = self.store()
+        store.append(record(1))
+        store.records()
+        self.store().append(record(2))  # другая программа (importer.py, второе окно)
+        self.assertEqual(store.records(), [record(1), record(2)])
+        self.assertEqual(store.misses, 2)
+
+    def test_same_size_rewrite_with_new_mtime_forces_reload(self):
+        store = self.store()
+        store.append(record(1))
+        store.records()
+        st = os.stat(self.path)
+        with open(self.path, "r", encoding="utf-8") as f:
+            text = f.read()
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(text.replace("Период 1", "Период 7"))
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(os.path.getsize(self.path), st.st_size)
+        self.assertEqual(store.records()[0]["period"], "Период 7")
+        self.assertEqual(store.misses, 2)
+
+    def test_deleted_file_forces_reload(self):
+        store = self.store()
+        store.append(record(1))
+        store.records()
+        os.remove(self.path)
+        self.assertEqual(store.records(), [])
+        self.assertEqual(store.misses, 2)
+
+
+class DeferredFlushTest(StoreTestCase):
+    def test_changes_visible_before_flush(self):
+        store = self.store()
+        store.append(record(1))
+        store.defer = True
+        store.append(record(2))
+        self.assertTrue(store.pending())
+        self.assertEqual(store.records(), [record(1), record(2)])
+        self.assertEqual(self.store().records(), [record(1)])
+        store.flush()
+        self.assertFalse(store.pending())
+        self.assertEqual(self.store().records(), [record(1), record(2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+importer: отклонённые строки (в том числе «nan» и «inf» в показаниях) получают номер строки файла и причину
+и не прерывают импорт — ни на границе пачек, ни в режиме --dry-run.
+"""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import importer
+from core import DEFAULT_TARIFFS, NOT_FINITE_MESSAGE
+from tariff_rules import TariffRules
+from tariff_schedule import TariffSchedule
+
+HEADER = "period,xvs_prev,xvs_curr,gvs_prev,gvs_curr,el_day_prev,el_day_curr,el_night_prev,el_night_curr\n"
+ROWS = [
+    "Январь 2025,10,11,5,6,100,110,50,55\n",
+    "Февраль 2025,11,nan,6,7,110,120,55,60\n",
+    "Март 2025,11,12,6,inf,110,120,55,60\n",
+    "Апрель 2025,12,13,7,8,-inf,130,60,65\n",
+    "Май 2025,13,14,8,9,130,140,65,x\n",
+    "Июнь 2025,14,15,9,10,140,150,70,75\n",
+]
+SCHEDULE = TariffSchedule([("2000-01-01", dict(DEFAULT_TARIFFS))])
+
+
+def run(chunk_size):
+    chunks = importer.import_readings(io.StringIO(HEADER + "".join(ROWS)), SCHEDULE, chunk_size=chunk_size,
+                                      dry_run=True, today="2025-07-01")
+    records, rejected = [], []
+    for chunk in chunks:
+        records += chunk.records
+        rejected += chunk.rejected
+    return records, rejected
+
+
+class NotFiniteRowsTest(unittest.TestCase):
+    def test_rejected_per_row_with_reason(self):
+        for chunk_size in (1, 2, 100):
+            records, rejected = run(chunk_size)
+            self.assertEqual([r["period"] for r in records], ["Январь 2025", "Июнь 2025"], chunk_size)
+            self.assertEqual(rejected, [
+                (3, "Февраль 2025", NOT_FINITE_MESSAGE),
+                (4, "Март 2025", NOT_FINITE_MESSAGE),
+                (5, "Апрель 2025", NOT_FINITE_MESSAGE),
+                (6, "Май 2025", "Не число: el_night_curr"),
+            ], chunk_size)
+
+    def test_records_match_plan(self):
+        records, _ = run(100)
+        plan = TariffRules().plan(DEFAULT_TARIFFS)
+        expected = plan.calculate(xvs_prev=14, xvs_curr=15, gvs_prev=9, gvs_curr=10,
+                                  el_day_prev=140, el_day_curr=150, el_night_prev=70, el_night_curr=75)
+        self.assertEqual(records[1]["total"], expected["total"])
+
+    def test_dry_run_reports_rejects_and_exits_1(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "export.csv")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(HEADER + "".join(ROWS))
+            err = io.StringIO()
+            with contextlib.redirect_stderr(err):
+                code = importer.main([path, "--dry-run", "--config", os.path.join(tmp, "config.json")])
+        self.assertEqual(code, 1)
+        self.assertIn("Проверено: 2, отклонено: 4", err.getvalue())
+        self.assertIn(f"Строка 3 (Февраль 2025): {NOT_FINITE_MESSAGE}", err.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+live: серия нажатий даёт один расчёт, правка счётчика пересчитывает только его строки,
+некорректный ввод сбрасывает прошлый результат, задержка на нажатие — в бюджете кадра.
+Таймер — поддельный (виртуальные миллисекунды), окно Tk не нужно.
+"""
+import time
+import unittest
+
+from calc import SUM_FIELDS
+from live import LIVE_FRAME_BUDGET_MS, LiveCalc, LiveSession, show_lines
+from tariff_rules import TariffPlan, TariffRules
+
+TARIFFS = {
+    "tariff_sewage": 46.73, "tariff_xvs": 43.24, "tariff_gvs": 43.24, "tariff_heating_per_gcal": 2891.74,
+    "norm_gcal_per_m3": 0.06, "tariff_el_day": 6.79, "tariff_el_night": 2.81,
+}
+INPUTS = {
+    "xvs_prev": 55.58, "xvs_curr": 57.74, "gvs_prev": 49.54, "gvs_curr": 51.53,
+    "el_day_prev": 1487.59, "el_day_curr": 1531.81, "el_night_prev": 648.86, "el_night_curr": 662.75,
+}
+ZONE_RULES = {
+    "sum_el_day": {"tiers": [{"upto": 80, "per_resident": True}, {"k": 1.3}], "norm_of": ["el_day", "el_night"]},
+    "sum_el_night": {"tiers": [{"upto": 80, "per_resident": True}, {"k": 1.3}], "norm_of": ["el_day", "el_night"]},
+}
+
+
+class FakeScheduler:
+    """after/after_cancel как у tk.Tk, время идёт только в advance()."""
+
+    def __init__(self):
+        self.now = 0
+        self.jobs = {}
+        self._next = 0
+
+    def after(self, ms, fn):
+        self._next += 1
+        job = f"after#{self._next}"
+        self.jobs[job] = (self.now + ms, fn)
+        return job
+
+    def after_cancel(self, job):
+        del self.jobs[job]
+
+    def advance(self, ms):
+        self.now += ms
+        for job, (due, fn) in sorted(self.jobs.items(), key=lambda item: item[1][0]):
+            if due <= self.now and job in self.jobs:
+                del self.jobs[job]
+                fn()
+
+
+class FakeText:
+    """Поле результата: строки и число правок, с тем же разбором индексов «строка.столбец», что у tk.Text."""
+
+    def __init__(self):
+        self.lines = [""]
+        self.edits = 0
+
+    def config(self, state):
+        self.state = state
+
+    def delete(self, start, end):
+        self.edits += 1
+        if start == "1.0" and end == "end":
+            self.lines = [""]
+        else:
+            self.lines[int(start.split(".")[0]) - 1] = ""
+
+    def insert(self, index, text):
+        if index == "end":
+            self.lines = text.split("\n")
+        else:
+            self.lines[int(index.split(".")[0]) - 1] = text
+
+
+class Window:
+    """Поля ввода и поле результата; show() — как App._show_live_result."""
+
+    def __init__(self, plan, delay_ms=150):
+        self.fields = dict(INPUTS)
+        self.plan = plan
+        self.scheduler = FakeScheduler()
+        self.text = FakeText()
+        self.shown = None
+        self.results = []
+        self.session = LiveSession(self.scheduler, self.read, self.show, delay_ms)
+
+    def read(self):
+        if any(v is None for v in self.fields.values()):
+            return None, self.plan
+        return dict(self.fields), self.plan
+
+    def show(self, result, lines):
+        show_lines(self.text, self.shown, lines)
+        self.shown = lines
+        self.results.append(result)
+
+    def type(self, key, value):
+        self.fields[key] = value
+        self.session.schedule()
+
+
+class DebounceTest(unittest.TestCase):
+    def test_burst_of_keystrokes_runs_once_after_delay(self):
+        w = Window(TariffPlan(TARIFFS))
+        for value in (5, 57, 57.7, 57.74, 57.75):
+            w.type("xvs_curr", value)
+            w.scheduler.advance(100)  # быстрее задержки: прошлый расчёт отменяется
+        self.assertEqual(w.session.runs, 0)
+        self.assertEqual(len(w.scheduler.jobs), 1)
+        w.scheduler.advance(49)
+        self.assertEqual(w.session.runs, 0)
+        w.scheduler.advance(1)
+        self.assertEqual(w.session.runs, 1)
+        self.assertEqual(w.results[-1]["inputs"]["xvs_curr"], 57.75)
+        self.assertIsNone(w.session.job)
+        w.scheduler.advance(1000)
+        self.assertEqual(w.session.runs, 1)
+
+    def test_cancel_drops_pending_run(self):
+        w = Window(TariffPlan(TARIFFS))
+        w.type("xvs_curr", 58)
+        w.session.cancel()
+        w.scheduler.advance(1000)
+        self.assertEqual(w.session.runs, 0)
+        self.assertFalse(w.scheduler.jobs)
+
+
+class IncrementalTest(unittest.TestCase):
+    def assert_matches_plan(self, result, plan, inputs):
+        expected = plan.calculate(**inputs)
+        for f in SUM_FIELDS:
+            self.assertEqual(result[f], expected[f], f)
+        self.assertEqual(result["consumption"], expected["consumption"])
+
+    def test_meter_edit_recomputes_only_its_lines(self):
+        plan = TariffPlan(TARIFFS)
+        calc = LiveCalc(plan)
+        inputs = dict(INPUTS)
+        calc.update(inputs)
+        self.assertEqual(calc.recomputed, len(plan.lines))
+        cases = (
+            ("xvs_curr", 60.0, {"sum_sewage", "sum_xvs"}),
+            ("gvs_curr", 52.0, {"sum_sewage", "sum_heating", "sum_gvs"}),
+            ("el_day_curr", 1540.0, {"sum_el_day"}),
+            ("el_night_prev", 640.0, {"sum_el_night"}),
+        )
+        for key, value, lines in cases:
+            before = calc.recomputed
+            inputs[key] = value
+            result, changed = calc.update(inputs)
+            self.assertEqual(calc.recomputed - before, len(lines), key)
+            self.assertEqual(changed - {"sum_water", "sum_electricity", "total"}, lines, key)
+            self.assertIn("total", changed)
+            self.assert_matches_plan(result, plan, inputs)
+
+    def test_same_readings_recompute_nothing(self):
+        calc = LiveCalc(TariffPlan(TARIFFS))
+        calc.update(INPUTS)
+        before = calc.recomputed
+        result, changed = calc.update(dict(INPUTS))
+        self.assertEqual(calc.recomputed, before)
+        self.assertEqual(changed, set())
+        self.assert_matches_plan(result, TariffPlan(TARIFFS), INPUTS)
+
+    def test_shared_zone_norm_recomputes_both_zones(self):
+        plan = TariffRules(ZONE_RULES, residents=2).plan(TARIFFS)
+        calc = LiveCalc(plan)
+        inputs = dict(INPUTS)
+        calc.update(inputs)
+        before = calc.recomputed
+        inputs["el_day_curr"] = 1700.0  # сумма зон выходит за норму: ночь тоже дорожает
+        result, changed = calc.update(inputs)
+        self.assertEqual(calc.recomputed - before, 2)
+        self.assertTrue({"sum_el_day", "sum_el_night"} <= changed)
+        self.assertTrue(changed.isdisjoint({"sum_sewage", "sum_xvs", "sum_heating", "sum_gvs", "sum_water"}))
+        self.assert_matches_plan(result, plan, inputs)
+
+    def test_session_rebuilds_calc_for_new_plan(self):
+        w = Window(TariffPlan(TARIFFS))
+        w.session.run()
+        first = w.session.calc
+        w.plan = TariffPlan(dict(TARIFFS, tariff_xvs=50.0))
+        result = w.session.run()
+        self.assertIsNot(w.session.calc, first)
+        self.assert_matches_plan(result, w.plan, INPUTS)
+
+
+class InvalidInputTest(unittest.TestCase):
+    def test_invalid_edit_drops_stale_result(self):
+        w = Window(TariffPlan(TARIFFS))
+        w.session.run()
+        self.assertIsNotNone(w.results[-1])
+        valid_lines = w.text.lines[:]
+
+        w.type("xvs_curr", 10.0)  # меньше предыдущего
+        w.scheduler.advance(150)
+        self.assertIsNone(w.results[-1])
+        self.assertEqual(w.text.lines, ["Текущие показания воды должны быть не меньше предыдущих."])
+
+        w.type("xvs_curr", None)  # поле не число
+        w.scheduler.advance(150)
+        self.assertIsNone(w.results[-1])
+        self.assertEqual(w.text.lines, ["Заполните все поля показаний числами."])
+
+        w.type("xvs_curr", INPUTS["xvs_curr"])
+        w.scheduler.advance(150)
+        self.assertEqual(w.results[-1]["inputs"], INPUTS)
+        self.assertEqual(w.text.lines, valid_lines)
+
+    def test_nan_and_inf_are_validation_errors(self):
+        w = Window(TariffPlan(TARIFFS))
+        w.session.run()
+        for value in (float("nan"), float("inf")):  # parse_float("nan"), parse_float("inf")
+            w.type("gvs_curr", value)
+            w.scheduler.advance(150)
+            self.assertIsNone(w.results[-1])
+            self.assertEqual(w.text.lines, ["Показания должны быть конечными числами (не nan и не inf)."])
+
+    def test_invalid_edit_does_not_poison_next_result(self):
+        plan = TariffPlan(TARIFFS)
+        w = Window(plan)
+        w.session.run()
+        w.type("el_day_curr", 1.0)
+        w.scheduler.advance(150)
+        w.type("el_day_curr", 1600.0)
+        w.scheduler.advance(150)
+        expected = plan.calculate(**dict(INPUTS, el_day_curr=1600.0))
+        self.assertEqual(w.results[-1]["total"], expected["total"])
+
+
+class LatencyTest(unittest.TestCase):
+    def test_keystroke_to_display_within_frame_budget(self):
+        w = Window(TariffRules(ZONE_RULES, residents=2).plan(TARIFFS))
+        w.session.run()
+        times = []
+        for i in range(200):
+            w.fields["el_day_curr"] = 1531.81 + i / 100
+            w.fields["gvs_curr"] = 51.53 + i / 1000
+            start = time.perf_counter()
+            w.session.run()  # чтение полей, проверка, LiveCalc, текст и правка поля результата
+            times.append((time.perf_counter() - start) * 1000)
+        times.sort()
+        self.assertLess(times[len(times) // 2], LIVE_FRAME_BUDGET_MS)
+        # На нажатие переписываются только изменившиеся строки, а не весь текст
+        self.assertLess(w.text.edits, 200 * len(w.shown))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+merge_history: политики keep-all, first, last и error, одинаковые записи в одном экземпляре, ключ по периоду;
+маленький --run заставляет резать входы на отрезки во временных файлах (heapq.merge по отрезкам),
+и результат совпадает со слиянием в памяти.
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import merge_history
+from history_store import HistoryStore
+from merge_history import MergeConflict, merge_files, merge_records, sort_key
+from tariff_schedule import period_start
+
+MONTHS = ("Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+          "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь")
+
+
+def record(period, date_saved, total, **extra):
+    return dict({"period": period, "date_saved": date_saved, "total": total}, **extra)
+
+
+def random_records(rng, n):
+    out = []
+    for _ in range(n):
+        year, month = rng.choice((2023, 2024, 2025)), rng.randrange(12)
+        period = f"{MONTHS[month]} {year}"
+        out.append(record(period, f"{year}-{month + 1:02d}-{rng.randint(20, 28)}", float(rng.randint(1, 5))))
+    return out
+
+
+class SpillTest(unittest.TestCase):
+    def test_spilled_runs_match_in_memory_merge(self):
+        rng = random.Random(7)
+        inputs = [random_records(rng, n) for n in (40, 1, 25)]
+        for policy in ("keep-all", "first", "last"):
+            expected = list(merge_records(inputs, policy=policy))
+            with mock.patch.object(merge_history, "_spill", wraps=merge_history._spill) as spill:
+                merged = list(merge_records(inputs, policy=policy, run_size=3))
+            self.assertGreater(spill.call_count, 20, policy)  # отрезки действительно ушли во временные файлы
+            self.assertEqual(merged, expected, policy)
+
+    def test_output_ordered_by_period(self):
+        rng = random.Random(3)
+        inputs = [random_records(rng, 30), random_records(rng, 30)]
+        merged = list(merge_records(inputs, run_size=4))
+        keys = [sort_key(r) for r in merged]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual([period_start(r["period"]) for r in merged],
+                         sorted(period_start(r["period"]) for r in merged))
+
+    def test_single_short_run_stays_in_memory(self):
+        with mock.patch.object(merge_history, "_spill") as spill:
+            merged = list(merge_records([[record("Май 2025", "2025-05-28", 1.0)]], run_size=10))
+        spill.assert_not_called()
+        self.assertEqual(len(merged), 1)
+
+
+class PolicyTest(unittest.TestCase):
+    A = record("Май 2025", "2025-05-28", 100.0)
+    B = record("Май 2025", "2025-05-28", 120.0)
+    C = record("Май 2025", "2025-05-28", 130.0)
+    OTHER = record("Апрель 2025", "2025-04-28", 90.0)
+
+    def merge(self, policy, run_size=2, **kwargs):
+        inputs = [[self.A, self.OTHER], [self.B, dict(self.OTHER)], [self.C]]
+        return list(merge_records(inputs, policy=policy, run_size=run_size, **kwargs))
+
+    def test_identical_records_kept_once(self):
+        merged = list(merge_records([[self.A, self.A], [dict(self.A)]], policy="error", run_size=1))
+        self.assertEqual(merged, [self.A])
+
+    def test_keep_all_in_input_order_and_reports(self):
+        conflicts = []
+        merged = self.merge("keep-all", on_conflict=lambda key, records: conflicts.append((key, records)))
+        self.assertEqual(merged, [self.OTHER, self.A, self.B, self.C])
+        self.assertEqual(conflicts, [(("Май 2025", "2025-05-28"), [self.A, self.B, self.C])])
+
+    def test_first_and_last(self):
+        self.assertEqual(self.merge("first"), [self.OTHER, self.A])
+        self.assertEqual(self.merge("last"), [self.OTHER, self.C])
+
+    def test_first_within_one_file_is_saved_earlier(self):
+        merged = list(merge_records([[self.B, self.A]], policy="first", run_size=1))
+        self.assertEqual(merged, [self.B])
+
+    def test_error_raises(self):
+        with self.assertRaises(MergeConflict) as cm:
+            self.merge("error")
+        self.assertEqual(cm.exception.key, ("Май 2025", "2025-05-28"))
+        self.assertEqual(cm.exception.records, [self.A, self.B, self.C])
+
+    def test_period_key_ignores_date_saved(self):
+        early = record("Май 2025", "2025-05-20", 100.0)
+        late = record("Май 2025", "2025-06-02", 110.0)
+        inputs = [[late], [early]]
+        self.assertEqual(list(merge_records(inputs, key=("period", "date_saved"), policy="first")), [early, late])
+        self.assertEqual(list(merge_records(inputs, key=("period",), policy="first")), [late])
+        self.assertEqual(list(merge_records(inputs, key=("period",), policy="last")), [early])
+
+    def test_records_without_key_are_all_kept(self):
+        a = record(None, "2025-05-28", 1.0)
+        b = record(None, "2025-05-28", 2.0)
+        self.assertEqual(list(merge_records([[a], [b]], policy="error")), [a, b])
+
+    def test_bad_key_or_policy(self):
+        with self.assertRaises(ValueError):
+            list(merge_records([[self.A]], key=("total",)))
+        with self.assertRaises(ValueError):
+            list(merge_records([[self.A]], policy="newest"))
+
+
+class MergeFilesTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.array = os.path.join(self.dir, "history.json")
+        with open(self.array, "w", encoding="utf-8") as f:
+            json.dump([PolicyTest.A, PolicyTest.OTHER], f)
+        self.journal = os.path.join(self.dir, "history.jsonl")
+        store = HistoryStore(self.journal)
+        store.extend([PolicyTest.B, record("Июнь 2025", "2025-06-28", 150.0)])
+        store.delete(("Июнь 2025", "2025-06-28"))
+
+    def test_array_and_journal_into_journal(self):
+        out = os.path.join(self.dir, "merged.jsonl")
+        n = merge_files([self.array, self.journal], out, policy="last", run_size=1)
+        self.assertEqual(n, 2)
+        self.assertEqual(HistoryStore(out).records(), [PolicyTest.OTHER, PolicyTest.B])
+
+    def test_conflict_error_leaves_no_output(self):
+        out = os.path.join(self.dir, "merged.json")
+        with self.assertRaises(MergeConflict):
+            merge_files([self.array, self.journal], out, policy="error", run_size=1)
+        self.assertEqual(sorted(os.listdir(self.dir)), ["history.json", "history.jsonl"])
+
+    def test_main_writes_array(self):
+        out = os.path.join(self.dir, "merged.json")
+        with contextlib.redirect_stderr(io.StringIO()):
+            code = merge_history.main([self.array, self.journal, "-o", out, "--policy", "first", "--run", "1"])
+        self.assertEqual(code, 0)
+        with open(out, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), [PolicyTest.OTHER, PolicyTest.A])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+money: строки счёта сходятся с итогами до копейки, пакет равен поштучному расчёту,
+округление — ОКРУГЛ (половина от нуля), показания и тарифы — с точностью 4 знака.
+"""
+import random
+import unittest
+from decimal import ROUND_HALF_UP, Decimal
+
+from calc import CONSUMPTION_FIELDS, SUM_FIELDS
+from money import (
+    SCALE, TERMS, calculate_batch_exact, calculate_exact, calculate_kopecks, kopecks_to_str, round_div,
+    term_kopecks, to_scaled,
+)
+
+READINGS = ("xvs_prev", "xvs_curr", "gvs_prev", "gvs_curr",
+            "el_day_prev", "el_day_curr", "el_night_prev", "el_night_curr")
+TARIFFS = {
+    "tariff_sewage": 46.73, "tariff_xvs": 43.24, "tariff_gvs": 43.24, "tariff_heating_per_gcal": 2891.74,
+    "norm_gcal_per_m3": 0.06, "tariff_el_day": 6.79, "tariff_el_night": 2.81,
+}
+WATER = ("sum_sewage", "sum_xvs", "sum_heating", "sum_gvs")
+ELECTRICITY = ("sum_el_day", "sum_el_night")
+
+
+def random_rows(n, seed, decimals=2, negative=False):
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        row = {}
+        for meter in ("xvs", "gvs", "el_day", "el_night"):
+            prev = round(rnd.uniform(0, 20000), decimals)
+            step = rnd.uniform(-50 if negative else 0, 400)
+            row[meter + "_prev"] = prev
+            row[meter + "_curr"] = round(prev + step, decimals)
+        rows.append(row)
+    return rows
+
+
+def random_tariffs(rnd):
+    t = {k: round(rnd.uniform(0.5, 100), rnd.choice((2, 3, 4))) for k in TARIFFS}
+    t["tariff_heating_per_gcal"] = round(rnd.uniform(1000, 4000), 2)
+    t["norm_gcal_per_m3"] = round(rnd.uniform(0.01, 0.1), 4)
+    return t
+
+
+def decimal_kopecks(row, tariffs):
+    """Эталон на decimal.Decimal: каждая строка округляется до копейки ROUND_HALF_UP, итоги — сумма строк."""
+    d = {k: Decimal(repr(v)) for k, v in dict(row, **tariffs).items()}
+    cons = {m: d[m + "_curr"] - d[m + "_prev"] for m in ("xvs", "gvs", "el_day", "el_night")}
+    cons["sewage"] = cons["xvs"] + cons["gvs"]
+    out = {}
+    for key, column, keys, _ in TERMS:
+        amount = cons[column]
+        for k in keys:
+            amount *= d[k]
+        out[key] = int((amount * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    out["sum_water"] = sum(out[k] for k in WATER)
+    out["sum_electricity"] = sum(out[k] for k in ELECTRICITY)
+    out["total"] = out["sum_water"] + out["sum_electricity"]
+    return out
+
+
+class RoundingTest(unittest.TestCase):
+    def test_round_div_half_away_from_zero(self):
+        cases = [(5, 10, 1), (15, 10, 2), (25, 10, 3), (4, 10, 0), (6, 10, 1),
+                 (-5, 10, -1), (-15, 10, -2), (-25, 10, -3), (-4, 10, 0), (-6, 10, -1), (0, 10, 0)]
+        for n, d, expected in cases:
+            with self.subTest(n=n, d=d):
+                self.assertEqual(round_div(n, d), expected)
+
+    def test_round_div_matches_decimal(self):
+        rnd = random.Random(5)
+        for _ in range(20000):
+            d = rnd.randint(1, 10 ** 6)
+            n = rnd.randint(-10 ** 9, 10 ** 9)
+            expected = int((Decimal(n) / Decimal(d)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+            self.assertEqual(round_div(n, d), expected, (n, d))
+
+    def test_half_kopeck_lines(self):
+        # 0.125 м³ × 0.04 руб = 0.5 коп -> 1 коп; с обратным знаком -> -1 коп (не 0, как у round())
+        zero = dict.fromkeys(READINGS, 0.0)
+        tariffs = dict(TARIFFS, tariff_xvs=0.04)
+        up = calculate_kopecks(**dict(zero, xvs_curr=0.125), **tariffs)
+        self.assertEqual(up["sum_xvs"], 1)
+        down = calculate_kopecks(**dict(zero, xvs_prev=0.125), **tariffs)
+        self.assertEqual(down["sum_xvs"], -1)
+        # 0.375 × 0.04 = 1.5 коп -> 2; 0.625 × 0.04 = 2.5 коп -> 3 (банковское округление дало бы 2)
+        self.assertEqual(calculate_kopecks(**dict(zero, xvs_curr=0.375), **tariffs)["sum_xvs"], 2)
+        self.assertEqual(calculate_kopecks(**dict(zero, xvs_curr=0.625), **tariffs)["sum_xvs"], 3)
+
+    def test_term_kopecks_negative(self):
+        col = [-1250, -1249, -1251, 1250, 0]  # расходы в 1/SCALE: -0.125 м³ и т. д.
+        rate = to_scaled(0.04)
+        self.assertEqual(list(term_kopecks(col, rate)), [round_div(c * rate, SCALE * SCALE // 100) for c in col])
+        self.assertEqual(list(term_kopecks(col, rate)), [-1, 0, -1, 1, 0])
+
+    def test_kopecks_to_str(self):
+        self.assertEqual(kopecks_to_str(12345), "123.45")
+        self.assertEqual(kopecks_to_str(-5), "-0.05")
+        self.assertEqual(kopecks_to_str(0), "0.00")
+
+
+class QuantizationTest(unittest.TestCase):
+    def test_exact_up_to_four_decimals(self):
+        rnd = random.Random(6)
+        for _ in range(20000):
+            text = f"{rnd.randint(0, 99999)}.{rnd.randint(0, 9999):04d}"
+            self.assertEqual(to_scaled(float(text)), int(Decimal(text) * SCALE), text)
+
+    def test_more_decimals_round_to_nearest(self):
+        self.assertEqual(to_scaled(0.12346), 1235)
+        self.assertEqual(to_scaled(0.12344), 1234)
+        self.assertEqual(to_scaled(1.00004), 10000)
+        self.assertEqual(to_scaled(1487.59996), 14876000)
+        self.assertEqual(to_scaled(-0.12346), -1235)
+
+    def test_readings_beyond_four_decimals(self):
+        # Показания с 5-м знаком считаются как округлённые до 4 знаков
+        row = random_rows(1, seed=7)[0]
+        noisy = {k: v + 0.00003 for k, v in row.items()}
+        self.assertEqual(calculate_kopecks(**noisy, **TARIFFS), calculate_kopecks(**row, **TARIFFS))
+
+    def test_tariffs_quantized(self):
+        row = random_rows(1, seed=8)[0]
+        tariffs = {k: v + 0.00002 for k, v in TARIFFS.items()}
+        self.assertEqual(calculate_kopecks(**row, **tariffs), calculate_kopecks(**row, **TARIFFS))
+
+
+class ReconcileTest(unittest.TestCase):
+    def test_lines_sum_to_totals(self):
+        rnd = random.Random(9)
+        for row in random_rows(3000, seed=10, negative=True):
+            tariffs = random_tariffs(rnd)
+            k = calculate_kopecks(**row, **tariffs)
+            self.assertEqual(k["sum_water"], sum(k[f] for f in WATER))
+            self.assertEqual(k["sum_electricity"], sum(k[f] for f in ELECTRICITY))
+            self.assertEqual(k["total"], k["sum_water"] + k["sum_electricity"])
+            r = calculate_exact(**row, **tariffs)
+            self.assertEqual(round(r["total"] * 100), k["total"])
+            self.assertEqual(round(sum(r[f] for f in WATER + ELECTRICITY) * 100), k["total"])
+
+    def test_matches_decimal_reference(self):
+        rnd = random.Random(11)
+        for decimals in (2, 3, 4):
+            for row in random_rows(2000, seed=12 + decimals, decimals=decimals, negative=True):
+                tariffs = random_tariffs(rnd)
+                k = calculate_kopecks(**row, **tariffs)
+                expected = decimal_kopecks(row, tariffs)
+                self.assertEqual({f: k[f] for f in SUM_FIELDS}, expected, (row, tariffs))
+
+    def test_term_kopecks_sum_to_batch_total(self):
+        rows = random_rows(5000, seed=13, negative=True)
+        cols = {k: [r[k] for r in rows] for k in READINGS}
+        batch = calculate_batch_exact(**cols, **TARIFFS)
+        lines = {}
+        for key, column, keys, heating in TERMS:
+            rates = [to_scaled(TARIFFS[k]) for k in keys]
+            rate = rates[0] * rates[1] if heating else rates[0]
+            lines[key] = term_kopecks(batch["consumption"][column], rate, heating)
+            self.assertEqual(lines[key], batch[key], key)
+        for i in range(len(rows)):
+            self.assertEqual(sum(lines[k][i] for k, _, _, _ in TERMS), batch["total"][i])
+
+
+class BatchTest(unittest.TestCase):
+    def assert_batch_equals_scalar(self, rows, tariffs):
+        cols = {k: [r[k] for r in rows] for k in READINGS}
+        batch = calculate_batch_exact(**cols, **tariffs)
+        for i, row in enumerate(rows):
+            k = calculate_kopecks(**row, **tariffs)
+            for f in CONSUMPTION_FIELDS:
+                self.assertEqual(batch["consumption"][f][i], k["consumption"][f], (i, f))
+            for f in SUM_FIELDS:
+                self.assertEqual(batch[f][i], k[f], (i, f))
+
+    def test_batch_equals_scalar(self):
+        self.assert_batch_equals_scalar(random_rows(5000, seed=14), TARIFFS)
+
+    def test_batch_equals_scalar_negative(self):
+        # Отрицательный расход идёт в batch по медленной ветке round_div()
+        self.assert_batch_equals_scalar(random_rows(2000, seed=15, negative=True), TARIFFS)
+
+    def test_batch_equals_scalar_half_kopecks(self):
+        rows = []
+        for i in range(-200, 200):
+            c = i * 0.125
+            rows.append({"xvs_prev": 100.0, "xvs_curr": 100.0 + c, "gvs_prev": 50.0, "gvs_curr": 50.0 + c,
+                         "el_day_prev": 10.0, "el_day_curr": 10.0 + c, "el_night_prev": 0.0, "el_night_curr": c})
+        self.assert_batch_equals_scalar(rows, dict(TARIFFS, tariff_xvs=0.04, tariff_el_day=0.12, tariff_sewage=0.2))
+
+    def test_length_mismatch(self):
+        cols = {k: [1.0, 2.0] for k in READINGS}
+        cols["el_night_curr"] = [2.0]
+        with self.assertRaises(ValueError):
+            calculate_batch_exact(**cols)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+persist: задания BackgroundWriter с одним ключом склеиваются, обработчики вызываются только из опроса
+по таймеру (watch — поддельный таймер, как в test_live), flush() дописывает всё перед закрытием окна;
+atomic_write_text подменяет файл через временный и при сбое оставляет прежнюю версию.
+"""
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import persist
+from history_store import HistoryStore
+from persist import BackgroundWriter, atomic_write_json, atomic_write_text
+
+
+class FakeScheduler:
+    """after как у tk.Tk; задания выполняются только в advance()."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def after(self, ms, fn):
+        self.jobs.append(fn)
+        return f"after#{len(self.jobs)}"
+
+    def advance(self):
+        jobs, self.jobs = self.jobs, []
+        for fn in jobs:
+            fn()
+
+
+class WriterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.writer = BackgroundWriter()
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.addCleanup(self.gate.set)
+
+    def block(self):
+        """Занять поток записи, пока тест не откроет gate."""
+        def job():
+            self.started.set()
+            self.gate.wait(5)
+
+        self.writer.submit("block", job)
+        self.assertTrue(self.started.wait(5))
+
+
+class CoalesceTest(WriterTestCase):
+    def test_jobs_with_same_key_run_once(self):
+        self.block()
+        calls = []
+        results = []
+        for i in range(5):
+            self.writer.submit("history", lambda i=i: calls.append(i), results.append)
+        self.writer.submit("config", lambda: calls.append("config"), results.append)
+        self.gate.set()
+        self.assertTrue(self.writer.flush(timeout=5))
+        # Выполнилось только последнее задание каждого ключа, обработчики всех пяти получили результат
+        self.assertEqual(calls, [4, "config"])
+        self.assertEqual(self.writer.submitted, 7)
+        self.assertEqual(self.writer.writes, 3)
+        self.assertEqual(results, [])  # до опроса — ни одного вызова
+        self.assertFalse(self.writer.poll())
+        self.assertEqual(results, [None] * 6)
+
+    def test_error_reaches_every_callback(self):
+        self.block()
+        results = []
+
+        def fail():
+            raise OSError("диск полон")
+
+        self.writer.submit("history", lambda: None, results.append)
+        self.writer.submit("history", fail, results.append)
+        self.gate.set()
+        self.writer.flush(timeout=5)
+        self.writer.poll()
+        self.assertEqual([str(e) for e in results], ["диск полон", "диск полон"])
+
+
+class WatchTest(WriterTestCase):
+    def test_callbacks_run_from_timer_until_writes_finish(self):
+        scheduler = FakeScheduler()
+        results = []
+        self.block()
+        self.writer.submit("history", lambda: None, results.append)
+        self.writer.watch(scheduler)
+        self.writer.watch(scheduler)  # опрос уже идёт — второго таймера нет
+        self.assertEqual(len(scheduler.jobs), 1)
+
+        scheduler.advance()  # запись ещё идёт — опрос продолжается
+        self.assertEqual(results, [])
+        self.assertEqual(len(scheduler.jobs), 1)
+
+        self.gate.set()
+        self.writer.flush(timeout=5)
+        main_thread = threading.current_thread()
+        threads = []
+        self.writer.submit("config", lambda: None, lambda e: threads.append(threading.current_thread()))
+        self.writer.flush(timeout=5)
+        scheduler.advance()
+        self.assertEqual(results, [None])
+        self.assertEqual(threads, [main_thread])
+        self.assertEqual(scheduler.jobs, [])  # всё записано — таймер больше не ставится
+
+        self.writer.watch(scheduler)  # новая запись — опрос начинается снова
+        self.assertEqual(len(scheduler.jobs), 1)
+
+    def test_flush_times_out_while_busy(self):
+        self.block()
+        self.assertFalse(self.writer.flush(timeout=0.05))
+        self.gate.set()
+        self.assertTrue(self.writer.flush(timeout=5))
+
+
+class CloseTest(unittest.TestCase):
+    def test_flush_on_close_writes_deferred_history(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "history.jsonl")
+            store = HistoryStore(path)
+            store.defer = True
+            writer = BackgroundWriter()
+            for i in range(3):
+                store.append({"period": f"Период {i}", "date_saved": "2025-01-01", "total": float(i)})
+                writer.submit("history", store.flush)
+            # Как App._on_close: дождаться записи и проверить, что в очереди ничего не осталось
+            self.assertTrue(writer.flush(timeout=5))
+            self.assertFalse(store.pending())
+            self.assertEqual([r["period"] for r in HistoryStore(path).records()],
+                             ["Период 0", "Период 1", "Период 2"])
+
+
+class AtomicWriteTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "config.json")
+
+    def test_replaces_through_temp_file(self):
+        atomic_write_json(self.path, {"tariff_xvs": 1.0})
+        replaced = []
+        real_replace = os.replace
+
+        def spy(src, dst):
+            replaced.append((src, dst))
+            with open(src, "r", encoding="utf-8") as f:
+                self.assertEqual(json.load(f), {"tariff_xvs": 2.0})
+            real_replace(src, dst)
+
+        with mock.patch.object(persist.os, "replace", spy):
+            atomic_write_json(self.path, {"tariff_xvs": 2.0})
+        self.assertEqual(replaced, [(self.path + ".tmp", self.path)])
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {"tariff_xvs": 2.0})
+
+    def test_failed_write_keeps_old_version(self):
+        atomic_write_text(self.path, "старое")
+
+        def crash(fd):
+            raise OSError("сбой посреди записи")
+
+        with mock.patch.object(persist.os, "fsync", crash):
+            with self.assertRaises(OSError):
+                atomic_write_text(self.path, "новое, но не дописанное")
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "старое")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Правила тарифов из config.json (ступени, норма на жильца, общая норма зон) применяются везде, где считается
+счёт: cli, bulk, statements, сервис и «что если» дают те же копейки, что план правил в окне программы.
+"""
+import asyncio
+import contextlib
+import io
+import json
+import os
+import pickle
+import tempfile
+import unittest
+
+import bulk
+import cli
+import service
+import statements
+from calc import SUM_FIELDS
+from core import DEFAULT_TARIFFS, READING_KEYS, load_rules
+from money import kopecks_to_str
+from tariff_rules import TariffRules
+from whatif import WhatIf
+
+TARIFFS = dict(DEFAULT_TARIFFS)
+RULES = {
+    "residents": 2,
+    "lines": {
+        "sum_xvs": {"tiers": [{"upto": 0.5, "per_resident": True}, {"k": 1.5}]},
+        "sum_heating": {"tiers": [{"upto": 1}, {"k": 2}]},
+        "sum_el_day": {"tiers": [{"upto": 10, "per_resident": True}, {"k": 1.3}], "norm_of": ["el_day", "el_night"]},
+        "sum_el_night": {"tiers": [{"upto": 10, "per_resident": True}, {"k": 1.3}], "norm_of": ["el_day", "el_night"]},
+    },
+}
+CONFIG = dict(TARIFFS, rules=RULES)
+ROWS = [
+    {"xvs_prev": 55.58, "xvs_curr": 57.74, "gvs_prev": 49.54, "gvs_curr": 51.53,
+     "el_day_prev": 1487.59, "el_day_curr": 1531.81, "el_night_prev": 648.86, "el_night_curr": 662.75},
+    {"xvs_prev": 10.0, "xvs_curr": 10.4, "gvs_prev": 5.0, "gvs_curr": 5.5,
+     "el_day_prev": 100.0, "el_day_curr": 108.0, "el_night_prev": 50.0, "el_night_curr": 53.0},
+]
+
+
+def csv_lines(rows):
+    header = ",".join(("apartment",) + READING_KEYS) + "\n"
+    body = [",".join([str(i + 1)] + [str(row[k]) for k in READING_KEYS]) + "\n" for i, row in enumerate(rows)]
+    return header, body
+
+
+class RulesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rules = load_rules(CONFIG)
+        self.plan = self.rules.plan(TARIFFS)
+
+    def expected(self, row):
+        return self.plan.calculate(**row)
+
+
+class LoadRulesTest(unittest.TestCase):
+    def test_no_rules_is_none(self):
+        self.assertIsNone(load_rules(TARIFFS))
+        self.assertIsNone(load_rules(dict(TARIFFS, rules={"lines": {}})))
+
+    def test_bad_rules_raise(self):
+        with self.assertRaises(ValueError):
+            load_rules(dict(TARIFFS, rules={"lines": {"sum_xvs": {"tiers": []}}}))
+
+    def test_rules_change_the_bill(self):
+        rules = load_rules(CONFIG)
+        linear = TariffRules().plan(TARIFFS).calculate(**ROWS[0])
+        tiered = rules.plan(TARIFFS).calculate(**ROWS[0])
+        for key in RULES["lines"]:
+            self.assertNotEqual(tiered[key], linear[key], key)
+
+    def test_pickled_rules_build_the_same_plan(self):
+        rules = load_rules(CONFIG)
+        rules.plan(TARIFFS)  # кэш планов с замыканиями не должен мешать передаче в процесс
+        copy = pickle.loads(pickle.dumps(rules))
+        self.assertEqual(copy.plan(TARIFFS).calculate(**ROWS[0]), rules.plan(TARIFFS).calculate(**ROWS[0]))
+
+
+class CliTest(RulesTestCase):
+    def test_compute_with_plan(self):
+        for row in ROWS:
+            self.assertEqual(cli.compute(row, TARIFFS, plan=self.plan), self.expected(row))
+
+    def test_compute_from_config_applies_rules(self):
+        for row in ROWS:
+            self.assertEqual(cli.compute(row, config=CONFIG), self.expected(row))
+
+    def test_main_reads_rules_from_config(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "config.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(CONFIG, f)
+            out = io.StringIO()
+            argv = ["--config", path] + [str(ROWS[0][k]) for k in READING_KEYS]
+            with contextlib.redirect_stdout(out):
+                self.assertEqual(cli.main(argv), 0)
+        self.assertEqual(json.loads(out.getvalue()), json.loads(json.dumps(self.expected(ROWS[0]))))
+
+
+class BulkTest(RulesTestCase):
+    def test_bill_chunk_uses_rules(self):
+        header, lines = csv_lines(ROWS)
+        columns, _ = bulk.read_chunks(io.StringIO(header), 10)
+        text, n = bulk.bill_chunk(lines, columns, TARIFFS, rules=self.rules)
+        self.assertEqual(n, len(ROWS))
+        for line, row in zip(text.splitlines(), ROWS):
+            k = self.plan.kopecks(**row)
+            self.assertEqual(line.split(",")[1:-1], [kopecks_to_str(k[f]) for f in SUM_FIELDS])
+
+    def test_render_chunk_uses_rules(self):
+        header, lines = csv_lines(ROWS)
+        columns, _ = bulk.read_chunks(io.StringIO(header), 10)
+        out, failed = statements.render_chunk(lines, columns, TARIFFS, "Октябрь 2025", ("txt",), rules=self.rules)
+        self.assertEqual(failed, [])
+        for (_, texts), row in zip(out, ROWS):
+            total = kopecks_to_str(self.plan.kopecks(**row)["total"])
+            self.assertIn(f"{total} руб", texts["txt"].split("═")[-1])
+
+
+class ServiceTest(RulesTestCase):
+    def test_calculate_rows_with_plan(self):
+        results = service._calculate_rows(ROWS, TARIFFS, False, self.plan)
+        self.assertEqual(results, [self.expected(row) for row in ROWS])
+
+    def test_service_uses_config_rules(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "config.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(dict(CONFIG, tariffs_from="2000-01-01"), f)
+            svc = service.BillingService(path)
+            body = json.dumps(ROWS).encode("utf-8")
+            results = asyncio.run(svc.calculate({}, body))
+        self.assertEqual(results, [self.expected(row) for row in ROWS])
+
+
+class WhatIfTest(RulesTestCase):
+    def records(self):
+        readings = [(10.0, 5.0, 100.0, 50.0), (10.4, 5.5, 108.0, 53.0), (14.0, 7.25, 190.5, 91.0)]
+        return [{"period": period, "date_saved": f"2025-{m:02d}-28", "total": 0,
+                 "xvs_curr": x, "gvs_curr": g, "el_day_curr": d, "el_night_curr": n}
+                for m, period, (x, g, d, n) in zip((1, 2, 3), ("Январь 2025", "Февраль 2025", "Март 2025"), readings)]
+
+    def test_scenario_matches_plan(self):
+        records = self.records()
+        engine = WhatIf(records, rules=self.rules)
+        for tariffs in (TARIFFS, dict(TARIFFS, tariff_xvs=50.0, tariff_el_day=7.5)):
+            plan = TariffRules(RULES["lines"], RULES["residents"]).plan(tariffs)
+            result = engine.scenario(tariffs)
+            for j, (prev, curr) in enumerate(zip(records, records[1:])):
+                row = {}
+                for m in ("xvs", "gvs", "el_day", "el_night"):
+                    row[m + "_prev"], row[m + "_curr"] = prev[m + "_curr"], curr[m + "_curr"]
+                expected = plan.kopecks(**row)
+                for f in SUM_FIELDS:
+                    self.assertEqual(result[f][j], expected[f], (tariffs, j, f))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+service: «nan» и «inf» в показаниях — 400 только у своего запроса, ошибка строки при расчёте пачки
+не роняет соседние запросы, limit и offset истории — неотрицательные целые.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import service
+from core import DEFAULT_TARIFFS, NOT_FINITE_MESSAGE
+
+ROW = {"xvs_prev": 55.58, "xvs_curr": 57.74, "gvs_prev": 49.54, "gvs_curr": 51.53,
+       "el_day_prev": 1487.59, "el_day_curr": 1531.81, "el_night_prev": 648.86, "el_night_curr": 662.75}
+TARIFFS = dict(DEFAULT_TARIFFS)
+
+
+class ServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "config.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(dict(TARIFFS, tariffs_from="2000-01-01"), f)
+        self.service = service.BillingService(path)
+
+    def post(self, target, payload):
+        """Тело как у клиента: nan в JSON — литерал NaN, который json.loads принимает."""
+        body = json.dumps(payload).encode("utf-8")
+        return self.service.dispatch("POST", target, body)
+
+    def gather(self, *requests):
+        async def run():
+            return await asyncio.gather(*requests)
+
+        return asyncio.run(run())
+
+
+class NotFiniteReadingsTest(ServiceTestCase):
+    def test_bad_request_does_not_fail_its_neighbour(self):
+        for target in ("/calculate", "/calculate?exact=1"):
+            ok, bad, inf = self.gather(
+                self.post(target, ROW),
+                self.post(target, dict(ROW, xvs_curr=float("nan"))),
+                self.post(target, dict(ROW, el_day_curr="inf")),
+            )
+            self.assertEqual(ok[0], 200, target)
+            self.assertEqual(bad, (400, {"error": NOT_FINITE_MESSAGE}), target)
+            self.assertEqual(inf, (400, {"error": NOT_FINITE_MESSAGE}), target)
+
+    def test_array_reports_error_per_item(self):
+        status, results = asyncio.run(self.post("/calculate?exact=1", [ROW, dict(ROW, gvs_prev="NaN")]))
+        self.assertEqual(status, 200)
+        self.assertIn("total", results[0])
+        self.assertEqual(results[1], {"error": NOT_FINITE_MESSAGE})
+        # Ответ — корректный JSON без голых NaN
+        json.loads(json.dumps(results, allow_nan=False))
+
+
+class BatcherFallbackTest(unittest.TestCase):
+    def test_failing_row_fails_only_its_request(self):
+        async def run():
+            batcher = service.CalcBatcher(window=10)
+            good = batcher.submit(ROW, TARIFFS, exact=True)
+            # Мимо parse_readings: строка, на которой падает расчёт в копейках
+            bad = batcher.submit(dict(ROW, xvs_curr=float("nan")), TARIFFS, exact=True)
+            batcher.flush()
+            return await asyncio.gather(good, bad, return_exceptions=True)
+
+        good, bad = asyncio.run(run())
+        self.assertEqual(good, service._calculate_rows([ROW], TARIFFS, True)[0])
+        self.assertIsInstance(bad, ValueError)
+
+
+class HistoryQueryTest(ServiceTestCase):
+    def test_limit_and_offset_must_be_non_negative_integers(self):
+        for query in ("limit=nan", "limit=-1", "limit=2.5", "offset=-3", "offset=inf", "offset=x"):
+            status, payload = asyncio.run(self.service.dispatch("GET", "/history?" + query, b""))
+            self.assertEqual(status, 400, query)
+            self.assertIn("неотрицательным целым", payload["error"])
+
+    def test_total_filters_must_be_finite(self):
+        status, _ = asyncio.run(self.service.dispatch("GET", "/history?min_total=nan", b""))
+        self.assertEqual(status, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+tariff_schedule: новая версия тарифов (push_tariff_version) — в том же месяце заменяет текущую, позже —
+уводит прежнюю в schedule; пересчёт истории (recalculate_history) берёт тарифы периода каждой записи
+и рвёт цепочку расхода на записях без показаний.
+"""
+import unittest
+
+from core import DEFAULT_TARIFFS
+from tariff_rules import TariffRules
+from tariff_schedule import TariffSchedule, push_tariff_version, recalculate_history
+
+OLD = dict(DEFAULT_TARIFFS)
+NEW = dict(DEFAULT_TARIFFS, tariff_xvs=50.0, tariff_el_day=7.5)
+NEWER = dict(DEFAULT_TARIFFS, tariff_xvs=55.0)
+
+
+class PushTariffVersionTest(unittest.TestCase):
+    def test_later_month_moves_current_to_schedule(self):
+        config = dict(OLD, tariffs_from="2025-01-01")
+        new = push_tariff_version(config, NEW, "2025-07-01")
+        self.assertEqual(new["tariffs_from"], "2025-07-01")
+        self.assertEqual(new["schedule"], [dict(OLD, **{"from": "2025-01-01"})])
+        self.assertEqual({k: new[k] for k in NEW}, NEW)
+        self.assertNotIn("schedule", config)  # исходная конфигурация не меняется
+
+        schedule = TariffSchedule.from_config(new)
+        self.assertEqual(schedule.for_period("Июнь 2025"), OLD)
+        self.assertEqual(schedule.for_period("Июль 2025"), NEW)
+
+    def test_same_month_replaces_version(self):
+        config = push_tariff_version(dict(OLD, tariffs_from="2025-01-01"), NEW, "2025-07-01")
+        again = push_tariff_version(config, NEWER, "2025-07-01")
+        self.assertEqual(again["tariffs_from"], "2025-07-01")
+        # Промежуточная версия NEW не действовала ни дня — в schedule её нет
+        self.assertEqual(again["schedule"], [dict(OLD, **{"from": "2025-01-01"})])
+        self.assertEqual(TariffSchedule.from_config(again).for_period("Июль 2025"), NEWER)
+
+    def test_unchanged_tariffs_keep_their_date(self):
+        config = dict(OLD, tariffs_from="2025-01-01")
+        new = push_tariff_version(config, dict(OLD), "2025-07-01")
+        self.assertEqual(new["tariffs_from"], "2025-01-01")
+        self.assertNotIn("schedule", new)
+
+    def test_effective_before_current_version_is_not_archived(self):
+        # old_from не раньше effective_from: прежние тарифы не действовали ни дня до новой версии
+        config = dict(OLD, tariffs_from="2025-07-01", schedule=[dict(OLD, **{"from": "2024-01-01"})])
+        new = push_tariff_version(config, NEW, "2025-03-01")
+        self.assertEqual(new["tariffs_from"], "2025-03-01")
+        self.assertEqual(new["schedule"], [dict(OLD, **{"from": "2024-01-01"})])
+
+    def test_archived_version_with_same_date_is_replaced(self):
+        stale = dict(NEWER, **{"from": "2025-01-01"})
+        config = dict(OLD, tariffs_from="2025-01-01", schedule=[stale, dict(NEWER, **{"from": "2024-01-01"})])
+        new = push_tariff_version(config, NEW, "2025-07-01")
+        self.assertEqual([v["from"] for v in new["schedule"]], ["2024-01-01", "2025-01-01"])
+        self.assertEqual(new["schedule"][1], dict(OLD, **{"from": "2025-01-01"}))
+
+    def test_no_tariffs_from_archives_as_earliest(self):
+        new = push_tariff_version(dict(OLD), NEW, "2025-07-01")
+        self.assertEqual(new["schedule"], [dict(OLD, **{"from": "0000-00-00"})])
+        self.assertEqual(TariffSchedule.from_config(new).for_period("Январь 2020"), OLD)
+
+
+def reading(period, date_saved, x, g, d, n, total=0.0):
+    return {"period": period, "date_saved": date_saved, "total": total,
+            "xvs_curr": x, "gvs_curr": g, "el_day_curr": d, "el_night_curr": n}
+
+
+def inputs(prev, curr):
+    out = {}
+    for m in ("xvs", "gvs", "el_day", "el_night"):
+        out[m + "_prev"], out[m + "_curr"] = prev[m + "_curr"], curr[m + "_curr"]
+    return out
+
+
+class RecalculateHistoryTest(unittest.TestCase):
+    SCHEDULE = TariffSchedule([("2000-01-01", OLD), ("2025-03-01", NEW)])
+
+    def test_each_period_uses_its_tariffs(self):
+        jan = reading("Январь 2025", "2025-01-28", 10.0, 5.0, 100.0, 50.0)
+        feb = reading("Февраль 2025", "2025-02-28", 11.0, 5.5, 110.0, 55.0)
+        mar = reading("Март 2025", "2025-03-28", 12.5, 6.0, 130.0, 58.0)
+        # Порядок на входе не важен — расход считается по хронологии периодов
+        out = recalculate_history([mar, jan, feb], self.SCHEDULE)
+        self.assertEqual([r for r, _ in out], [jan, feb, mar])
+        self.assertIsNone(out[0][1])
+        self.assertEqual(out[1][1], TariffRules().plan(OLD).calculate(**inputs(jan, feb)))
+        self.assertEqual(out[2][1], TariffRules().plan(NEW).calculate(**inputs(feb, mar)))
+
+    def test_chain_resets_after_record_without_readings(self):
+        jan = reading("Январь 2025", "2025-01-28", 10.0, 5.0, 100.0, 50.0)
+        feb = {"period": "Февраль 2025", "date_saved": "2025-02-28", "total": 900.0}  # до показаний в истории
+        mar = reading("Март 2025", "2025-03-28", 12.5, 6.0, 130.0, 58.0)
+        apr = reading("Апрель 2025", "2025-04-28", 13.0, 6.5, 140.0, 60.0)
+        out = recalculate_history([jan, feb, mar, apr], self.SCHEDULE)
+        # Расход марта охватил бы два месяца — не пересчитывается; апрель — уже от марта
+        self.assertEqual([result is None for _, result in out], [True, True, True, False])
+        self.assertEqual(out[3][1], TariffRules().plan(NEW).calculate(**inputs(mar, apr)))
+
+    def test_rules_applied(self):
+        rules = TariffRules({"sum_xvs": {"tiers": [{"upto": 0.5}, {"k": 2}]}})
+        jan = reading("Январь 2025", "2025-01-28", 10.0, 5.0, 100.0, 50.0)
+        feb = reading("Февраль 2025", "2025-02-28", 11.0, 5.5, 110.0, 55.0)
+        out = recalculate_history([jan, feb], self.SCHEDULE, rules)
+        self.assertEqual(out[1][1], rules.plan(OLD).calculate(**inputs(jan, feb)))
+        self.assertNotEqual(out[1][1]["sum_xvs"], TariffRules().plan(OLD).calculate(**inputs(jan, feb))["sum_xvs"])
+
+    def test_unknown_period_uses_date_saved(self):
+        a = reading("", "2025-02-10", 10.0, 5.0, 100.0, 50.0)
+        b = reading("весна", "2025-03-10", 11.0, 5.5, 110.0, 55.0)
+        out = recalculate_history([b, a], self.SCHEDULE)
+        self.assertEqual(out[1][1], TariffRules().plan(NEW).calculate(**inputs(a, b)))
+
+
+if __name__ == "__main__":
+    unittest.main()
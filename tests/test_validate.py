@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка показаний: «nan» и «inf» проходят float() и parse_float, но отклоняются validate_readings,
+validate_columns и parse_readings с обычным текстом ошибки, а не падают в расчёте в копейках.
+"""
+import unittest
+from array import array
+
+from core import NOT_FINITE_MESSAGE, READING_KEYS, parse_float, parse_readings, validate_columns, validate_readings
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+INPUTS = {
+    "xvs_prev": 55.58, "xvs_curr": 57.74, "gvs_prev": 49.54, "gvs_curr": 51.53,
+    "el_day_prev": 1487.59, "el_day_curr": 1531.81, "el_night_prev": 648.86, "el_night_curr": 662.75,
+}
+NOT_FINITE = ("nan", "inf", "-inf", "Infinity", "NaN")
+
+
+class ValidateReadingsTest(unittest.TestCase):
+    def test_not_finite_rejected_in_every_field(self):
+        for key in READING_KEYS:
+            for text in NOT_FINITE:
+                inputs = dict(INPUTS, **{key: parse_float(text)})
+                self.assertEqual(validate_readings(inputs), NOT_FINITE_MESSAGE, (key, text))
+
+    def test_valid_readings_pass(self):
+        self.assertIsNone(validate_readings(INPUTS))
+
+    def test_parse_readings_raises(self):
+        for readings in (dict(INPUTS, xvs_curr="nan"), dict(INPUTS, el_day_curr=float("inf"))):
+            with self.assertRaises(ValueError) as cm:
+                parse_readings(readings)
+            self.assertEqual(str(cm.exception), NOT_FINITE_MESSAGE)
+
+
+class ValidateColumnsMixin:
+    def columns(self, rows):
+        return {k: self.column([row[k] for row in rows]) for k in READING_KEYS}
+
+    def test_matches_validate_readings(self):
+        rows = [
+            INPUTS,
+            dict(INPUTS, xvs_curr=float("nan")),
+            dict(INPUTS, el_night_prev=float("inf")),
+            dict(INPUTS, gvs_prev=float("-inf")),  # отрицательное и бесконечное — как у validate_readings
+            dict(INPUTS, xvs_curr=1.0),
+            dict(INPUTS, el_day_prev=-1.0),
+        ]
+        self.assertEqual(validate_columns(self.columns(rows)), [validate_readings(row) for row in rows])
+
+
+class PythonColumnsTest(ValidateColumnsMixin, unittest.TestCase):
+    def column(self, values):
+        return array("d", values)
+
+
+@unittest.skipIf(numpy is None, "numpy не установлен")
+class NumpyColumnsTest(ValidateColumnsMixin, unittest.TestCase):
+    def column(self, values):
+        return numpy.asarray(values, dtype=numpy.float64)
+
+
+if __name__ == "__main__":
+    unittest.main()
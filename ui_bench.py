@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Отзывчивость окна на больших историях: App под виртуальным X-дисплеем (Xvfb), без GPU и без экрана.
+
+    python ui_bench.py [--sizes 1000,10000,100000] [--repeat 5] [--budget delete=300] [--out report.json]
+                       [--display :1]
+
+Для каждого размера в отдельной временной папке создаются history.json (синтетическая история,
+как у bench.py) и config.json, и окно запускается в отдельном процессе с ZHKH_DATA_DIR на эту папку.
+Процесс выполняет настоящие действия через виджеты окна:
+    startup         — импорт main.py, создание окна и перенос history.json в журнал до первой отрисовки;
+    timeline_select — выбор периода в хронологии (подстановка показаний);
+    history_window  — кнопка «История по месяцам»;
+    tariffs_window  — кнопка «Тарифы»;
+    save_tariffs    — «Сохранить» в окне тарифов;
+    delete          — ПКМ по периоду, «Удалить запись» в меню.
+Время действия — от события до простоя Tk: root.update() обработал все события и idle-задачи.
+Диалоги messagebox сразу отвечают «Да»/«ОК»: их ожидание — время пользователя, а не программы.
+
+Отчёт — медиана и максимум по действиям и размерам (--out — ещё и JSON). Код выхода 1, если медиана
+какого-либо действия больше бюджета (BUDGETS_MS, --budget действие=мс), 2 — замер не удался (нет Xvfb и т. п.).
+Дисплей — --display, иначе запускается свой Xvfb (пакет xvfb) на свободном номере.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ACTIONS = ("startup", "timeline_select", "history_window", "tariffs_window", "save_tariffs", "delete")
+# Бюджеты на медиану, мс: отклик на щелчок — 100 мс, новое окно — 250 мс, запуск — 2 с
+BUDGETS_MS = {
+    "startup": 2000,
+    "timeline_select": 100,
+    "history_window": 250,
+    "tariffs_window": 250,
+    "save_tariffs": 100,
+    "delete": 100,
+}
+
+
+def start_xvfb():
+    """Свой Xvfb на свободном номере дисплея -> (процесс, ":N"); Xvfb сам выбирает номер (-displayfd)."""
+    exe = shutil.which("Xvfb")
+    if not exe:
+        raise RuntimeError("Xvfb не найден: установите пакет xvfb или укажите --display")
+    r, w = os.pipe()
+    proc = subprocess.Popen(
+        [exe, "-displayfd", str(w), "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+        pass_fds=(w,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    os.close(w)
+    with os.fdopen(r) as f:
+        number = f.readline().strip()  # Xvfb пишет номер, когда готов принимать клиентов
+    if not number:
+        proc.kill()
+        raise RuntimeError("Xvfb не запустился")
+    return proc, ":" + number
+
+
+def prepare(n, workdir):
+    """Папка данных программы: синтетическая история на n записей (history.json) и config.json."""
+    from bench import synthetic_history
+    from core import DEFAULT_TARIFFS
+
+    os.makedirs(workdir, exist_ok=True)
+    with open(os.path.join(workdir, "history.json"), "w", encoding="utf-8") as f:
+        json.dump(synthetic_history(n), f, ensure_ascii=False)
+    with open(os.path.join(workdir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(DEFAULT_TARIFFS, f, ensure_ascii=False)
+
+
+def run_app(workdir, display, repeat):
+    """Замеры в отдельном процессе (пути к данным в core задаются при импорте): {действие: [мс]}."""
+    env = dict(os.environ, ZHKH_DATA_DIR=workdir, DISPLAY=display)
+    env.pop("ZHKH_TRACE", None)
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--repeat", str(repeat)],
+        cwd=HERE, env=env, capture_output=True, text=True, encoding="utf-8",
+    )
+    if proc.returncode:
+        raise RuntimeError(f"окно завершилось с кодом {proc.returncode}:\n{proc.stderr.strip()}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# --- В процессе окна ---
+
+def _find(widget, cls, text=None):
+    """Первый потомок widget класса cls (с надписью text)."""
+    for w in widget.winfo_children():
+        if isinstance(w, cls) and (text is None or str(w.cget("text")) == text):
+            return w
+        found = _find(w, cls, text)
+        if found is not None:
+            return found
+    return None
+
+
+def _timed(root, action):
+    """Действие и обработка всего, что оно вызвало, до простоя Tk, мс."""
+    t0 = time.perf_counter()
+    action()
+    root.update()
+    return (time.perf_counter() - t0) * 1000
+
+
+def _settle(root, writer):
+    """Дождаться фоновой записи (её сообщения — тоже), чтобы она не попала в следующий замер."""
+    while writer.poll():
+        time.sleep(0.005)
+    root.update()
+
+
+def _toplevels(root, tk):
+    return [w for w in root.winfo_children() if isinstance(w, tk.Toplevel)]
+
+
+def drive(repeat):
+    """Запуск окна и действия по repeat раз -> {действие: [мс]}."""
+    t0 = time.perf_counter()
+    import tkinter as tk
+    from tkinter import messagebox, ttk
+
+    # Диалоги отвечают сразу — иначе замер ждал бы щелчка
+    messagebox.askyesno = lambda *args, **kwargs: True
+    messagebox.showinfo = messagebox.showwarning = messagebox.showerror = lambda *args, **kwargs: "ok"
+
+    import main
+    from core import background_writer
+
+    app = main.App()
+    root = app.root
+    root.update()
+    times = {a: [] for a in ACTIONS}
+    times["startup"].append((time.perf_counter() - t0) * 1000)
+    writer = background_writer()
+    lb = app._timeline_listbox
+
+    for i in range(repeat):
+        def select(row=i % max(lb.size(), 1)):
+            lb.selection_clear(0, tk.END)
+            lb.selection_set(row)
+            lb.event_generate("<<ListboxSelect>>")
+
+        times["timeline_select"].append(_timed(root, select))
+
+    history_button = _find(root, ttk.Button, "История по месяцам")
+    tariffs_button = _find(root, ttk.Button, "Тарифы")
+    for _ in range(repeat):
+        times["history_window"].append(_timed(root, history_button.invoke))
+        for win in _toplevels(root, tk):
+            win.destroy()
+        root.update()
+
+        times["tariffs_window"].append(_timed(root, tariffs_button.invoke))
+        save = _find(_toplevels(root, tk)[-1], ttk.Button, "Сохранить")
+        times["save_tariffs"].append(_timed(root, save.invoke))
+        _settle(root, writer)
+
+    for _ in range(repeat):
+        if not lb.size():
+            break
+        lb.selection_clear(0, tk.END)
+        lb.selection_set(0)
+        x, y, _, h = lb.bbox(0)
+
+        def delete():
+            lb.event_generate("<Button-3>", x=x + 5, y=y + h // 2,
+                              rootx=lb.winfo_rootx() + x + 5, rooty=lb.winfo_rooty() + y + h // 2)
+            menu = [w for w in root.winfo_children() if isinstance(w, tk.Menu)][-1]
+            menu.invoke(0)
+            menu.unpost()
+            menu.destroy()
+
+        times["delete"].append(_timed(root, delete))
+        _settle(root, writer)
+
+    app._on_close()
+    return times
+
+
+# --- Отчёт ---
+
+def check(results, budgets):
+    """Строки отчёта (действие, записей, медиана, максимум, бюджет, превышен ли) по результатам {n: {действие: [мс]}}."""
+    rows = []
+    for n, times in results.items():
+        for action in ACTIONS:
+            samples = times.get(action)
+            if not samples:
+                continue
+            median = statistics.median(samples)
+            budget = budgets.get(action)
+            rows.append((action, n, median, max(samples), budget, budget is not None and median > budget))
+    return rows
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Задержки окна программы на больших историях под Xvfb.")
+    p.add_argument("--sizes", default="1000,10000,100000", help="размеры истории через запятую")
+    p.add_argument("--repeat", type=int, default=5, help="повторов каждого действия")
+    p.add_argument("--budget", action="append", default=[], metavar="ДЕЙСТВИЕ=МС",
+                   help="бюджет на медиану действия, мс (можно несколько раз)")
+    p.add_argument("--display", help="готовый X-дисплей (по умолчанию запускается Xvfb)")
+    p.add_argument("--out", help="сохранить отчёт в JSON")
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(drive(args.repeat)))
+        return 0
+
+    budgets = dict(BUDGETS_MS)
+    for item in args.budget:
+        action, _, ms = item.partition("=")
+        if action not in ACTIONS:
+            p.error(f"--budget: неизвестное действие {action}; допустимо: {', '.join(ACTIONS)}")
+        try:
+            budgets[action] = float(ms)
+        except ValueError:
+            p.error(f"--budget {item}: ожидалось действие=мс")
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+
+    xvfb = None
+    results = {}
+    try:
+        display = args.display
+        if not display:
+            xvfb, display = start_xvfb()
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in sizes:
+                workdir = os.path.join(tmp, str(n))
+                prepare(n, workdir)
+                results[n] = run_app(workdir, display, args.repeat)
+                print(f"записей {n}: готово", file=sys.stderr)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+    rows = check(results, budgets)
+    print(f"{'действие':<16} {'записей':>8} {'медиана, мс':>12} {'max, мс':>9} {'бюджет, мс':>11}")
+    for action, n, median, worst, budget, over in rows:
+        mark = "  ПРЕВЫШЕН" if over else ""
+        print(f"{action:<16} {n:>8} {median:>12.1f} {worst:>9.1f} {budget if budget is not None else '—':>11}{mark}")
+    if args.out:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "repeat": args.repeat,
+            },
+            "budgets_ms": budgets,
+            "results": {str(n): times for n, times in results.items()},
+        }
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    over = [r for r in rows if r[5]]
+    if over:
+        print(f"Бюджет превышен: {len(over)} из {len(rows)}.")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+«Что если»: сколько стоил бы каждый сохранённый период при других тарифах.
+
+    python whatif.py --set tariff_xvs=43.24,45,47 --set tariff_el_day=6.79,7.2
+
+Расходы периодов берутся из показаний *_curr в истории (разница с предыдущим периодом),
+сценарии — сочетания вариантов тарифов поверх действующих. Считается вся матрица
+«периоды × сценарии» в копейках, как в окне программы: каждая строка счёта (водоотведение, ХВС, ...)
+считается по всей колонке периодов сразу и кэшируется по своим тарифам (LRU).
+Поэтому правка одного тарифа пересчитывает только строки, где он участвует.
+Строки с правилами тарифов из config.json (ступени, нормы — tariff_rules) считаются по плану правил,
+как в окне программы.
+"""
+import argparse
+import itertools
+import sys
+from array import array
+from collections import OrderedDict
+
+from core import DEFAULT_TARIFFS, load_config, load_history, load_rules, parse_float, tariffs_from_config
+from money import TERMS, kopecks_to_str, term_kopecks, to_scaled
+from tariff_schedule import chronological
+
+_METERS = ("xvs", "gvs", "el_day", "el_night")
+_TERM_BY_NAME = {t[0]: t for t in TERMS}
+_TERM_INDEX = {t[0]: i for i, t in enumerate(TERMS)}  # порядок строк в TariffPlan.lines
+_WATER = ("sum_sewage", "sum_xvs", "sum_heating", "sum_gvs")
+_ELECTRICITY = ("sum_el_day", "sum_el_night")
+
+
+class _LRU:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class WhatIf:
+    def __init__(self, records, cache_size=256, rules=None):
+        """
+        records — записи истории. Период попадает в расчёт, если у него и у предыдущего
+        (по дате периода) есть все четыре показания *_curr; запись без показаний разрывает цепочку,
+        иначе расход следующего периода охватил бы несколько месяцев.
+        rules — tariff_rules.TariffRules (core.load_rules): строки с правилами считаются по ним.
+        """
+        self.rules = rules
+        self.periods = []
+        self.actual = array("q")  # сохранённые итоги этих периодов, копейки
+        cons = {k: array("q") for k in ("xvs", "gvs", "sewage", "el_day", "el_night")}
+        prev = None
+        for r in chronological(records):
+            curr = [r.get(m + "_curr") for m in _METERS]
+            if None in curr:
+                prev = None
+                continue
+            curr = [to_scaled(v) for v in curr]
+            if prev is not None:
+                c_xvs, c_gvs, c_day, c_night = (c - p for c, p in zip(curr, prev))
+                cons["xvs"].append(c_xvs)
+                cons["gvs"].append(c_gvs)
+                cons["sewage"].append(c_xvs + c_gvs)
+                cons["el_day"].append(c_day)
+                cons["el_night"].append(c_night)
+                self.periods.append(r.get("period") or r.get("date_saved") or "")
+                self.actual.append(int(round((r.get("total") or 0) * 100)))
+            prev = curr
+        self.consumption = cons
+        self._terms = _LRU(cache_size * len(TERMS))
+        self._scenarios = _LRU(cache_size)
+
+    def __len__(self):
+        return len(self.periods)
+
+    def term(self, name, tariffs, plan=None):
+        """
+        Колонка копеек одной строки счёта по всем периодам (из кэша, если тарифы этой строки уже были).
+        plan — TariffPlan этих тарифов и self.rules, если уже построен (иначе строится при промахе кэша).
+        """
+        _, column, keys, heating = _TERM_BY_NAME[name]
+        rates = tuple(to_scaled(tariffs[k]) for k in keys)
+        cache_key = (name, rates)
+        col = self._terms.get(cache_key)
+        if col is None:
+            if self.rules and name in self.rules.lines:
+                # Ступени зависят от ставок своей строки и правил, которые у движка одни, — ключ кэша тот же
+                plan = plan or self._plan(tariffs)
+                col = plan.lines[_TERM_INDEX[name]].column(self.consumption)
+            else:
+                rate = rates[0] * rates[1] if heating else rates[0]
+                col = term_kopecks(self.consumption[column], rate, heating)
+            self._terms.put(cache_key, col)
+        return col
+
+    def _plan(self, tariffs):
+        # Не rules.plan(): он кэширует планы по id(тарифов), а сценарии — каждый раз новые словари
+        from tariff_rules import TariffPlan
+
+        return TariffPlan(tariffs, self.rules)
+
+    def scenario(self, tariffs):
+        """
+        Все строки счёта и итоги по периодам для одного набора тарифов:
+        {ключ SUM_FIELDS: array("q") копеек}. Недостающие тарифы — по умолчанию.
+        """
+        tariffs = dict(DEFAULT_TARIFFS, **tariffs)
+        key = tuple(to_scaled(tariffs[k]) for k in DEFAULT_TARIFFS)
+        result = self._scenarios.get(key)
+        if result is None:
+            plan = self._plan(tariffs) if self.rules else None
+            result = {name: self.term(name, tariffs, plan) for name, _, _, _ in TERMS}
+            result["sum_water"] = array("q", map(sum, zip(*(result[k] for k in _WATER))))
+            result["sum_electricity"] = array("q", map(sum, zip(*(result[k] for k in _ELECTRICITY))))
+            result["total"] = array("q", map(sum, zip(result["sum_water"], result["sum_electricity"])))
+            self._scenarios.put(key, result)
+        return result
+
+    def sweep(self, scenarios):
+        """Матрица итогов: [array("q") копеек по периодам для каждого сценария]."""
+        return [self.scenario(t)["total"] for t in scenarios]
+
+    def cache_info(self):
+        return {
+            "terms": len(self._terms), "term_hits": self._terms.hits, "term_misses": self._terms.misses,
+            "scenarios": len(self._scenarios), "scenario_hits": self._scenarios.hits,
+            "scenario_misses": self._scenarios.misses,
+        }
+
+
+def grid(base, variants):
+    """Все сочетания вариантов: grid(тарифы, {"tariff_xvs": [43, 45]}) -> [тарифы, ...]."""
+    keys = list(variants)
+    out = []
+    for values in itertools.product(*(variants[k] for k in keys)):
+        t = dict(base)
+        t.update(zip(keys, values))
+        out.append(t)
+    return out
+
+
+def _parse_set(items):
+    variants = {}
+    for item in items:
+        key, _, values = item.partition("=")
+        nums = [parse_float(v) for v in values.split(";" if ";" in values else ",")]
+        if key not in DEFAULT_TARIFFS or not nums or None in nums:
+            raise SystemExit(f"Некорректные варианты: {item} (пример: tariff_xvs=43.24,45)")
+        variants[key] = nums
+    return variants
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Стоимость сохранённых периодов при других тарифах.")
+    p.add_argument("--set", action="append", default=[], metavar="КЛЮЧ=A,B,...",
+                   help="варианты тарифа (можно несколько --set — берутся все сочетания)")
+    p.add_argument("--config", help="путь к config.json")
+    args = p.parse_args(argv)
+
+    config = load_config(args.config)
+    try:
+        rules = load_rules(config)
+    except ValueError as e:
+        raise SystemExit(f"config.json: {e}")
+    base = tariffs_from_config(config)
+    variants = _parse_set(args.set)
+    scenarios = grid(base, variants)
+    engine = WhatIf(load_history(), rules=rules)
+    if not len(engine):
+        print("В истории нет двух подряд периодов с показаниями — считать не из чего.", file=sys.stderr)
+        return 1
+    matrix = engine.sweep(scenarios)
+
+    names = [", ".join(f"{k}={t[k]:g}" for k in variants) or "текущие" for t in scenarios]
+    for i, name in enumerate(names, 1):
+        print(f"#{i}: {name}")
+    width = max(len(p) for p in engine.periods + ["Всего"])
+    print("Период".ljust(width) + "  " + "Сохранено".rjust(11) + "".join(f"#{i}".rjust(11) for i in range(1, len(names) + 1)))
+    for j, period in enumerate(engine.periods):
+        cells = "".join(kopecks_to_str(col[j]).rjust(11) for col in matrix)
+        print(period.ljust(width) + "  " + kopecks_to_str(engine.actual[j]).rjust(11) + cells)
+    totals = "".join(kopecks_to_str(sum(col)).rjust(11) for col in matrix)
+    print("Всего".ljust(width) + "  " + kopecks_to_str(sum(engine.actual)).rjust(11) + totals)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())